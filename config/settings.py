@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,27 +43,63 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'projects.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'projects.replica.ReplicaStickyMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'projects.debug.LazyLoadDetectionMiddleware',
 ]
 
+# 開発時に外部キーの遅延読み込み（N+1 クエリ）をログに出す
+CRM_DETECT_LAZY_LOADS = DEBUG
+
+# リクエストごとの SQL・テンプレート描画の計測（projects/profiling.py）。
+# CRM_PROFILING=1 で有効にし、集計は /profiling/（スタッフ限定）で確認する。
+# CRM_PROFILING_MEMORY=1 で tracemalloc によるメモリのピークも測る（遅くなる）。
+# CRM_PROFILING_SAMPLE_RATE の割合のリクエストを cProfile にかけ、CRM_PROFILING_DIR に保存する。
+CRM_PROFILING = os.environ.get('CRM_PROFILING') == '1'
+CRM_PROFILING_MEMORY = os.environ.get('CRM_PROFILING_MEMORY') == '1'
+CRM_PROFILING_SAMPLE_RATE = float(os.environ.get('CRM_PROFILING_SAMPLE_RATE', 0))
+CRM_PROFILING_DIR = os.environ.get('CRM_PROFILING_DIR', BASE_DIR / 'profiles')
+
+# バックグラウンド処理（projects/jobs.py、manage.py run_worker で実行）。
+# 実行中の処理が CRM_JOB_VISIBILITY_TIMEOUT 秒進捗を報告しなければ、停止したものとみなして再実行する。
+# 失敗した処理は CRM_JOB_RETRY_DELAY 秒から倍々に間隔を空けて再実行する。
+CRM_JOB_VISIBILITY_TIMEOUT = int(os.environ.get('CRM_JOB_VISIBILITY_TIMEOUT', 300))
+CRM_JOB_RETRY_DELAY = int(os.environ.get('CRM_JOB_RETRY_DELAY', 30))
+CRM_JOB_FILE_DIR = os.environ.get('CRM_JOB_FILE_DIR', BASE_DIR / 'jobs')
+
+# 外部システム向けの変更履歴（projects/changefeed.py、/api/changes/ と manage.py consume_changes で読む）。
+# manage.py compact_changes は CRM_CHANGE_FEED_RETENTION_DAYS 日より古い履歴を行ごとに最新の1件だけにする。
+CRM_CHANGE_FEED_RETENTION_DAYS = int(os.environ.get('CRM_CHANGE_FEED_RETENTION_DAYS', 7))
+
+# 完了・失注から CRM_ARCHIVE_AFTER_DAYS 日が過ぎた案件を manage.py archive_projects で
+# アーカイブテーブルに移す（projects/archive.py）
+CRM_ARCHIVE_AFTER_DAYS = int(os.environ.get('CRM_ARCHIVE_AFTER_DAYS', 365))
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # コンパイル済みのテンプレートをプロセス内に保持する（runserver ではテンプレートの変更時に破棄される）
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -73,13 +110,97 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# CRM_DB_PROFILE=default は SQLite の既定設定（開発用）。
+# production は WAL（書き込み中も読み取りをブロックしない）と接続の再利用を有効にする。
+# PRAGMA は接続ごとに projects/signals.py の configure_sqlite で設定する。
+
+CRM_DB_PROFILE = os.environ.get('CRM_DB_PROFILE', 'default')
+
+DB_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'conn_max_age': 0,
+        'options': {},
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'wal',
+            # WAL では normal でもコミット済みデータは壊れない（電源断で直近のコミットが失われうる）
+            'synchronous': 'normal',
+            'cache_size': -64000,  # 負の値は KiB 単位（64MB）
+            'mmap_size': 268435456,  # 256MB
+            'temp_store': 'memory',
+            'busy_timeout': 5000,  # ミリ秒
+        },
+        'conn_max_age': 600,
+        # 書き込みトランザクションは開始時にロックを取り、途中での SQLITE_BUSY を避ける
+        'options': {'transaction_mode': 'IMMEDIATE'},
+    },
+}
+
+DB_PROFILE = DB_PROFILES[CRM_DB_PROFILE]
+CRM_SQLITE_PRAGMAS = DB_PROFILE['pragmas']
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('CRM_CONN_MAX_AGE', DB_PROFILE['conn_max_age'])),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': DB_PROFILE['options'],
     }
 }
 
+# 読み取りレプリカ（projects/replica.py）。CRM_REPLICA_NAME にファイルを指定すると
+# ダッシュボード・一覧・エクスポートの読み取りをそちらに向ける。
+# 複製は manage.py sync_replica で行い、最終同期から CRM_REPLICA_MAX_LAG 秒を
+# 超えたらプライマリを読む。書き込んだセッションは CRM_REPLICA_STICKY_SECONDS の間プライマリを読む。
+CRM_REPLICA_NAME = os.environ.get('CRM_REPLICA_NAME')
+if CRM_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': CRM_REPLICA_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+CRM_REPLICA_ALIAS = 'replica' if CRM_REPLICA_NAME else None
+CRM_REPLICA_MAX_LAG = int(os.environ.get('CRM_REPLICA_MAX_LAG', 60))
+CRM_REPLICA_STICKY_SECONDS = int(os.environ.get('CRM_REPLICA_STICKY_SECONDS', CRM_REPLICA_MAX_LAG))
+
+DATABASE_ROUTERS = ['projects.replica.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CRM_CACHE_BACKEND=locmem はプロセス内キャッシュ（開発用）。
+# 複数プロセスで運用する場合は file を使い、無効化を全プロセスで共有する。
+
+CRM_CACHE_BACKEND = os.environ.get('CRM_CACHE_BACKEND', 'locmem')
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dx-consulting-crm',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CRM_CACHE_DIR', BASE_DIR / 'cache'),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[CRM_CACHE_BACKEND],
+    # テンプレートの断片キャッシュ（{% cache ... using="fragments" %}）。キーに更新日時などを
+    # 含めて内容が変われば別のキーになるため、無効化の共有が要らずプロセス内に置く
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dx-consulting-crm-fragments',
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CRM_FRAGMENT_CACHE_ENTRIES', 20000))},
+    },
+}
+
+# ビューのレスポンスキャッシュの有効期間（秒）。0 で無効
+CRM_VIEW_CACHE_TIMEOUT = int(os.environ.get('CRM_VIEW_CACHE_TIMEOUT', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,5 +1,24 @@
-from django.contrib import admin
-from .models import Client, Project, Handover, ProgressLog, EngineerHandoff
+import io
+import uuid
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db.models import F
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from . import imports, jobs, tasks
+from .models import Client, Project, Handover, ProgressLog, EngineerHandoff, ProjectStatusHistory, Job
+
+
+class CSVImportForm(forms.Form):
+    file = forms.FileField(label='CSV ファイル', help_text='UTF-8（BOM 付き可）、1行目はヘッダー')
+    batch_size = forms.IntegerField(label='バッチサイズ', min_value=1, initial=imports.DEFAULT_BATCH_SIZE)
+    dry_run = forms.BooleanField(label='検証のみ（書き込まない）', required=False)
+    background = forms.BooleanField(label='バックグラウンドで実行', required=False,
+                                    help_text='大きなファイル向け。manage.py run_worker が実行し、結果は「バックグラウンド処理」で確認できます')
 
 
 @admin.register(Client)
@@ -9,32 +28,114 @@ class ClientAdmin(admin.ModelAdmin):
     search_fields = ['company_name', 'contact_person', 'email']
     date_hierarchy = 'created_at'
 
-
-class HandoverInline(admin.TabularInline):
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_csv_view), name='projects_client_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_csv_view(self, request):
+        """顧客・案件の CSV 一括インポート（manage.py import_data と同じ処理）"""
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        report = None
+        form = CSVImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid() and form.cleaned_data['background']:
+            return self._enqueue_import(request, form.cleaned_data)
+        if request.method == 'POST' and form.is_valid():
+            file = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            try:
+                report = imports.import_csv(file, form.cleaned_data['batch_size'], form.cleaned_data['dry_run'])
+            except (UnicodeDecodeError, ValueError) as exc:
+                form.add_error('file', f'CSV を読み込めませんでした: {exc}')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': '顧客・案件の CSV インポート',
+            'opts': self.model._meta,
+            'form': form,
+            'report': report,
+            'dry_run': form.is_bound and form.cleaned_data.get('dry_run'),
+        }
+        return TemplateResponse(request, 'admin/projects/client/import_csv.html', context)
+
+    def _enqueue_import(self, request, data):
+        """アップロードされた CSV を保存し、インポートをバックグラウンド処理に登録する"""
+        path = tasks.job_file_dir() / f'import_{uuid.uuid4().hex}.csv'
+        with open(path, 'wb') as output:
+            for chunk in data['file'].chunks():
+                output.write(chunk)
+        job = jobs.enqueue('import_csv', {
+            'path': str(path),
+            'batch_size': data['batch_size'],
+            'dry_run': data['dry_run'],
+            'remove': True,
+        })
+        self.message_user(request, f'インポートを登録しました（{job}）。', messages.SUCCESS)
+        return redirect(reverse('admin:projects_job_change', args=[job.pk]))
+
+
+class ProjectInlineMixin:
+    """インライン各行の __str__ が参照する案件を一括取得する"""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('project')
+
+
+class HandoverInline(ProjectInlineMixin, admin.TabularInline):
     model = Handover
     extra = 0
     fields = ['handover_type', 'handover_to', 'handover_date', 'is_completed']
 
 
-class ProgressLogInline(admin.TabularInline):
+class ProgressLogInline(ProjectInlineMixin, admin.TabularInline):
     model = ProgressLog
     extra = 0
     fields = ['log_date', 'activity_type', 'content', 'next_action']
 
 
-class EngineerHandoffInline(admin.TabularInline):
+class EngineerHandoffInline(ProjectInlineMixin, admin.TabularInline):
     model = EngineerHandoff
     extra = 0
     fields = ['engineer_name', 'handoff_date', 'is_accepted']
 
 
+class StatusHistoryInline(admin.TabularInline):
+    """ステータス履歴（シグナルで記録するため閲覧のみ）"""
+    model = ProjectStatusHistory
+    extra = 0
+    fields = ['changed_at', 'from_status', 'to_status']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class ProjectRelatedAdminMixin:
+    """__str__ で案件・顧客名を参照するモデルの管理画面用"""
+    list_select_related = ['project__client']
+    autocomplete_fields = ['project']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('project__client')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'project':
+            kwargs['queryset'] = Project.objects.select_related('client')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
     list_display = ['title', 'client', 'status', 'estimated_amount', 'start_date', 'created_at']
     list_filter = ['status', 'created_at', 'start_date']
+    list_select_related = ['client']
     search_fields = ['title', 'client__company_name', 'consultation_content']
     date_hierarchy = 'created_at'
-    inlines = [HandoverInline, ProgressLogInline, EngineerHandoffInline]
+    autocomplete_fields = ['client']
+    inlines = [HandoverInline, ProgressLogInline, EngineerHandoffInline, StatusHistoryInline]
     
     fieldsets = (
         ('基本情報', {
@@ -47,10 +148,14 @@ class ProjectAdmin(admin.ModelAdmin):
             'fields': ('start_date', 'end_date')
         }),
     )
+    
+    def get_queryset(self, request):
+        # 他の管理画面のオートコンプリート候補も __str__ で顧客名を参照する
+        return super().get_queryset(request).select_related('client')
 
 
 @admin.register(Handover)
-class HandoverAdmin(admin.ModelAdmin):
+class HandoverAdmin(ProjectRelatedAdminMixin, admin.ModelAdmin):
     list_display = ['project', 'handover_type', 'handover_to', 'handover_date', 'is_completed']
     list_filter = ['handover_type', 'is_completed', 'handover_date']
     search_fields = ['project__title', 'handover_to', 'handover_content']
@@ -58,7 +163,7 @@ class HandoverAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProgressLog)
-class ProgressLogAdmin(admin.ModelAdmin):
+class ProgressLogAdmin(ProjectRelatedAdminMixin, admin.ModelAdmin):
     list_display = ['project', 'log_date', 'activity_type', 'created_by']
     list_filter = ['activity_type', 'log_date']
     search_fields = ['project__title', 'content', 'next_action']
@@ -66,7 +171,7 @@ class ProgressLogAdmin(admin.ModelAdmin):
 
 
 @admin.register(EngineerHandoff)
-class EngineerHandoffAdmin(admin.ModelAdmin):
+class EngineerHandoffAdmin(ProjectRelatedAdminMixin, admin.ModelAdmin):
     list_display = ['project', 'engineer_name', 'handoff_date', 'budget', 'is_accepted']
     list_filter = ['is_accepted', 'handoff_date']
     search_fields = ['project__title', 'engineer_name', 'technical_scope']
@@ -86,3 +191,26 @@ class EngineerHandoffAdmin(admin.ModelAdmin):
             'fields': ('special_notes',)
         }),
     )
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """バックグラウンド処理（登録は jobs.enqueue、実行は manage.py run_worker。閲覧と再実行のみ）"""
+    list_display = ['id', 'name', 'status', 'progress', 'progress_message', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='選択した失敗済みの処理を再実行する')
+    def retry(self, request, queryset):
+        count = queryset.filter(status='failed').update(
+            status='pending', run_at=timezone.now(), max_attempts=F('attempts') + 1,
+            locked_until=None, locked_by='', progress=0, progress_message='', finished_at=None,
+        )
+        self.message_user(request, f'{count}件を再実行に登録しました。', messages.SUCCESS)
@@ -0,0 +1,379 @@
+"""営業パイプラインの分析（ステージ転換率・滞在日数・月別コホート）
+
+ProjectStatusHistory（ステータス遷移の履歴）を窓関数付きの SQL 1本で
+案件ごとに時系列に並べ、次の3種類の件数を日別に集計する。
+
+- 流入: その日に各ステータスへ移った件数
+- 流出: その日に各ステータスから次へ移った件数と滞在日数（DURATION_BUCKETS ごとの分布）
+- 到達: 作成月（コホート）ごとに、その日に初めて各ステータスに到達した案件数。
+  FUNNEL_STAGES の途中を飛ばした案件（例: いきなり商談中で登録）は、飛ばした
+  ステージにも到達したものとして数える。全案件は作成時点で初回相談に到達する。
+
+前日までの集計は rollup() で StageDailyStat / CohortDailyStat に保存しておき、
+report() は保存済みの集計に、それ以降の分だけをその場で集計して足し合わせる。
+過去日付の履歴を後から追加・削除した場合は rollup(full=True) で作り直す。
+全期間の集計にはアーカイブした案件の履歴（ArchivedStatusHistory）も含める。
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import Project, ProjectStatusHistory, StageDailyStat, CohortDailyStat, ArchivedProject, ArchivedStatusHistory
+
+# 受注までの標準的な流れ（この順に到達したとみなす）
+FUNNEL_STAGES = ['inquiry', 'hearing', 'proposal', 'quotation', 'negotiation', 'handover', 'in_progress', 'completed']
+# 滞在日数の分布の区切り（日数の上限、最後の区間は 365 日以上）
+DURATION_BUCKETS = [1, 2, 3, 5, 7, 10, 14, 21, 30, 45, 60, 90, 120, 180, 270, 365]
+STATUS_LABELS = dict(Project.STATUS_CHOICES)
+
+
+def _fixed_utc_offset():
+    """現在のタイムゾーンの UTC との差（分）。過去20年で変わっている（夏時間など）場合は None"""
+    tz = timezone.get_current_timezone()
+    year = timezone.localdate().year
+    offsets = {
+        tz.utcoffset(datetime(year - years, month, 1))
+        for years in range(20) for month in (1, 4, 7, 10)
+    }
+    if len(offsets) != 1:
+        return None
+    return int(offsets.pop().total_seconds() // 60)
+
+
+def _local_date_sql(db, column, month=False):
+    """日時の列をローカルタイムの日付（month なら月初日）にする SQL
+
+    Django の変換関数は行ごとに Python を呼び出し、数十万行では集計時間の大半を占める。
+    UTC との差が一定のタイムゾーン（日本時間など）では SQLite の date() で計算する。
+    """
+    offset = _fixed_utc_offset() if db.vendor == 'sqlite' else None
+    if offset is not None:
+        modifiers = [f'{offset:+d} minutes'] + (['start of month'] if month else [])
+        return f"date({column}, {', '.join(['%s'] * len(modifiers))})", modifiers
+    tzname = timezone.get_current_timezone_name()
+    if month:
+        sql, params = db.ops.datetime_trunc_sql('month', column, (), tzname)
+    else:
+        sql, params = db.ops.datetime_cast_date_sql(column, (), tzname)
+    return sql, list(params)
+
+
+def _bucket_sql(column):
+    """滞在日数を DURATION_BUCKETS の区間番号にする SQL"""
+    whens = ' '.join(f'WHEN {column} < {upper} THEN {index}' for index, upper in enumerate(DURATION_BUCKETS))
+    return f'CASE {whens} ELSE {len(DURATION_BUCKETS)} END'
+
+
+def _history_sql(db, since):
+    """遷移ごとの流入・流出・到達を (種類, 日, コホート, ステータス, 区間) ごとに数える SQL
+
+    窓関数はすべて案件ごとの時系列（status_history_project_idx の順）で、
+    直前の遷移（LAG）と、それより前に到達したファネル上の最大の段階・訪問済みの
+    ファネル外のステータスを1回の走査で求める。
+    """
+    history = db.ops.quote_name(ProjectStatusHistory._meta.db_table)
+    project = db.ops.quote_name(Project._meta.db_table)
+    day_sql, day_params = _local_date_sql(db, 'h.changed_at')
+    cohort_sql, cohort_params = _local_date_sql(db, 'p.created_at', month=True)
+    ranks = ', '.join(['(%s, %s)'] * len(FUNNEL_STAGES))
+    rank_params = [value for rank, stage in enumerate(FUNNEL_STAGES, start=1) for value in (stage, rank)]
+    # ファネル外のステータス（失注・保留）は初めて入った時だけ到達として数える
+    off_funnel = [value for value, _ in Project.STATUS_CHOICES if value not in FUNNEL_STAGES]
+    seen_sql = ' '.join('WHEN %s THEN MAX(h.to_status = %s) OVER earlier' for _ in off_funnel)
+    seen_params = [value for status in off_funnel for value in (status, status)]
+
+    history_source, project_source = history, project
+    if since is None and ArchivedStatusHistory.objects.using(db.alias).exists():
+        # 全期間の集計ではアーカイブした案件の履歴も並べる（id は元のまま移すので重ならない）
+        archived_history = db.ops.quote_name(ArchivedStatusHistory._meta.db_table)
+        archived_project = db.ops.quote_name(ArchivedProject._meta.db_table)
+        history_source = (
+            f'(SELECT id, project_id, to_status, changed_at FROM {history} '
+            f'UNION ALL SELECT id, project_id, to_status, changed_at FROM {archived_history})'
+        )
+        project_source = f'(SELECT id, created_at FROM {project} UNION ALL SELECT id, created_at FROM {archived_project})'
+
+    where, where_params = '', []
+    if since is not None:
+        # 対象日以降に遷移のあった案件だけを、それ以前の履歴も含めて並べる
+        where = f'WHERE h.project_id IN (SELECT project_id FROM {history} WHERE changed_at >= %s)'
+        start = datetime.combine(since, time.min, tzinfo=timezone.get_current_timezone())
+        where_params = [db.ops.adapt_datetimefield_value(start)]
+
+    sql = f'''
+        WITH ranks(status, stage_rank) AS (VALUES {ranks}),
+        events AS (
+            SELECT
+                {day_sql} AS day,
+                {cohort_sql} AS cohort,
+                h.to_status,
+                r.stage_rank,
+                LAG(h.to_status) OVER w AS prev_status,
+                -- SQLite の日時文字列を日数に変換して差を取る
+                julianday(h.changed_at) - julianday(LAG(h.changed_at) OVER w) AS duration,
+                -- 最初の遷移（作成）は NULL。作成時点で初回相談（1）には到達している
+                MAX(COALESCE(r.stage_rank, 0)) OVER earlier AS earlier_rank,
+                CASE h.to_status {seen_sql} END AS seen_before
+            FROM {history_source} h
+            JOIN {project_source} p ON p.id = h.project_id
+            LEFT JOIN ranks r ON r.status = h.to_status
+            {where}
+            WINDOW
+                w AS (PARTITION BY h.project_id ORDER BY h.changed_at, h.id),
+                earlier AS (w ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+        )
+        SELECT kind, day, cohort, stage, bucket, COUNT(*), SUM(duration) FROM (
+            SELECT 'entered' AS kind, day, NULL AS cohort, to_status AS stage, NULL AS bucket, 0 AS duration
+            FROM events
+            UNION ALL
+            SELECT 'exited', day, NULL, prev_status, {_bucket_sql('duration')}, duration
+            FROM events WHERE prev_status IS NOT NULL
+            UNION ALL
+            SELECT 'reached', day, cohort, ranks.status, NULL, 0
+            FROM events JOIN ranks
+                ON ranks.stage_rank > COALESCE(max(events.earlier_rank, 1), 0)
+                AND ranks.stage_rank <= max(COALESCE(events.stage_rank, 0), 1)
+            UNION ALL
+            SELECT 'reached', day, cohort, to_status, NULL, 0
+            FROM events WHERE stage_rank IS NULL AND NOT COALESCE(seen_before, 0)
+        ) AS counts
+        {'WHERE day >= %s' if since is not None else ''}
+        GROUP BY kind, day, cohort, stage, bucket
+    '''
+    params = rank_params + day_params + cohort_params + seen_params + where_params
+    if since is not None:
+        params.append(since.isoformat())
+    return sql, params
+
+
+def _as_date(value):
+    """SQLite が文字列で返す日付・日時を date にする"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+def _empty_flow():
+    return {'entered': 0, 'exited': 0, 'days_total': 0.0, 'histogram': [0] * (len(DURATION_BUCKETS) + 1)}
+
+
+def compute(since=None):
+    """履歴から日別の集計を求める
+
+    ({(日, ステータス): 流入・流出}, {(日, コホート, ステータス): 到達数}) を返す。
+    since を指定するとその日以降の分だけを返す。読み取り先はルーターに従う（レプリカを含む）。
+    """
+    db = connections[router.db_for_read(ProjectStatusHistory)]
+    flows = defaultdict(_empty_flow)
+    reached = defaultdict(int)
+    with db.cursor() as cursor:
+        cursor.execute(*_history_sql(db, since))
+        for kind, day, cohort, stage, bucket, count, duration in cursor.fetchall():
+            day = _as_date(day)
+            if kind == 'reached':
+                reached[day, _as_date(cohort), stage] += count
+            elif kind == 'entered':
+                flows[day, stage]['entered'] += count
+            else:
+                flow = flows[day, stage]
+                flow['exited'] += count
+                flow['days_total'] += duration or 0
+                flow['histogram'][bucket] += count
+    return flows, reached
+
+
+def rolled_through():
+    """集計テーブルに保存済みの最後の日（未集計なら None）"""
+    days = [
+        StageDailyStat.objects.aggregate(day=Max('day'))['day'],
+        CohortDailyStat.objects.aggregate(day=Max('day'))['day'],
+    ]
+    days = [day for day in days if day is not None]
+    return max(days) if days else None
+
+
+def rollup(full=False, until=None):
+    """前日（until）までの日別集計を集計テーブルに保存し、保存した日数を返す
+
+    通常は保存済みの最後の日から集計し直す（その日は途中までしか集計していない可能性がある）。
+    """
+    until = until or timezone.localdate() - timedelta(days=1)
+    since = None if full else rolled_through()
+    flows, reached = compute(since)
+
+    with transaction.atomic():
+        stage_stats = StageDailyStat.objects.all()
+        cohort_stats = CohortDailyStat.objects.all()
+        if since is not None:
+            stage_stats = stage_stats.filter(day__gte=since)
+            cohort_stats = cohort_stats.filter(day__gte=since)
+        stage_stats.delete()
+        cohort_stats.delete()
+
+        StageDailyStat.objects.bulk_create(
+            (
+                StageDailyStat(
+                    day=day, stage=stage, entered=flow['entered'], exited=flow['exited'],
+                    days_total=flow['days_total'], duration_histogram=flow['histogram'],
+                )
+                for (day, stage), flow in flows.items() if day <= until
+            ),
+            batch_size=1000,
+        )
+        CohortDailyStat.objects.bulk_create(
+            (
+                CohortDailyStat(day=day, cohort=cohort, stage=stage, reached=count)
+                for (day, cohort, stage), count in reached.items() if day <= until
+            ),
+            batch_size=1000,
+        )
+    return len({day for day, _ in flows if day <= until})
+
+
+def _median(histogram):
+    """区間ごとの件数から中央値を線形補間で求める（区間の幅の精度の目安）"""
+    total = sum(histogram)
+    if not total:
+        return None
+    half, cumulative, lower = total / 2, 0, 0
+    for upper, count in zip(DURATION_BUCKETS + [None], histogram):
+        if count and cumulative + count >= half:
+            if upper is None:
+                return lower
+            return lower + (upper - lower) * (half - cumulative) / count
+        cumulative += count
+        lower = upper
+    return lower
+
+
+def _rate(numerator, denominator):
+    return numerator / denominator if denominator else None
+
+
+def _in_range(value, start, end):
+    return (start is None or value >= start) and (end is None or value <= end)
+
+
+def report(start=None, end=None):
+    """分析レポートを返す
+
+    ファネルとコホートは start〜end に作成された案件、滞在日数は start〜end に
+    次のステータスへ移った遷移が対象。
+    """
+    start_month = start.replace(day=1) if start else None
+    through = rolled_through()
+
+    # 集計テーブルの分
+    flows = defaultdict(_empty_flow)
+    stage_stats = StageDailyStat.objects.all()
+    if start:
+        stage_stats = stage_stats.filter(day__gte=start)
+    if end:
+        stage_stats = stage_stats.filter(day__lte=end)
+    for stage, entered, exited, days_total, histogram in stage_stats.values_list(
+        'stage', 'entered', 'exited', 'days_total', 'duration_histogram',
+    ).order_by():
+        flow = flows[stage]
+        flow['entered'] += entered
+        flow['exited'] += exited
+        flow['days_total'] += days_total
+        flow['histogram'] = [a + b for a, b in zip(flow['histogram'], histogram)]
+
+    reached = defaultdict(int)
+    cohort_stats = CohortDailyStat.objects.all()
+    if start_month:
+        cohort_stats = cohort_stats.filter(cohort__gte=start_month)
+    if end:
+        cohort_stats = cohort_stats.filter(cohort__lte=end)
+    for row in cohort_stats.values('cohort', 'stage').annotate(count=Sum('reached')).order_by():
+        reached[row['cohort'], row['stage']] += row['count']
+
+    # まだ集計テーブルにない分はその場で集計する
+    tail_flows, tail_reached = compute(through + timedelta(days=1) if through else None)
+    for (day, stage), tail in tail_flows.items():
+        if _in_range(day, start, end):
+            flow = flows[stage]
+            flow['entered'] += tail['entered']
+            flow['exited'] += tail['exited']
+            flow['days_total'] += tail['days_total']
+            flow['histogram'] = [a + b for a, b in zip(flow['histogram'], tail['histogram'])]
+    for (day, cohort, stage), count in tail_reached.items():
+        if _in_range(cohort, start_month, end):
+            reached[cohort, stage] += count
+
+    return {
+        'funnel': _funnel(reached),
+        'stages': _stages(flows),
+        'cohorts': _cohorts(reached),
+        # cohorts の reached と同じ並び
+        'funnel_labels': [STATUS_LABELS[stage] for stage in FUNNEL_STAGES],
+        'rolled_through': through,
+    }
+
+
+def _funnel(reached):
+    totals = defaultdict(int)
+    for (_, stage), count in reached.items():
+        totals[stage] += count
+    created = totals[FUNNEL_STAGES[0]]
+    funnel, previous = [], created
+    for stage in FUNNEL_STAGES:
+        funnel.append({
+            'stage': stage,
+            'label': STATUS_LABELS[stage],
+            'reached': totals[stage],
+            'rate': _rate(totals[stage], created),
+            'step_rate': _rate(totals[stage], previous),
+        })
+        previous = totals[stage]
+    return {
+        'stages': funnel,
+        'created': created,
+        'won': totals['completed'],
+        'lost': totals['lost'],
+        'on_hold': totals['on_hold'],
+        'win_rate': _rate(totals['completed'], totals['completed'] + totals['lost']),
+    }
+
+
+def _stages(flows):
+    stages = []
+    for stage, label in Project.STATUS_CHOICES:
+        flow = flows.get(stage)
+        if flow is None:
+            continue
+        stages.append({
+            'stage': stage,
+            'label': label,
+            'entered': flow['entered'],
+            'exited': flow['exited'],
+            'mean_days': _rate(flow['days_total'], flow['exited']),
+            'median_days': _median(flow['histogram']),
+        })
+    return stages
+
+
+def _cohorts(reached):
+    by_cohort = defaultdict(dict)
+    for (cohort, stage), count in reached.items():
+        by_cohort[cohort][stage] = count
+    cohorts = []
+    for cohort in sorted(by_cohort, reverse=True):
+        counts = by_cohort[cohort]
+        created = counts.get(FUNNEL_STAGES[0], 0)
+        won, lost = counts.get('completed', 0), counts.get('lost', 0)
+        cohorts.append({
+            'month': cohort,
+            'created': created,
+            'reached': [counts.get(stage, 0) for stage in FUNNEL_STAGES],
+            'won': won,
+            'lost': lost,
+            'conversion': _rate(won, created),
+            'win_rate': _rate(won, won + lost),
+        })
+    return cohorts
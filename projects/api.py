@@ -0,0 +1,591 @@
+"""外部システム連携用の JSON API（/api/...）
+
+    GET   /api/<resource>/             一覧（キーセットページネーション）
+    POST  /api/<resource>/             1件登録
+    GET   /api/<resource>/<id>/        1件取得
+    PATCH /api/<resource>/<id>/        1件更新（If-Match で競合を検出できる）
+    POST  /api/progress-logs/batch/    進捗記録の一括登録・更新（1トランザクション）
+
+resource は clients / projects / handovers / progress-logs / engineer-handoffs。
+一覧・取得では ?fields=id,title で返す列を選び（読む列も only() で絞る）、
+?expand=client のように関連データを埋め込める（外部キーは select_related、
+逆参照は prefetch_related で、埋め込む数に関係なくクエリ数は一定）。
+一覧の絞り込み条件は画面と同じ（filters.py）。
+
+どのレスポンスにも updated_at から作った ETag・Last-Modified を付け、
+If-None-Match・If-Modified-Since が一致すれば本文なしの 304 を返す。
+一覧の ETag は表示中のページの行（id と updated_at）と埋め込んだ関連データから作るため、
+行の追加・削除でも変わる（If-Modified-Since は削除を検出できないので、一覧では ETag を使う）。
+
+認証はスタッフユーザーの HTTP Basic 認証、またはログイン中のセッション
+（セッションで書き込む場合は CSRF トークンが必要）。
+"""
+import base64
+import binascii
+import hashlib
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.core.exceptions import ValidationError
+from django.forms import ModelChoiceField, ModelForm, model_to_dict, modelform_factory
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+
+from . import changefeed, summary
+from .cache import bump_version
+from .exports import plain_value
+from .filters import (
+    filter_projects, filter_clients, filter_handovers, filter_engineer_handoffs, filter_by_project,
+)
+from .models import Client, Project, Handover, ProgressLog, EngineerHandoff
+from .pagination import InvalidCursor, KeysetPaginator, CURSOR_PARAM
+from .replica import use_replica
+
+User = get_user_model()
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+# 一括登録・更新で1回に受け付ける件数
+BATCH_LIMIT = 1000
+# 変更履歴（/api/changes/）で1回に返す件数
+DEFAULT_CHANGES = 100
+MAX_CHANGES = 1000
+AUTH_CACHE_KEY = 'projects:api:auth:{}'
+AUTH_CACHE_SECONDS = 300
+
+
+@dataclass
+class Expansion:
+    """?expand= で埋め込める関連データ
+
+    外部キー（many=False）は select_related、逆参照（many=True）は prefetch_related で読む。
+    """
+    resource: str
+    many: bool = False
+
+
+@dataclass
+class Resource:
+    model: type
+    fields: list
+    # 書き込める列（外部キーは <名前>_id で受け取る）
+    writable: list
+    filter: object = None
+    expansions: dict = field(default_factory=dict)
+
+
+def _filter_progress_logs(queryset, params):
+    project = params.get('project')
+    if project:
+        queryset = queryset.filter(project_id=project)
+    return filter_by_project(queryset, params)
+
+
+RESOURCES = {
+    'clients': Resource(
+        Client,
+        ['id', 'company_name', 'contact_person', 'email', 'phone', 'industry', 'company_size',
+         'created_at', 'updated_at'],
+        ['company_name', 'contact_person', 'email', 'phone', 'industry', 'company_size'],
+        filter_clients,
+        {'projects': Expansion('projects', many=True)},
+    ),
+    'projects': Resource(
+        Project,
+        ['id', 'client', 'external_id', 'title', 'status', 'consultation_content', 'proposal_content',
+         'estimated_amount', 'start_date', 'end_date', 'created_at', 'updated_at'],
+        ['client', 'external_id', 'title', 'status', 'consultation_content', 'proposal_content',
+         'estimated_amount', 'start_date', 'end_date'],
+        filter_projects,
+        {
+            'client': Expansion('clients'),
+            'handovers': Expansion('handovers', many=True),
+            'progress_logs': Expansion('progress-logs', many=True),
+            'engineer_handoffs': Expansion('engineer-handoffs', many=True),
+        },
+    ),
+    'handovers': Resource(
+        Handover,
+        ['id', 'project', 'handover_type', 'handover_to', 'handover_date', 'handover_content',
+         'technical_requirements', 'notes', 'is_completed', 'updated_at'],
+        ['project', 'handover_type', 'handover_to', 'handover_date', 'handover_content',
+         'technical_requirements', 'notes', 'is_completed'],
+        lambda queryset, params: filter_by_project(filter_handovers(queryset, params), params),
+        {'project': Expansion('projects')},
+    ),
+    'progress-logs': Resource(
+        ProgressLog,
+        ['id', 'project', 'log_date', 'activity_type', 'content', 'next_action', 'created_by', 'updated_at'],
+        ['project', 'log_date', 'activity_type', 'content', 'next_action', 'created_by'],
+        _filter_progress_logs,
+        {'project': Expansion('projects')},
+    ),
+    'engineer-handoffs': Resource(
+        EngineerHandoff,
+        ['id', 'project', 'engineer_name', 'handoff_date', 'technical_scope', 'current_status',
+         'client_requirements', 'timeline', 'budget', 'special_notes', 'is_accepted', 'updated_at'],
+        ['project', 'engineer_name', 'handoff_date', 'technical_scope', 'current_status',
+         'client_requirements', 'timeline', 'budget', 'special_notes', 'is_accepted'],
+        lambda queryset, params: filter_by_project(filter_engineer_handoffs(queryset, params), params),
+        {'project': Expansion('projects')},
+    ),
+}
+
+
+class APIError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': message, **extra}
+
+
+def _error_response(error):
+    response = JsonResponse(error.body, status=error.status, json_dumps_params={'ensure_ascii': False})
+    if error.status == 401:
+        response['WWW-Authenticate'] = 'Basic realm="crm"'
+    return response
+
+
+def _basic_auth_user(request):
+    """Basic 認証のユーザー
+
+    パスワードのハッシュ計算はリクエストごとには重いため、認証できた資格情報は
+    AUTH_CACHE_SECONDS の間キャッシュする（パスワードが変わればキャッシュは使わない）。
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, credentials = header.partition(' ')
+    if scheme.lower() != 'basic':
+        return None
+    key = AUTH_CACHE_KEY.format(hashlib.sha256((settings.SECRET_KEY + credentials).encode()).hexdigest())
+    cached = cache.get(key)
+    if cached is not None:
+        user = User.objects.filter(pk=cached[0]).first()
+        if user is not None and user.password == cached[1]:
+            return user
+    try:
+        username, _, password = base64.b64decode(credentials).decode().partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        raise APIError(401, '認証情報の形式が正しくありません')
+    user = authenticate(request, username=username, password=password)
+    if user is None:
+        raise APIError(401, 'ユーザー名またはパスワードが正しくありません')
+    cache.set(key, (user.pk, user.password), AUTH_CACHE_SECONDS)
+    return user
+
+
+def _authenticate(request):
+    """Basic 認証かセッションのスタッフユーザーだけを通す"""
+    user = _basic_auth_user(request)
+    if user is None:
+        user = request.user
+        # セッションでの書き込みは画面と同じく CSRF トークンを確かめる
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            rejected = CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+            if rejected is not None:
+                raise APIError(403, 'CSRF トークンがないか正しくありません')
+    if not user.is_authenticated:
+        raise APIError(401, '認証が必要です')
+    if not (user.is_active and user.is_staff):
+        raise APIError(403, 'スタッフ権限が必要です')
+    request.user = user
+
+
+def api_view(methods):
+    """JSON API のビュー（認証・メソッドの確認・エラーの JSON 化）"""
+    def decorator(view_func):
+        @csrf_exempt
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise APIError(405, f'{request.method} は使えません', allowed=methods)
+                _authenticate(request)
+                return view_func(request, *args, **kwargs)
+            except APIError as error:
+                return _error_response(error)
+        return wrapper
+    return decorator
+
+
+def _resource(name):
+    try:
+        return RESOURCES[name]
+    except KeyError:
+        raise APIError(404, f'不明なリソースです: {name}')
+
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+@dataclass
+class Selection:
+    """?fields= と ?expand= の解釈結果"""
+    resource: Resource
+    fields: list
+    expand: list
+
+    @classmethod
+    def parse(cls, resource, params):
+        fields = _split(params.get('fields')) or list(resource.fields)
+        unknown = [name for name in fields if name not in resource.fields]
+        if unknown:
+            raise APIError(400, f'不明な列です: {", ".join(unknown)}', fields=resource.fields)
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        expand = _split(params.get('expand'))
+        unknown = [name for name in expand if name not in resource.expansions]
+        if unknown:
+            raise APIError(400, f'埋め込めない関連データです: {", ".join(unknown)}',
+                           expand=list(resource.expansions))
+        return cls(resource, fields, expand)
+
+    def apply(self, queryset):
+        """選んだ列だけを読み、埋め込む関連データを結合・先読みする"""
+        model = self.resource.model
+        only = list(self.fields)
+        # ETag・Last-Modified と並び順のキーはいつも読む
+        only += [name for name in ('updated_at', _ordering_field(model)) if name not in only]
+        for name in self.expand:
+            expansion = self.resource.expansions[name]
+            target = RESOURCES[expansion.resource]
+            if expansion.many:
+                related = target.model.objects.only(*target.fields).order_by(*target.model._meta.ordering, '-pk')
+                queryset = queryset.prefetch_related(Prefetch(name, queryset=related))
+            else:
+                queryset = queryset.select_related(name)
+                only += [name] + [f'{name}__{column}' for column in target.fields]
+        return queryset.only(*dict.fromkeys(only))
+
+    def serialize(self, obj):
+        data = {}
+        for name in self.fields:
+            attname = self.resource.model._meta.get_field(name).attname
+            data[attname] = plain_value(getattr(obj, attname))
+        for name in self.expand:
+            expansion = self.resource.expansions[name]
+            nested = Selection(RESOURCES[expansion.resource], list(RESOURCES[expansion.resource].fields), [])
+            if expansion.many:
+                data[name] = [nested.serialize(item) for item in getattr(obj, name).all()]
+            else:
+                related = getattr(obj, name)
+                data[name] = nested.serialize(related) if related is not None else None
+        return data
+
+    def versions(self, obj):
+        """ETag に含める (モデル, id, updated_at)。埋め込んだ関連データも含める"""
+        yield self.resource.model._meta.model_name, obj.pk, obj.updated_at
+        for name in self.expand:
+            expansion = self.resource.expansions[name]
+            related = getattr(obj, name).all() if expansion.many else [getattr(obj, name)]
+            for item in related:
+                if item is not None:
+                    yield item._meta.model_name, item.pk, item.updated_at
+
+
+def _ordering_field(model):
+    return model._meta.ordering[0].lstrip('-')
+
+
+def _etag(parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _conditional(request, versions, extra, build):
+    """ETag・Last-Modified を付け、条件に一致すれば 304（If-Match が外れたら 412）を返す"""
+    versions = list(versions)
+    etag = _etag([extra, versions])
+    timestamps = [updated_at for _, _, updated_at in versions if updated_at is not None]
+    last_modified = int(max(timestamps).timestamp()) if timestamps else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _per_page(params):
+    try:
+        return min(max(int(params.get('limit', DEFAULT_PER_PAGE)), 1), MAX_PER_PAGE)
+    except ValueError:
+        raise APIError(400, 'limit は整数で指定してください')
+
+
+@api_view(['GET', 'POST'])
+def collection(request, resource):
+    """一覧の取得と1件登録"""
+    spec = _resource(resource)
+    if request.method == 'POST':
+        return _create(request, spec)
+    return _list(request, spec)
+
+
+@use_replica
+def _list(request, spec):
+    selection = Selection.parse(spec, request.GET)
+    queryset = spec.model.objects.all()
+    if spec.filter is not None:
+        queryset = spec.filter(queryset, request.GET)
+    params = request.GET.copy()
+    cursor = params.pop(CURSOR_PARAM, [None])[-1]
+    paginator = KeysetPaginator(selection.apply(queryset), per_page=_per_page(request.GET))
+    try:
+        page = paginator.page(cursor, params)
+    except InvalidCursor:
+        raise APIError(400, 'カーソルが正しくありません')
+
+    versions = [version for obj in page for version in selection.versions(obj)]
+    return _conditional(request, versions, [request.GET.urlencode()], lambda: _json({
+        'results': [selection.serialize(obj) for obj in page],
+        'next': page.next_cursor,
+        'previous': page.prev_cursor,
+    }))
+
+
+@api_view(['GET', 'PATCH'])
+def detail(request, resource, pk):
+    """1件の取得と更新"""
+    spec = _resource(resource)
+    if request.method == 'PATCH':
+        return _update(request, spec, pk)
+    return _detail(request, spec, pk)
+
+
+@use_replica
+def _detail(request, spec, pk):
+    selection = Selection.parse(spec, request.GET)
+    obj = _get(selection.apply(spec.model.objects.all()), pk)
+    return _conditional(request, selection.versions(obj), [request.GET.urlencode()],
+                        lambda: _json(selection.serialize(obj)))
+
+
+def _get(queryset, pk):
+    try:
+        return queryset.get(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise APIError(404, f'{queryset.model._meta.verbose_name} {pk} は見つかりません')
+
+
+def _body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except (UnicodeDecodeError, ValueError):
+        raise APIError(400, 'JSON として読み込めません')
+
+
+class _PreloadedChoiceField(ModelChoiceField):
+    """先に読み込んだインスタンスから選ぶ外部キー（行ごとに参照先を引かない）"""
+
+    def __init__(self, objects, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.objects = objects
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.objects[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+
+class _BatchForm(ModelForm):
+    """一括書き込み用のフォーム。先読みした外部キーはモデル検証での存在確認も省く"""
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        exclude.update(name for name, field in self.fields.items() if isinstance(field, _PreloadedChoiceField))
+        return exclude
+
+
+def _form(spec, data, instance=None, preloaded=None):
+    """書き込める列のモデルフォーム（外部キーは <名前>_id で受け取る）
+
+    preloaded に {外部キー名: {pk: インスタンス}} を渡すと、その外部キーは渡したものから選ぶ。
+    """
+    form_class = modelform_factory(spec.model, form=_BatchForm if preloaded else ModelForm, fields=spec.writable)
+    if not isinstance(data, dict):
+        raise APIError(400, 'オブジェクトで指定してください')
+    # 指定のない列は、PATCH では今の値、登録ではモデルの既定値を使う
+    if instance is not None:
+        values = model_to_dict(instance, spec.writable)
+    else:
+        fields = [spec.model._meta.get_field(name) for name in spec.writable]
+        values = {field.name: field.get_default() for field in fields if field.has_default()}
+    for name in spec.writable:
+        attname = spec.model._meta.get_field(name).attname
+        if attname in data:
+            values[name] = data[attname]
+    unknown = sorted(set(data) - {spec.model._meta.get_field(name).attname for name in spec.writable} - {'id'})
+    if unknown:
+        raise APIError(400, f'書き込めない列です: {", ".join(unknown)}')
+    form = form_class(values, instance=instance)
+    for name, objects in (preloaded or {}).items():
+        field = form.fields[name]
+        form.fields[name] = _PreloadedChoiceField(
+            objects, field.queryset, required=field.required, label=field.label,
+        )
+    return form
+
+
+def _saved(spec, obj, status):
+    selection = Selection(spec, list(spec.fields), [])
+    response = _json(selection.serialize(obj), status=status)
+    response['ETag'] = _etag([[''], list(selection.versions(obj))])
+    return response
+
+
+def _create(request, spec):
+    form = _form(spec, _body(request))
+    if not form.is_valid():
+        raise APIError(400, '入力内容に誤りがあります', errors=form.errors)
+    return _saved(spec, form.save(), 201)
+
+
+def _update(request, spec, pk):
+    obj = _get(spec.model.objects.all(), pk)
+    # If-Match が今の ETag と違えば、ほかの更新と競合しているので書き込まない
+    selection = Selection(spec, list(spec.fields), [])
+    precondition = get_conditional_response(request, etag=_etag([[''], list(selection.versions(obj))]))
+    if precondition is not None and precondition.status_code == 412:
+        raise APIError(412, 'ほかの更新と競合しました。取得し直してから更新してください')
+    form = _form(spec, _body(request), instance=obj)
+    if not form.is_valid():
+        raise APIError(400, '入力内容に誤りがあります', errors=form.errors)
+    return _saved(spec, form.save(), 200)
+
+
+@api_view(['POST'])
+def progress_log_batch(request):
+    """進捗記録の一括登録・更新
+
+    本文は {"create": [{...}, ...], "update": [{"id": 1, ...}, ...]}。
+    すべての行を検証してから1トランザクションで書き込み、1行でも誤りがあれば何も書き込まない。
+    シグナルを通らないため、関係する案件のサマリーとキャッシュはまとめて更新する。
+    """
+    spec = RESOURCES['progress-logs']
+    body = _body(request)
+    if not isinstance(body, dict):
+        raise APIError(400, 'オブジェクトで指定してください')
+    creates, updates = body.get('create', []), body.get('update', [])
+    if not isinstance(creates, list) or not isinstance(updates, list):
+        raise APIError(400, 'create・update は配列で指定してください')
+    if not all(isinstance(row, dict) for row in creates + updates):
+        raise APIError(400, 'create・update の各行はオブジェクトで指定してください')
+    if len(creates) + len(updates) > BATCH_LIMIT:
+        raise APIError(400, f'1回に書き込めるのは {BATCH_LIMIT}件までです')
+
+    ids = [row.get('id') for row in updates]
+    existing = ProgressLog.objects.in_bulk([pk for pk in ids if isinstance(pk, int)])
+    # 行ごとに案件を引かないよう、参照される案件をまとめて読む
+    project_ids = [row.get('project_id') for row in creates + updates]
+    preloaded = {'project': Project.objects.in_bulk([pk for pk in project_ids if isinstance(pk, int)])}
+    errors, new_logs, changed_logs = [], [], []
+    for kind, rows in (('create', creates), ('update', updates)):
+        for index, row in enumerate(rows):
+            instance = None
+            if kind == 'update':
+                instance = existing.get(row.get('id'))
+                if instance is None:
+                    errors.append({'kind': kind, 'index': index, 'errors': {'id': ['見つかりません']}})
+                    continue
+            try:
+                form = _form(spec, row, instance=instance, preloaded=preloaded)
+            except APIError as error:
+                errors.append({'kind': kind, 'index': index, 'errors': {'__all__': [error.body['error']]}})
+                continue
+            if not form.is_valid():
+                errors.append({'kind': kind, 'index': index, 'errors': form.errors})
+                continue
+            (new_logs if kind == 'create' else changed_logs).append(form.save(commit=False))
+    if errors:
+        raise APIError(400, '入力内容に誤りがあります', errors=errors)
+
+    now = timezone.now()
+    # 更新前の案件（別の案件に付け替えた場合は両方のサマリーを作り直す）
+    project_ids = set(ProgressLog.objects.filter(pk__in=[log.pk for log in changed_logs]).values_list('project_id', flat=True))
+    with transaction.atomic():
+        created = ProgressLog.objects.bulk_create(new_logs)
+        for log in changed_logs:
+            log.updated_at = now
+        ProgressLog.objects.bulk_update(changed_logs, [*spec.writable, 'updated_at'])
+        project_ids |= {log.project_id for log in created + changed_logs}
+        summary.rebuild(project_ids)
+        changefeed.record(ProgressLog, [log.pk for log in created + changed_logs])
+    bump_version(ProgressLog)
+
+    selection = Selection(spec, list(spec.fields), [])
+    return _json({
+        'created': [selection.serialize(log) for log in created],
+        'updated': [selection.serialize(log) for log in changed_logs],
+    })
+
+
+def changes_page(after, limit, resources=None):
+    """after 番より後の変更履歴と、保存された行の今の内容（manage.py consume_changes と共通）
+
+    行の内容はモデルごとに1本のクエリでまとめて読む。その後に削除された行の data は null
+    （後ろに削除の履歴が続く）。
+    """
+    models = [RESOURCES[name].model for name in resources] if resources else None
+    logs = changefeed.entries(after, limit + 1, models)
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+
+    names = {spec.model._meta.model_name: name for name, spec in RESOURCES.items()}
+    saved = defaultdict(set)
+    for log in logs:
+        if log.action == 'save':
+            saved[log.model].add(log.object_id)
+    current = {
+        model: RESOURCES[names[model]].model.objects.only(*RESOURCES[names[model]].fields).in_bulk(ids)
+        for model, ids in saved.items()
+    }
+    changes = []
+    for log in logs:
+        spec = RESOURCES[names[log.model]]
+        obj = current.get(log.model, {}).get(log.object_id)
+        changes.append({
+            'seq': log.pk,
+            'resource': names[log.model],
+            'id': log.object_id,
+            'action': log.action,
+            'changed_at': plain_value(log.changed_at),
+            'data': Selection(spec, list(spec.fields), []).serialize(obj) if obj is not None else None,
+        })
+    return {'changes': changes, 'last_seq': logs[-1].pk if logs else after, 'has_more': has_more}
+
+
+@api_view(['GET'])
+def change_feed(request):
+    """変更履歴（?after=N より後を古い順に。?resources=projects,clients で絞り込める）
+
+    読み手は返された last_seq を次の after に渡す。has_more が false になるまで読めば最新に追いつく。
+    """
+    try:
+        after = int(request.GET.get('after', 0))
+        limit = min(max(int(request.GET.get('limit', DEFAULT_CHANGES)), 1), MAX_CHANGES)
+    except ValueError:
+        raise APIError(400, 'after・limit は整数で指定してください')
+    resources = _split(request.GET.get('resources'))
+    for name in resources:
+        _resource(name)
+    return _json(changes_page(after, limit, resources))
@@ -0,0 +1,164 @@
+"""完了・失注した案件のアーカイブ
+
+完了・失注から CRM_ARCHIVE_AFTER_DAYS 日が過ぎた案件を、引継ぎ・進捗記録・バトンタッチ・
+ステータス履歴とともに元の id のままアーカイブテーブル（Archived*）へ移し、元のテーブルから
+削除する。ダッシュボード・一覧・API が読むテーブルは進行中の案件と最近の案件だけの大きさに保たれる。
+
+- 案件詳細は元のテーブルになければアーカイブを読む（views.project_detail）。
+- 案件の検索はアーカイブも部分一致で探す（search()。件数が少なく頻度も低いため索引は持たない）。
+- ステータス別・月別の集計テーブルはアーカイブした案件も数えたままにする（stats.rebuild も両方を数える）。
+- パイプライン分析の全期間の再集計はアーカイブのステータス履歴も読む（analytics）。
+
+アーカイブはシグナルを通さずにまとめて削除するため、集計テーブルは変わらず、
+変更履歴には削除ではなく archive として記録する（作業キューの件数は移したあとに数え直す）。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import changefeed, forecast, queues
+from .cache import bump_version
+from .models import (
+    Client, Project, Handover, ProgressLog, EngineerHandoff, ProjectStatusHistory, ProjectSummary,
+    ArchivedProject, ArchivedHandover, ArchivedProgressLog, ArchivedEngineerHandoff, ArchivedStatusHistory,
+)
+
+CLOSED_STATUSES = ['completed', 'lost']
+DEFAULT_BATCH_SIZE = 500
+# 案件一覧の検索で表示するアーカイブ済みの案件の件数
+SEARCH_LIMIT = 20
+
+# 元のモデル → アーカイブのモデル（案件の関連データ）
+RELATED = {
+    Handover: ArchivedHandover,
+    ProgressLog: ArchivedProgressLog,
+    EngineerHandoff: ArchivedEngineerHandoff,
+    ProjectStatusHistory: ArchivedStatusHistory,
+}
+
+
+def archive_after():
+    return timedelta(days=settings.CRM_ARCHIVE_AFTER_DAYS)
+
+
+def closed_projects(before):
+    """before より前に完了・失注した案件（日時は今のステータスになった最後の遷移。なければ更新日）"""
+    closed_at = Subquery(
+        ProjectStatusHistory.objects.filter(project=OuterRef('pk'), to_status=OuterRef('status'))
+        .order_by('-changed_at').values('changed_at')[:1]
+    )
+    return (
+        Project.objects.filter(status__in=CLOSED_STATUSES)
+        .annotate(closed_at=Coalesce(closed_at, 'updated_at'))
+        .filter(closed_at__lt=before)
+    )
+
+
+def _columns(source, target):
+    """両方にある列（アーカイブのモデルの列のうち、元のモデルにもあるもの）"""
+    names = {field.attname for field in source._meta.concrete_fields}
+    return [field.attname for field in target._meta.concrete_fields if field.attname in names]
+
+
+def _copy_related(project_ids):
+    """関連データを INSERT ... SELECT でアーカイブに写す（行を Python に読み込まない）"""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for source, target in RELATED.items():
+            columns = _columns(source, target)
+            sql, params = source.objects.filter(project_id__in=project_ids).order_by().values(*columns).query.sql_with_params()
+            names = ', '.join(quote(target._meta.get_field(name).column) for name in columns)
+            cursor.execute(f'INSERT INTO {quote(target._meta.db_table)} ({names}) {sql}', params)
+
+
+def _delete(project_ids):
+    """元のテーブルから削除する（行ごとの削除・シグナルを経由しない）"""
+    placeholders = ', '.join(['%s'] * len(project_ids))
+    with connection.cursor() as cursor:
+        for model in [*RELATED, ProjectSummary]:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} WHERE project_id IN ({placeholders})',
+                project_ids,
+            )
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(Project._meta.db_table)} WHERE id IN ({placeholders})',
+            project_ids,
+        )
+
+
+def _record_changes(project_ids):
+    """変更履歴に archive として記録する（読み手は元のリソースから取り除く）"""
+    for model in (Handover, ProgressLog, EngineerHandoff):
+        ids = list(model.objects.filter(project_id__in=project_ids).values_list('pk', flat=True))
+        changefeed.record(model, ids, action='archive')
+    changefeed.record(Project, project_ids, action='archive')
+
+
+def _archive_batch(projects):
+    project_ids = [project['id'] for project in projects]
+    now = timezone.now()
+    columns = _columns(Project, ArchivedProject)
+    with transaction.atomic():
+        ArchivedProject.objects.bulk_create(
+            ArchivedProject(
+                **{name: project[name] for name in columns},
+                closed_at=project['closed_at'],
+                archived_at=now,
+                last_log_date=project['summary__last_log_date'],
+                log_count=project['summary__log_count'] or 0,
+            )
+            for project in projects
+        )
+        _copy_related(project_ids)
+        _record_changes(project_ids)
+        _delete(project_ids)
+
+
+def archive(before=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """before（既定は CRM_ARCHIVE_AFTER_DAYS 日前）より前に完了・失注した案件をアーカイブし、件数を返す
+
+    バッチごとに1トランザクションで移すため、途中で止まっても案件が両方に残ったり失われたりしない。
+    """
+    before = before or timezone.now() - archive_after()
+    queryset = closed_projects(before)
+    if dry_run:
+        return queryset.count()
+
+    columns = _columns(Project, ArchivedProject)
+    count = 0
+    while True:
+        projects = list(
+            queryset.order_by('pk')
+            .values(*columns, 'closed_at', 'summary__last_log_date', 'summary__log_count')[:batch_size]
+        )
+        if not projects:
+            break
+        _archive_batch(projects)
+        count += len(projects)
+    if count:
+        queues.rebuild()
+        bump_version(Client, Project, Handover, ProgressLog, EngineerHandoff)
+        forecast.invalidate()
+    return count
+
+
+def get_project(pk):
+    """アーカイブした案件（なければ None）"""
+    return ArchivedProject.objects.select_related('client').filter(pk=pk).first()
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """案件名・相談内容・提案内容・顧客名でアーカイブを探す（新しい順に limit 件）"""
+    condition = Q()
+    for field in ('title', 'client__company_name', 'consultation_content', 'proposal_content'):
+        condition |= Q(**{f'{field}__icontains': query})
+    return (
+        ArchivedProject.objects.select_related('client')
+        .only('title', 'status', 'estimated_amount', 'closed_at', 'client__company_name')
+        .filter(condition)
+        .order_by('-closed_at', '-id')[:limit]
+    )
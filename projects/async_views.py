@@ -0,0 +1,162 @@
+"""ダッシュボード・一覧画面の非同期（ASGI）版
+
+views.py と同じテンプレート・絞り込み条件を使い、Django の非同期 ORM で
+互いに依存しないクエリを asyncio.gather でまとめて待つ。テンプレートには
+取得済みのリストだけを渡すため、描画中に SQL は発行されない。
+
+Django 5.2 の非同期 ORM は内部で sync_to_async(thread_sensitive=True) を使うため、
+SQL 自体は1本のスレッドで順に実行される。gather で減るのはクエリごとの
+待ち合わせの往復で、SQL の並列実行ではない（効果は benchmark_views --concurrency で確認できる）。
+"""
+import asyncio
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import archive, client_stats, exports, projections, queues, stats
+from .cache import cached_view
+from .filters import filter_projects, filter_clients, filter_handovers, filter_engineer_handoffs
+from .models import Client, Project, Handover, ProgressLog, EngineerHandoff
+from .replica import current_read_alias, use_replica
+from .pagination import acount_up_to, apaginate
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+@use_replica
+@cached_view(Client, Project, ProgressLog, EngineerHandoff)
+async def dashboard(request):
+    """ダッシュボード - 案件の統計情報を表示"""
+    (
+        summary, new_projects_count, recent_projects, pending_handoffs, pending_handoff_count, recent_activities,
+    ) = await asyncio.gather(
+        stats.apipeline_summary(),
+        stats.anew_projects_count(),
+        _list(projections.recent_projects()),
+        _list(projections.pending_handoffs()),
+        queues.aopen_total('handoff'),
+        _list(projections.recent_activities()),
+    )
+    pending_handoffs = queues.top(pending_handoffs, queues.DASHBOARD_LIMIT)
+
+    context = {
+        'status_stats': summary['status_stats'],
+        'new_projects_count': new_projects_count,
+        'active_projects_count': summary['active_projects_count'],
+        'total_estimated': summary['total_estimated'],
+        'recent_projects': recent_projects,
+        'pending_handoffs': pending_handoffs,
+        'pending_handoff_count': pending_handoff_count,
+        'recent_activities': recent_activities,
+    }
+
+    return render(request, 'projects/dashboard.html', context)
+
+
+async def _page_and_count(request, queryset):
+    """1ページ分の行と件数（pagination.COUNT_LIMIT 件まで。超えたかどうかも）を並行して取得する"""
+    page, (count, capped) = await asyncio.gather(apaginate(request, queryset), acount_up_to(queryset))
+    return page, count, capped
+
+
+@use_replica
+@cached_view(Client, Project, Handover, ProgressLog, EngineerHandoff)
+async def project_list(request):
+    """案件一覧"""
+    projects = filter_projects(projections.project_rows(), request.GET)
+    page, total_count, total_count_capped = await _page_and_count(request, projects)
+    search = request.GET.get('search')
+
+    context = {
+        'projects': page,
+        'page': page,
+        'total_count': total_count,
+        'total_count_capped': total_count_capped,
+        'status_choices': Project.STATUS_CHOICES,
+        'current_status': request.GET.get('status'),
+        'search_query': search,
+        'archived_projects': await _list(archive.search(search)) if search else [],
+    }
+
+    return render(request, 'projects/project_list.html', context)
+
+
+@use_replica
+@cached_view(Client, Project, ProgressLog, EngineerHandoff)
+async def client_list(request):
+    """顧客一覧"""
+    clients = filter_clients(Client.objects.all(), request.GET)
+    page, total_count, total_count_capped = await _page_and_count(request, clients)
+
+    # 案件の集計は表示中のページ分だけ client_id のインデックスで SQL 1本で読む
+    stats = await client_stats.afor_clients([client.pk for client in page])
+    for client in page:
+        client.stats = stats[client.pk]
+
+    context = {
+        'clients': page,
+        'page': page,
+        'total_count': total_count,
+        'total_count_capped': total_count_capped,
+        'search_query': request.GET.get('search'),
+    }
+
+    return render(request, 'projects/client_list.html', context)
+
+
+@cached_view(Client, Project, Handover)
+async def handover_list(request):
+    """引継ぎ一覧"""
+    handovers = filter_handovers(projections.handover_rows(), request.GET)
+    page, total_count, total_count_capped = await _page_and_count(request, handovers)
+
+    context = {
+        'handovers': page,
+        'page': page,
+        'total_count': total_count,
+        'total_count_capped': total_count_capped,
+        'handover_types': Handover.HANDOVER_TYPE_CHOICES,
+        'current_type': request.GET.get('type'),
+        'current_status': request.GET.get('status'),
+        'excerpt_length': projections.EXCERPT_LENGTH,
+    }
+
+    return render(request, 'projects/handover_list.html', context)
+
+
+@cached_view(Client, Project, EngineerHandoff)
+async def engineer_handoff_list(request):
+    """エンジニアバトンタッチ一覧"""
+    handoffs = filter_engineer_handoffs(projections.handoff_rows(), request.GET)
+    page, total_count, total_count_capped = await _page_and_count(request, handoffs)
+
+    context = {
+        'handoffs': page,
+        'page': page,
+        'total_count': total_count,
+        'total_count_capped': total_count_capped,
+        'current_status': request.GET.get('status'),
+        'excerpt_length': projections.EXCERPT_LENGTH,
+    }
+
+    return render(request, 'projects/engineer_handoff_list.html', context)
+
+
+@staff_member_required
+@use_replica
+async def export_data(request, name, fmt):
+    """一覧データのエクスポート（非同期イテレーターで1行ずつ送信する）"""
+    if name not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise Http404
+
+    response = StreamingHttpResponse(
+        exports.astream(name, fmt, request.GET, using=current_read_alias()),
+        content_type=exports.FORMATS[fmt],
+    )
+    filename = f'{name}_{timezone.localtime():%Y%m%d_%H%M%S}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
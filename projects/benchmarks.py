@@ -0,0 +1,340 @@
+"""ビューのベンチマーク
+
+projects/urls.py の各ビューをテストクライアントで繰り返し呼び出し、
+レイテンシ（p50/p95）・SQL クエリ数・取得行数を計測して予算と比較する。
+
+compare_rendering() はメモリ上に作った大量の案件で一覧テンプレートを描画し、
+ステータスの {% if %} 分岐と status_badge フィルタ、行ごとの断片キャッシュの
+有無（初回・2回目）で描画時間を比べる（データベースは使わない）。
+
+compare_servers() は同じ画面の同期版（WSGI）と非同期版（ASGI）に同時に
+リクエストを送り、スループットを比べる。WSGI はスレッドプールから
+WSGI ハンドラーを呼び（gunicorn の gthread ワーカー相当）、ASGI は
+イベントループ上で ASGI ハンドラーを呼ぶ（uvicorn 相当。ソケットは使わない）。
+"""
+import asyncio
+import math
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, connections
+from django.http import QueryDict
+from django.template import Template, Context
+from django.template.loader import render_to_string
+from django.test import AsyncClient, Client as TestClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Client, Project, ProjectSummary
+from .pagination import KeysetPage
+from .templatetags.crm_tags import STATUS_BADGES
+
+# 同期版・非同期版を比べる画面（URL 名, クエリパラメータ）。非同期版は async_ を付けた URL 名
+SERVER_TARGETS = [
+    ('dashboard', 'dashboard', {}),
+    ('project_list', 'project_list', {}),
+    ('project_list_search', 'project_list', {'search': 'クラウド移行'}),
+    ('client_list', 'client_list', {}),
+]
+
+# ビューごとの予算。queries はデータ量に依存しない上限、rows は1リクエストで
+# 取得する行数の上限、p95_ms はレイテンシの上限（ミリ秒）
+DEFAULT_BUDGETS = {
+    # 引継ぎ待ちの件数は担当ごとの件数（QueueCounter）の合計を1本で読む。
+    # 引継ぎ待ちは未完了の行すべてに優先度を付けるため、行数は未完了の件数で決まり rows の予算は設けない
+    'dashboard': {'queries': 6, 'p95_ms': 250},
+    'project_list': {'queries': 2, 'rows': 60, 'p95_ms': 250},
+    'project_list_filtered': {'queries': 2, 'rows': 60, 'p95_ms': 250},
+    # 検索はアーカイブした案件も探す（1本・最大 archive.SEARCH_LIMIT 行）
+    'project_list_search': {'queries': 3, 'rows': 80, 'p95_ms': 500},
+    'project_detail': {'queries': 4, 'p95_ms': 250},
+    # 顧客の案件の集計は表示中の顧客の数によらず1本（client_stats.py）
+    'client_list': {'queries': 3, 'rows': 110, 'p95_ms': 250},
+    'client_detail': {'queries': 4, 'p95_ms': 250},
+    'handover_list': {'queries': 2, 'rows': 60, 'p95_ms': 250},
+    'engineer_handoff_list': {'queries': 2, 'rows': 60, 'p95_ms': 250},
+    # 担当ごとの件数と未完了の行すべて（行数は未完了の件数で決まる）
+    'work_queues': {'queries': 2, 'p95_ms': 250},
+    # 集計テーブルの最終日（2本）・集計テーブル（2本）・未集計分の履歴（全期間ならアーカイブの有無も確認）
+    'pipeline_analytics': {'queries': 6, 'p95_ms': 500},
+    'revenue_forecast': {'queries': 1, 'p95_ms': 250},
+}
+
+
+def get_budgets():
+    """既定の予算に settings.CRM_BENCHMARK_BUDGETS の上書きを反映する"""
+    budgets = {name: dict(budget) for name, budget in DEFAULT_BUDGETS.items()}
+    for name, budget in getattr(settings, 'CRM_BENCHMARK_BUDGETS', {}).items():
+        budgets.setdefault(name, {}).update(budget)
+    return budgets
+
+
+def targets():
+    """計測対象の (名前, URL, クエリパラメータ)"""
+    project = Project.objects.order_by('-created_at', '-pk').first()
+    client = Client.objects.order_by('-created_at', '-pk').first()
+    urls = [
+        ('dashboard', reverse('projects:dashboard'), {}),
+        ('project_list', reverse('projects:project_list'), {}),
+        ('project_list_filtered', reverse('projects:project_list'), {'status': 'negotiation'}),
+        ('project_list_search', reverse('projects:project_list'), {'search': 'クラウド移行'}),
+        ('client_list', reverse('projects:client_list'), {}),
+        ('handover_list', reverse('projects:handover_list'), {'status': 'pending'}),
+        ('engineer_handoff_list', reverse('projects:engineer_handoff_list'), {'status': 'pending'}),
+        ('work_queues', reverse('projects:work_queues'), {'kind': 'handover'}),
+        ('pipeline_analytics', reverse('projects:pipeline_analytics'), {}),
+        ('revenue_forecast', reverse('projects:revenue_forecast'), {}),
+    ]
+    if project is not None:
+        urls.append(('project_detail', reverse('projects:project_detail', args=[project.pk]), {}))
+    if client is not None:
+        urls.append(('client_detail', reverse('projects:client_detail', args=[client.pk]), {}))
+    return urls
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def rows_fetched(queries):
+    """記録した SELECT がそれぞれ返す行数の合計"""
+    total = 0
+    with connection.cursor() as cursor:
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            cursor.execute(f'SELECT COUNT(*) FROM ({sql})')
+            total += cursor.fetchone()[0]
+    return total
+
+
+def measure(client, name, url, params, iterations=20):
+    """1つの URL を計測する（キャッシュは無効化して SQL を必ず通す）"""
+    timings = []
+    with override_settings(CRM_VIEW_CACHE_TIMEOUT=0):
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = client.get(url, params)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise AssertionError(f'{name}: HTTP {response.status_code}')
+    return {
+        'view': name,
+        'url': url,
+        'params': params,
+        'iterations': iterations,
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'queries': len(ctx.captured_queries),
+        'rows': rows_fetched(ctx.captured_queries),
+    }
+
+
+def run(iterations=20):
+    """全ビューを計測して結果のリストを返す"""
+    client = TestClient()
+    return [measure(client, name, url, params, iterations) for name, url, params in targets()]
+
+
+def _throughput(view, server, concurrency, timings, elapsed):
+    return {
+        'view': view,
+        'server': server,
+        'concurrency': concurrency,
+        'requests': len(timings),
+        'rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+    }
+
+
+def _wsgi_load(url, params, concurrency, requests):
+    """スレッドごとにテストクライアントを持ち、同期ビューを同時に呼び出す"""
+    def worker(count):
+        client = TestClient()
+        timings = []
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                response = client.get(url, params)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise AssertionError(f'{url}: HTTP {response.status_code}')
+        finally:
+            # ワーカースレッドが開いた接続を閉じる
+            connections.close_all()
+        return timings
+
+    counts = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        timings = [timing for result in pool.map(worker, counts) for timing in result]
+    return timings, time.perf_counter() - started
+
+
+async def _asgi_load(url, params, concurrency, requests):
+    """1つのイベントループから非同期ビューを同時に呼び出す"""
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(url, params)
+            if response.status_code != 200:
+                raise AssertionError(f'{url}: HTTP {response.status_code}')
+            return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    timings = await asyncio.gather(*(one() for _ in range(requests)))
+    return list(timings), time.perf_counter() - started
+
+
+def compare_servers(concurrency=8, requests=200, server_targets=None):
+    """同期版（WSGI）と非同期版（ASGI）のスループットを計測する
+
+    非同期版の ORM は呼び出し元のスレッドで実行されるよう async_to_sync から起動する。
+    """
+    results = []
+    with override_settings(CRM_VIEW_CACHE_TIMEOUT=0):
+        for name, url_name, params in server_targets or SERVER_TARGETS:
+            timings, elapsed = _wsgi_load(reverse(f'projects:{url_name}'), params, concurrency, requests)
+            results.append(_throughput(name, 'wsgi', concurrency, timings, elapsed))
+            timings, elapsed = async_to_sync(_asgi_load)(
+                reverse(f'projects:async_{url_name}'), params, concurrency, requests,
+            )
+            results.append(_throughput(name, 'asgi', concurrency, timings, elapsed))
+    return results
+
+
+def check_budgets(results, budgets=None):
+    """予算を超えた項目を説明する文字列のリストを返す"""
+    budgets = get_budgets() if budgets is None else budgets
+    violations = []
+    for result in results:
+        for metric, limit in budgets.get(result['view'], {}).items():
+            if result[metric] > limit:
+                violations.append(f"{result['view']}: {metric}={result[metric]} (予算 {limit})")
+    return violations
+
+
+def compare(results, baseline):
+    """前回の結果との差分を説明する文字列のリストを返す"""
+    previous = {result['view']: result for result in baseline}
+    lines = []
+    for result in results:
+        before = previous.get(result['view'])
+        if before is None:
+            continue
+        changes = []
+        for metric in ('p50_ms', 'p95_ms', 'queries', 'rows'):
+            delta = result[metric] - before[metric]
+            if delta:
+                changes.append(f'{metric} {before[metric]} → {result[metric]} ({delta:+g})')
+        if changes:
+            lines.append(f"{result['view']}: " + ', '.join(changes))
+    return lines
+
+
+# 描画ベンチマークの行テンプレート（%s にステータスの表示部分が入る）
+RENDER_ROW = (
+    '<tr><td>{{ project.title }}</td><td>{{ project.client.company_name }}</td><td>%s</td>'
+    '<td>{{ project.created_at|date:"Y/m/d" }}</td></tr>'
+)
+
+
+def _status_if_chain():
+    """status_badge 導入前と同じ、ステータスごとの {% if %} / {% elif %} の連鎖"""
+    branches = [
+        f"{{% {'if' if index == 0 else 'elif'} project.status == '{value}' %}}{badge}"
+        for index, (value, badge) in enumerate(STATUS_BADGES.items())
+    ]
+    return ''.join(branches) + '{% endif %}'
+
+
+def sample_rows(count):
+    """描画用の案件（保存しない）。断片キャッシュのキーが重ならないよう pk は連番にする"""
+    client = Client(pk=1, company_name='株式会社ベンチマーク', contact_person='山田太郎')
+    statuses = [value for value, _ in Project.STATUS_CHOICES]
+    now = timezone.now()
+    projects = []
+    for index in range(count):
+        project = Project(
+            pk=index + 1, client=client, title=f'ベンチマーク案件{index}', status=statuses[index % len(statuses)],
+            estimated_amount=1000000 + index, start_date=now.date(),
+            created_at=now - timedelta(minutes=index), updated_at=now,
+        )
+        project.summary = ProjectSummary(project=project, last_log_date=now, log_count=index % 5)
+        projects.append(project)
+    return projects
+
+
+def _time_render(render, iterations, before=None):
+    timings = []
+    for _ in range(iterations):
+        if before:
+            before()
+        started = time.perf_counter()
+        output = render()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, output
+
+
+def _render_result(variant, rows, timings):
+    p50 = statistics.median(timings)
+    return {
+        'variant': variant,
+        'rows': rows,
+        'p50_ms': round(p50, 2),
+        'per_row_us': round(p50 * 1000 / rows, 2),
+    }
+
+
+def compare_rendering(rows=10000, iterations=3):
+    """一覧の描画時間を描画方法ごとに計測する（描画結果が一致しなければ AssertionError）"""
+    projects = sample_rows(rows)
+    results = []
+
+    outputs = {}
+    for variant, status in (('if_chain', _status_if_chain()), ('status_badge', '{{ project.status|status_badge }}')):
+        template = Template('{% load crm_tags %}{% for project in projects %}' + RENDER_ROW % status + '{% endfor %}')
+        context = Context({'projects': projects})
+        timings, outputs[variant] = _time_render(lambda: template.render(context), iterations)
+        results.append(_render_result(variant, rows, timings))
+    if outputs['if_chain'] != outputs['status_badge']:
+        raise AssertionError('status_badge の描画結果が {% if %} の連鎖と一致しません')
+
+    # 実際の案件一覧テンプレート（行ごとの {% cache %}）
+    page = KeysetPage(projects, None, None, QueryDict(mutable=True))
+    context = {'projects': page, 'page': page, 'total_count': rows, 'status_choices': Project.STATUS_CHOICES}
+
+    def render():
+        return render_to_string('projects/project_list.html', context)
+
+    dummy = {**settings.CACHES, 'fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    with override_settings(CACHES=dummy):
+        timings, uncached = _time_render(render, iterations)
+    results.append(_render_result('project_list_no_fragment_cache', rows, timings))
+
+    # 件数が多いときも全行が残るよう、計測中は上限を広げた断片キャッシュを使う
+    fragments_settings = {**settings.CACHES['fragments'], 'OPTIONS': {'MAX_ENTRIES': rows * 2}}
+    with override_settings(CACHES={**settings.CACHES, 'fragments': fragments_settings}):
+        fragments = caches['fragments']
+        timings, cold = _time_render(render, iterations, before=fragments.clear)
+        results.append(_render_result('project_list_fragment_cold', rows, timings))
+        timings, warm = _time_render(render, iterations)
+        results.append(_render_result('project_list_fragment_warm', rows, timings))
+        fragments.clear()
+    if not uncached == cold == warm:
+        raise AssertionError('断片キャッシュの有無で案件一覧の描画結果が一致しません')
+    return results
@@ -0,0 +1,116 @@
+"""ビュー単位のレスポンスキャッシュ
+
+キャッシュキーにはビューが依存するモデルごとのバージョン番号を含める。
+モデルの保存・削除時にバージョンを上げるため（signals.py）、古いキャッシュは
+参照されなくなり、期限切れで自然に消える。
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .replica import current_read_alias
+
+VERSION_KEY = 'projects:version:{}'
+VIEW_KEY = 'projects:view:{path}:{db}:{versions}:{query}'
+
+
+def _version_key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def bump_version(*models):
+    """モデルのバージョンを上げて、依存するビューのキャッシュを無効化する"""
+    for model in models:
+        key = _version_key(model)
+        # add は未登録のときだけ成功する。バージョンは期限なしで保持する
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+def bump_version_on_commit(*models):
+    """保存直後とコミット後の両方でバージョンを上げる
+
+    コミット前に別リクエストが古いデータを新しいバージョンでキャッシュする
+    ことがあるため、コミット後にもう一度上げておく。
+    """
+    bump_version(*models)
+    transaction.on_commit(lambda: bump_version(*models))
+
+
+def _versions(models, values=None):
+    keys = [_version_key(model) for model in models]
+    values = cache.get_many(keys) if values is None else values
+    return '.'.join(str(values.get(key, 0)) for key in keys)
+
+
+def _normalized_query(request):
+    """空の値を除き、キー順に並べたクエリ文字列のハッシュ"""
+    items = sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        for value in values
+        if value
+    )
+    return hashlib.md5(repr(items).encode()).hexdigest()
+
+
+def view_cache_key(request, models, versions=None):
+    return VIEW_KEY.format(
+        path=request.path,
+        # レプリカとプライマリの内容は一致しないことがあるため分けて保存する
+        db=current_read_alias(),
+        versions=_versions(models, versions),
+        query=_normalized_query(request),
+    )
+
+
+async def aview_cache_key(request, models):
+    """view_cache_key() の非同期版"""
+    versions = await cache.aget_many([_version_key(model) for model in models])
+    return view_cache_key(request, models, versions)
+
+
+def cached_view(*models):
+    """依存モデルのバージョンをキーに含めてレスポンスをキャッシュする
+
+    async def のビューにも使える（キャッシュは aget / aset で読み書きする）。
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                timeout = settings.CRM_VIEW_CACHE_TIMEOUT
+                if not timeout or request.method not in ('GET', 'HEAD'):
+                    return await view_func(request, *args, **kwargs)
+
+                key = await aview_cache_key(request, models)
+                response = await cache.aget(key)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                    if response.status_code == 200:
+                        await cache.aset(key, response, timeout)
+                return response
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            timeout = settings.CRM_VIEW_CACHE_TIMEOUT
+            if not timeout or request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            key = view_cache_key(request, models)
+            response = cache.get(key)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
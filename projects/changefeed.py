@@ -0,0 +1,96 @@
+"""外部システム向けの変更履歴（差分同期）
+
+顧客・案件・引継ぎ・進捗記録・バトンタッチの保存・削除のたびに、シグナル（signals.py）から
+ChangeLog に (モデル, id, 操作) を1行追記する。ChangeLog の id は SQLite の AUTOINCREMENT で
+単調に増え（削除しても再利用されない）、書き込みは1つずつ直列に行われるため、
+「N 番より後」を読めば取りこぼしなく差分だけを受け取れる。
+
+シグナルを通らない一括処理（CSV インポート・API の一括登録・サンプルデータ投入）は
+record() / record_queryset() / reset() でまとめて追記する。
+
+行の内容は持たず、読むとき（api.change_feed）に今の行を引く。同じ行の古い履歴は
+新しい履歴があれば要らないため、compact() は保持期間を過ぎた履歴のうち、
+行ごとに最新でないものを削除する（削除の履歴も最新なら残すので、古い位置から読んでも
+最終的な状態は一致する）。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Client, Project, Handover, ProgressLog, EngineerHandoff, ChangeLog, ChangeFeedConsumer
+
+TRACKED_MODELS = (Client, Project, Handover, ProgressLog, EngineerHandoff)
+
+
+def _name(model):
+    return model._meta.model_name
+
+
+def record(model, ids, action='save'):
+    """行ごとの履歴をまとめて追記する"""
+    now = timezone.now()
+    ChangeLog.objects.bulk_create(
+        [ChangeLog(model=_name(model), object_id=pk, action=action, changed_at=now) for pk in ids],
+        batch_size=1000,
+    )
+
+
+def record_queryset(queryset, action='save'):
+    """クエリセットの全行の履歴を INSERT ... SELECT 1本で追記する（行を Python に読み込まない）"""
+    db = connections[DEFAULT_DB_ALIAS]
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    changed_at = ChangeLog._meta.get_field('changed_at').get_db_prep_save(timezone.now(), db)
+    quote = db.ops.quote_name
+    columns = ', '.join(quote(ChangeLog._meta.get_field(name).column)
+                        for name in ('model', 'object_id', 'action', 'changed_at'))
+    pk = quote(queryset.model._meta.pk.column)
+    with db.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(ChangeLog._meta.db_table)} ({columns}) '
+            f'SELECT %s, {pk}, %s, %s FROM {quote(queryset.model._meta.db_table)} '
+            f'WHERE {pk} IN ({sql}) ORDER BY {pk}',
+            [_name(queryset.model), action, changed_at, *params],
+        )
+
+
+def reset(models):
+    """全行を削除したモデルの印を追記する（読み手は手元のコピーを空にする）"""
+    now = timezone.now()
+    ChangeLog.objects.bulk_create(
+        [ChangeLog(model=_name(model), object_id=None, action='reset', changed_at=now) for model in models]
+    )
+
+
+def entries(after, limit, models=None):
+    """after 番より後の履歴を古い順に limit 件"""
+    queryset = ChangeLog.objects.filter(pk__gt=after)
+    if models is not None:
+        queryset = queryset.filter(model__in=[_name(model) for model in models])
+    return list(queryset.order_by('pk')[:limit])
+
+
+def retention():
+    return timedelta(days=settings.CRM_CHANGE_FEED_RETENTION_DAYS)
+
+
+def compact(before=None):
+    """before（既定は保持期間の始まり）より古い履歴のうち、行ごとに最新でないものを削除して件数を返す"""
+    before = before or timezone.now() - retention()
+    latest = ChangeLog.objects.order_by().values('model', 'object_id').annotate(last=Max('pk')).values('last')
+    deleted, _ = ChangeLog.objects.filter(changed_at__lt=before).exclude(pk__in=latest).delete()
+    return deleted
+
+
+def last_seq():
+    return ChangeLog.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def consumer_position(name):
+    return ChangeFeedConsumer.objects.get_or_create(name=name)[0].last_seq
+
+
+def save_consumer_position(name, seq):
+    ChangeFeedConsumer.objects.update_or_create(name=name, defaults={'last_seq': seq})
@@ -0,0 +1,99 @@
+"""顧客ごとの案件の集計（顧客一覧・顧客詳細）
+
+表示中の顧客の案件を顧客ごとに、ステータス別の件数・見積金額の合計・受注額・
+最終活動日時・承認待ちのバトンタッチ数にまとめる（ステータス別の件数は条件付きの COUNT）。
+進行中の案件（Project と案件サマリー）とアーカイブした案件（ArchivedProject）を
+UNION ALL でつないだ SQL 1本で読むため、クエリ数は表示する顧客の数によらず、
+返す行も顧客ごとに高々2行になる。client_id のインデックスで表示中の顧客の案件だけを
+読み、並べ替えずにそのまま集計できる。
+"""
+from django.db.models import BooleanField, Count, IntegerField, Max, Q, Sum, Value
+
+from .models import Project, ArchivedProject
+
+STATUSES = [value for value, _ in Project.STATUS_CHOICES]
+
+
+class ClientStats:
+    """1社分の集計"""
+
+    def __init__(self):
+        self.status_counts = dict.fromkeys(STATUSES, 0)
+        self.total_amount = 0
+        self.won_amount = 0
+        self.last_activity = None
+        self.pending_handoffs = 0
+        self.archived_count = 0
+
+    def add(self, row):
+        for status in STATUSES:
+            self.status_counts[status] += row[f'count_{status}']
+        self.total_amount += row['amount'] or 0
+        self.won_amount += row['won_amount'] or 0
+        if row['last_activity'] and (self.last_activity is None or row['last_activity'] > self.last_activity):
+            self.last_activity = row['last_activity']
+        self.pending_handoffs += row['pending_handoffs'] or 0
+        if row['archived']:
+            self.archived_count += sum(row[f'count_{status}'] for status in STATUSES)
+
+    @property
+    def project_count(self):
+        return sum(self.status_counts.values())
+
+    @property
+    def active_count(self):
+        return sum(self.status_counts[status] for status in Project.ACTIVE_STATUSES)
+
+    @property
+    def by_status(self):
+        """[(ステータス, 件数)]（ステータスの定義順。0件のステータスは除く）"""
+        return [(status, count) for status, count in self.status_counts.items() if count]
+
+
+def _aggregates(**extra):
+    aggregates = {f'count_{status}': Count('id', filter=Q(status=status)) for status in STATUSES}
+    aggregates['amount'] = Sum('estimated_amount')
+    aggregates['won_amount'] = Sum('estimated_amount', filter=Q(status__in=Project.WON_STATUSES))
+    aggregates.update(extra)
+    return aggregates
+
+
+def _rows(client_ids):
+    active = (
+        Project.objects.filter(client_id__in=client_ids)
+        .order_by().values('client')
+        .annotate(**_aggregates(
+            last_activity=Max('summary__last_log_date'),
+            pending_handoffs=Sum('summary__pending_handoff_count'),
+            archived=Value(False, output_field=BooleanField()),
+        ))
+    )
+    archived = (
+        ArchivedProject.objects.filter(client_id__in=client_ids)
+        .order_by().values('client')
+        .annotate(**_aggregates(
+            last_activity=Max('last_log_date'),
+            pending_handoffs=Value(0, output_field=IntegerField()),
+            archived=Value(True, output_field=BooleanField()),
+        ))
+    )
+    return active.union(archived, all=True)
+
+
+def for_clients(client_ids):
+    """{顧客 id: ClientStats}（案件のない顧客も空の集計を持つ）"""
+    stats = {pk: ClientStats() for pk in client_ids}
+    if stats:
+        for row in _rows(list(stats)):
+            stats[row['client']].add(row)
+    return stats
+
+
+async def afor_clients(client_ids):
+    """for_clients() の非同期版"""
+    stats = {pk: ClientStats() for pk in client_ids}
+    if stats:
+        async for row in _rows(list(stats)):
+            stats[row['client']].add(row)
+    return stats
+
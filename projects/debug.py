@@ -0,0 +1,127 @@
+"""外部キー・読み込んでいない列の遅延読み込み（N+1 クエリ）の検出
+
+select_related されていない外部キーへのアクセスは
+ForwardManyToOneDescriptor.get_object を経由して、only() / defer() で除いた列への
+アクセスは DeferredAttribute.__get__ を経由して、1件ずつ SQL を発行する。
+これを記録し、テストでは例外に、開発時はミドルウェアでログに出す。
+"""
+import contextvars
+import logging
+import traceback
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
+from django.db.models.query_utils import DeferredAttribute
+
+logger = logging.getLogger(__name__)
+
+# 入れ子の記録区間すべてに記録するため、記録先をタプルで持つ
+_recorders = contextvars.ContextVar('lazy_load_recorders', default=())
+_installed = False
+
+
+class LazyLoadError(AssertionError):
+    """禁止区間で外部キー・未読み込みの列の遅延読み込みが発生した"""
+
+
+def _record(field):
+    recorders = _recorders.get()
+    if recorders:
+        event = {'field': field, 'stack': ''.join(traceback.format_stack(limit=9)[:-2])}
+        for events in recorders:
+            events.append(event)
+
+
+def _install():
+    """get_object と DeferredAttribute.__get__ を記録付きのものに差し替える（一度だけ）"""
+    global _installed
+    if _installed:
+        return
+    original = ForwardManyToOneDescriptor.get_object
+    original_deferred = DeferredAttribute.__get__
+
+    def get_object(self, instance):
+        _record(f'{type(instance).__name__}.{self.field.name}')
+        return original(self, instance)
+
+    def deferred_get(self, instance, cls=None):
+        # 読み込み済みの列は instance.__dict__ から返るため、ここに来るのは未読み込みの列だけ
+        if instance is not None and self.field.attname not in instance.__dict__:
+            _record(f'{type(instance).__name__}.{self.field.attname}（未読み込みの列）')
+        return original_deferred(self, instance, cls)
+
+    ForwardManyToOneDescriptor.get_object = get_object
+    DeferredAttribute.__get__ = deferred_get
+    _installed = True
+
+
+@contextmanager
+def record_lazy_loads():
+    """区間内で発生した外部キー・未読み込みの列の遅延読み込みをリストに記録する"""
+    _install()
+    events = []
+    token = _recorders.set(_recorders.get() + (events,))
+    try:
+        yield events
+    finally:
+        _recorders.reset(token)
+
+
+@contextmanager
+def forbid_lazy_loads():
+    """区間内で外部キー・未読み込みの列の遅延読み込みが発生したら LazyLoadError を送出する"""
+    with record_lazy_loads() as events:
+        yield events
+    if events:
+        fields = sorted({event['field'] for event in events})
+        raise LazyLoadError(
+            f'遅延読み込みが {len(events)} 回発生しました: {", ".join(fields)}\n'
+            + events[0]['stack']
+        )
+
+
+class LazyLoadDetectionMiddleware:
+    """リクエスト中の外部キー・未読み込みの列の遅延読み込みをログに出す
+
+    settings.CRM_DETECT_LAZY_LOADS が True のときだけ有効。
+    ASGI で非同期ビューを同期に変換しないよう、同期・非同期の両方に対応する。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'CRM_DETECT_LAZY_LOADS', False)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        # TemplateResponse の描画もビューの呼び出し内で済むため、この区間に含まれる
+        with record_lazy_loads() as events:
+            response = self.get_response(request)
+        self._report(request, events)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        # sync_to_async はコンテキストを引き継ぐため、ORM を実行するスレッドでも記録される
+        with record_lazy_loads() as events:
+            response = await self.get_response(request)
+        self._report(request, events)
+        return response
+
+    def _report(self, request, events):
+        if events:
+            fields = sorted({event['field'] for event in events})
+            logger.warning(
+                '%s: 遅延読み込み %d 回 (%s)\n%s',
+                request.path, len(events), ', '.join(fields), events[0]['stack'],
+            )
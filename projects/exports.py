@@ -0,0 +1,151 @@
+"""CSV / JSONL のストリーミングエクスポート
+
+行はモデルインスタンスを作らず values_list().iterator(chunk_size) で
+少しずつ読み出し、1行ずつ文字列にして返す。件数に関係なくメモリ使用量が
+一定で、先頭行からすぐに送信を始められる。
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .filters import (
+    filter_projects, filter_clients, filter_handovers, filter_engineer_handoffs, filter_by_project,
+)
+from .models import Client, Project, Handover, ProgressLog, EngineerHandoff
+
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _projects(params):
+    return filter_projects(Project.objects.all(), params)
+
+
+def _clients(params):
+    return filter_clients(Client.objects.all(), params)
+
+
+def _progress_logs(params):
+    return filter_by_project(ProgressLog.objects.all(), params)
+
+
+def _handovers(params):
+    return filter_by_project(filter_handovers(Handover.objects.all(), params), params)
+
+
+def _engineer_handoffs(params):
+    return filter_by_project(filter_engineer_handoffs(EngineerHandoff.objects.all(), params), params)
+
+
+# エクスポート名 → (クエリセットを返す関数, 出力する列)
+EXPORTS = {
+    'projects': (_projects, [
+        'id', 'external_id', 'title', 'status', 'estimated_amount', 'start_date', 'end_date',
+        'consultation_content', 'proposal_content', 'created_at', 'updated_at',
+        'client_id', 'client__company_name', 'client__contact_person', 'client__email', 'client__industry',
+    ]),
+    'clients': (_clients, [
+        'id', 'company_name', 'contact_person', 'email', 'phone', 'industry', 'company_size', 'created_at',
+    ]),
+    'progress_logs': (_progress_logs, [
+        'id', 'project_id', 'project__title', 'log_date', 'activity_type', 'content', 'next_action', 'created_by',
+    ]),
+    'handovers': (_handovers, [
+        'id', 'project_id', 'project__title', 'handover_type', 'handover_to', 'handover_date',
+        'handover_content', 'technical_requirements', 'notes', 'is_completed',
+    ]),
+    'engineer_handoffs': (_engineer_handoffs, [
+        'id', 'project_id', 'project__title', 'engineer_name', 'handoff_date', 'technical_scope',
+        'current_status', 'client_requirements', 'timeline', 'budget', 'special_notes', 'is_accepted',
+    ]),
+}
+
+
+def plain_value(value):
+    """CSV / JSON に書ける値に変換する"""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else str(value)
+    return value
+
+
+def export_rows(name, params, chunk_size=DEFAULT_CHUNK_SIZE, using=None):
+    """(列名, 行のイテレータ) を返す
+
+    ストリーミング中はビューの外で行を読むため、読み取り先は using で固定する。
+    """
+    build_queryset, columns = EXPORTS[name]
+    queryset = build_queryset(params).values_list(*columns)
+    if using:
+        queryset = queryset.using(using)
+    return columns, queryset.iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """csv.writer の書き込み先。書いた文字列をそのまま返す"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_header(writer, columns):
+    # Excel で文字化けしないよう BOM を付ける
+    return '\ufeff' + writer.writerow(columns)
+
+
+def _csv_line(writer, row):
+    return writer.writerow([plain_value(value) for value in row])
+
+
+def _jsonl_line(columns, row):
+    record = {column: plain_value(value) for column, value in zip(columns, row)}
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield _csv_header(writer, columns)
+    for row in rows:
+        yield _csv_line(writer, row)
+
+
+def stream_jsonl(columns, rows):
+    for row in rows:
+        yield _jsonl_line(columns, row)
+
+
+def stream(name, fmt, params, chunk_size=DEFAULT_CHUNK_SIZE, using=None):
+    """エクスポート内容を1行ずつ返すジェネレーター"""
+    columns, rows = export_rows(name, params, chunk_size, using)
+    if fmt == 'csv':
+        return stream_csv(columns, rows)
+    return stream_jsonl(columns, rows)
+
+
+def _next_chunk(rows, chunk_size):
+    return list(islice(rows, chunk_size))
+
+
+async def astream(name, fmt, params, chunk_size=DEFAULT_CHUNK_SIZE, using=None):
+    """stream() の非同期版。ASGI の StreamingHttpResponse にそのまま渡せる"""
+    columns, rows = export_rows(name, params, chunk_size, using)
+    writer = csv.writer(_Echo())
+    if fmt == 'csv':
+        yield _csv_header(writer, columns)
+    # values_list().aiterator() は Django 5.2 では最初の SQL を非同期コンテキストで
+    # 実行してしまうため、同期イテレーターを chunk_size 行ずつ sync_to_async で読む
+    next_chunk = sync_to_async(_next_chunk)
+    while chunk := await next_chunk(rows, chunk_size):
+        for row in chunk:
+            yield _csv_line(writer, row) if fmt == 'csv' else _jsonl_line(columns, row)
@@ -0,0 +1,58 @@
+"""一覧画面・エクスポート共通の絞り込み条件
+
+params は request.GET などの .get() を持つマッピング。
+"""
+from .models import Project
+from .search import search_projects, search_clients
+
+
+def filter_projects(projects, params):
+    """案件一覧の絞り込み（status / search）"""
+    status = params.get('status')
+    if status:
+        projects = projects.filter(status=status)
+
+    search = params.get('search')
+    if search:
+        projects = search_projects(projects, search)
+    return projects
+
+
+def filter_clients(clients, params):
+    """顧客一覧の絞り込み（search）"""
+    search = params.get('search')
+    if search:
+        clients = search_clients(clients, search)
+    return clients
+
+
+def filter_handovers(handovers, params):
+    """引継ぎ一覧の絞り込み（type / status=pending|completed）"""
+    handover_type = params.get('type')
+    if handover_type:
+        handovers = handovers.filter(handover_type=handover_type)
+
+    status = params.get('status')
+    if status == 'pending':
+        handovers = handovers.filter(is_completed=False)
+    elif status == 'completed':
+        handovers = handovers.filter(is_completed=True)
+    return handovers
+
+
+def filter_engineer_handoffs(handoffs, params):
+    """エンジニアバトンタッチ一覧の絞り込み（status=pending|accepted）"""
+    status = params.get('status')
+    if status == 'pending':
+        handoffs = handoffs.filter(is_accepted=False)
+    elif status == 'accepted':
+        handoffs = handoffs.filter(is_accepted=True)
+    return handoffs
+
+
+def filter_by_project(queryset, params):
+    """活動記録などを、紐づく案件に対する案件一覧と同じ条件で絞り込む"""
+    if not params.get('status') and not params.get('search'):
+        return queryset
+    projects = filter_projects(Project.objects.all(), params)
+    return queryset.filter(project__in=projects.order_by().values('pk'))
@@ -0,0 +1,240 @@
+"""売上予測（ステージ確度で重み付けした見積金額の月別按分）
+
+案件の見積金額にステータスごとの確度（STAGE_PROBABILITIES）を掛け、
+開始日〜終了日の各月に均等に按分する。エンジニアバトンタッチの予算も
+案件の期間・確度で同じように按分し、粗利の見込みを出す。
+
+案件を1件ずつ読むのではなく、(ステータス, 開始月, 終了月) ごとに合計した
+行を SQL 1本で取得する。数十万件の案件でも行数は高々数千になり、
+月ごとの配列には差分配列（開始月に足して終了月の翌月で引き、最後に累積）で
+加えるため、計算量は案件数ではなく集計行数と月数で決まる。
+
+結果はその日のうちは変わらないものとしてキャッシュする（日付をキーに含め、
+翌日の0時に期限切れ）。一括取込みなどでまとめて変わったときは invalidate() を呼ぶ。
+"""
+import hashlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Project, EngineerHandoff
+
+# ステータスごとの受注確度（settings.CRM_FORECAST_PROBABILITIES で上書きできる）
+STAGE_PROBABILITIES = {
+    'inquiry': 0.05,
+    'hearing': 0.1,
+    'proposal': 0.2,
+    'quotation': 0.4,
+    'negotiation': 0.6,
+    'handover': 0.9,
+    'in_progress': 1.0,
+    'completed': 1.0,
+    'on_hold': 0.1,
+    'lost': 0.0,
+}
+# 時期未定（開始日なし）に含めないステータス
+CLOSED_STATUSES = ['completed', 'lost']
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 36
+STATUS_LABELS = dict(Project.STATUS_CHOICES)
+CACHE_KEY = 'projects:forecast:{generation}:{day}:{months}:{probabilities}'
+GENERATION_KEY = 'projects:forecast:generation'
+
+
+def get_probabilities():
+    """既定の確度に settings.CRM_FORECAST_PROBABILITIES の上書きを反映する"""
+    probabilities = dict(STAGE_PROBABILITIES)
+    probabilities.update(getattr(settings, 'CRM_FORECAST_PROBABILITIES', {}))
+    return probabilities
+
+
+def _month_index(value):
+    """日付（SQLite では 'YYYY-MM-DD' の文字列）を 年×12＋月 の通し番号にする"""
+    if isinstance(value, str):
+        value = parse_date(value[:10])
+    return value.year * 12 + value.month - 1
+
+
+def _month_start(index):
+    year, month = divmod(index, 12)
+    return datetime(year, month + 1, 1).date()
+
+
+def _month_sql(db, column):
+    """日付の列を月初日にする SQL（SQLite では行ごとに Python を呼ばない date() を使う）"""
+    if db.vendor == 'sqlite':
+        return f"date({column}, 'start of month')", []
+    sql, params = db.ops.date_trunc_sql('month', column, ())
+    return sql, list(params)
+
+
+def _forecast_sql(db, statuses, window_start, window_end):
+    """見積金額と予算を (種類, ステータス, 開始月, 終了月) ごとに合計する SQL
+
+    予測期間に重なる案件と、開始日が未定の案件（終了日によらない）だけを対象にする。
+    終了日が開始日より前の案件は開始月だけの案件として扱う（compute() と同じ）。
+    """
+    project = db.ops.quote_name(Project._meta.db_table)
+    handoff = db.ops.quote_name(EngineerHandoff._meta.db_table)
+    start_sql, start_params = _month_sql(db, 'p.start_date')
+    end_sql, end_params = _month_sql(db, 'p.end_date')
+    placeholders = ', '.join(['%s'] * len(statuses))
+    where = f"""
+        p.status IN ({placeholders})
+        AND (p.start_date IS NULL OR (
+            p.start_date <= %s
+            AND (p.end_date >= %s OR ((p.end_date IS NULL OR p.end_date < p.start_date) AND p.start_date >= %s))
+        ))
+    """
+    where_params = [*statuses, window_end, window_start, window_start]
+    select = f'p.status, {start_sql}, {end_sql}'
+    select_params = start_params + end_params
+    sql = f"""
+        SELECT 'amount', {select}, SUM(p.estimated_amount), COUNT(*)
+        FROM {project} p
+        WHERE p.estimated_amount IS NOT NULL AND {where}
+        GROUP BY 1, 2, 3, 4
+        UNION ALL
+        SELECT 'budget', {select}, SUM(h.budget), COUNT(*)
+        FROM {handoff} h
+        INNER JOIN {project} p ON p.id = h.project_id
+        WHERE h.budget IS NOT NULL AND {where}
+        GROUP BY 1, 2, 3, 4
+    """
+    return sql, select_params + where_params + select_params + where_params
+
+
+def _accumulate(diff):
+    """差分配列を累積して月ごとの値にする（末尾の番兵は捨てる）"""
+    values, total = [], 0
+    for delta in diff[:-1]:
+        total += delta
+        values.append(total)
+    return values
+
+
+def compute(months=DEFAULT_MONTHS, today=None):
+    """今月から months か月分の売上予測を集計する（キャッシュしない）"""
+    today = today or timezone.localdate()
+    probabilities = get_probabilities()
+    statuses = [status for status, probability in probabilities.items() if probability > 0]
+    first = _month_index(today)
+    last = first + months - 1
+    window_start = _month_start(first)
+    window_end = _month_start(last + 1) - timedelta(days=1)
+
+    rows = []
+    if statuses:
+        db = connections[router.db_for_read(Project)]
+        with db.cursor() as cursor:
+            cursor.execute(*_forecast_sql(db, statuses, window_start, window_end))
+            rows = cursor.fetchall()
+
+    # 月ごとの差分配列（末尾は終了月の翌月が期間外のときの番兵）
+    series = {name: [0] * (months + 1) for name in ('amount', 'weighted', 'budget', 'projects')}
+    by_status = {
+        status: {'count': 0, 'amount': 0.0, 'weighted': 0.0, 'budget': 0.0}
+        for status in statuses
+    }
+    unscheduled = {'count': 0, 'amount': 0.0, 'weighted': 0.0, 'budget': 0.0}
+
+    for kind, status, start, end, total, count in rows:
+        probability = probabilities[status]
+        total = float(total)
+        if start is None:
+            if status in CLOSED_STATUSES:
+                continue
+            if kind == 'amount':
+                unscheduled['count'] += count
+                unscheduled['amount'] += total
+                unscheduled['weighted'] += total * probability
+            else:
+                unscheduled['budget'] += total * probability
+            continue
+
+        start = _month_index(start)
+        # 終了日がない・開始日より前の案件は開始月だけに計上する
+        end = max(_month_index(end), start) if end is not None else start
+        # 開始月〜終了月に均等に按分し、予測期間に入る月だけを加える
+        per_month = total / (end - start + 1)
+        begin, finish = max(start, first) - first, min(end, last) - first
+        if begin > finish:
+            continue
+        share = per_month * (finish - begin + 1)
+        totals = by_status[status]
+        if kind == 'amount':
+            for name, value in (('amount', per_month), ('weighted', per_month * probability), ('projects', count)):
+                series[name][begin] += value
+                series[name][finish + 1] -= value
+            totals['count'] += count
+            totals['amount'] += share
+            totals['weighted'] += share * probability
+        else:
+            series['budget'][begin] += per_month * probability
+            series['budget'][finish + 1] -= per_month * probability
+            totals['budget'] += share * probability
+
+    columns = {name: _accumulate(diff) for name, diff in series.items()}
+    month_rows = [
+        {
+            'month': _month_start(first + offset),
+            'amount': columns['amount'][offset],
+            'weighted': columns['weighted'][offset],
+            'budget': columns['budget'][offset],
+            'margin': columns['weighted'][offset] - columns['budget'][offset],
+            'projects': columns['projects'][offset],
+        }
+        for offset in range(months)
+    ]
+    stage_rows = [
+        {'status': status, 'label': STATUS_LABELS.get(status, status), 'probability': probabilities[status], **totals}
+        for status, totals in by_status.items()
+        if totals['count'] or totals['budget']
+    ]
+    weighted = sum(row['weighted'] for row in month_rows)
+    budget = sum(row['budget'] for row in month_rows)
+    return {
+        'months': month_rows,
+        'stages': stage_rows,
+        'unscheduled': unscheduled,
+        'totals': {
+            'amount': sum(row['amount'] for row in month_rows),
+            'weighted': weighted,
+            'budget': budget,
+            'margin': weighted - budget,
+        },
+        'computed_at': timezone.now(),
+    }
+
+
+def _cache_key(day, months):
+    probabilities = hashlib.md5(repr(sorted(get_probabilities().items())).encode()).hexdigest()[:8]
+    generation = cache.get(GENERATION_KEY, 0)
+    return CACHE_KEY.format(generation=generation, day=day.isoformat(), months=months, probabilities=probabilities)
+
+
+def report(months=DEFAULT_MONTHS):
+    """今日の売上予測。同じ日・同じ月数の2回目以降はキャッシュから返す"""
+    months = min(max(months, 1), MAX_MONTHS)
+    today = timezone.localdate()
+    key = _cache_key(today, months)
+    result = cache.get(key)
+    if result is None:
+        result = compute(months, today)
+        # 翌日の0時（ローカルタイム）まで保持する
+        midnight = timezone.make_aware(datetime.combine(today + timedelta(days=1), time()))
+        cache.set(key, result, timeout=max(int((midnight - timezone.now()).total_seconds()), 1))
+    return result
+
+
+def invalidate():
+    """キャッシュ済みの予測を捨てる（一括取込みなど、案件がまとめて変わったとき）"""
+    if not cache.add(GENERATION_KEY, 1, timeout=None):
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, 1, timeout=None)
@@ -0,0 +1,295 @@
+"""顧客・案件の CSV 一括インポート
+
+CSV を1行ずつ読みながらバッチ単位で検証し、顧客は（会社名, メールアドレスの小文字）、
+案件は外部ID をキーに INSERT ... ON CONFLICT DO UPDATE で追加・更新する。
+1行に顧客と案件を並べた形式で、案件名が空の行は顧客だけを登録する。
+
+検証はモデルのフィールド定義（max_length・blank・choices・validators）から
+組み立てた規則で行い、書き込みは bulk_create(update_conflicts=True) と同じ SQL を
+executemany で実行する。行ごとにモデルインスタンスを作らないため、
+数万行/秒で取り込める。
+"""
+import csv
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, models, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.sql import Query
+from django.utils import timezone
+
+from . import changefeed, forecast, stats, summary
+from .cache import bump_version
+from .models import Client, Project, ProjectStatusHistory
+
+DEFAULT_BATCH_SIZE = 1000
+
+CLIENT_FIELDS = ['company_name', 'contact_person', 'email', 'phone', 'industry', 'company_size']
+PROJECT_FIELDS = [
+    'external_id', 'title', 'status', 'consultation_content', 'proposal_content',
+    'estimated_amount', 'start_date', 'end_date',
+]
+# 顧客のキー（Client のユニーク制約 client_company_email_unique と同じ式）
+CLIENT_UNIQUE_FIELDS = ['company_name', Lower('email')]
+CLIENT_UPDATE_FIELDS = ['contact_person', 'phone', 'industry', 'company_size', 'updated_at']
+PROJECT_UPDATE_FIELDS = [field for field in PROJECT_FIELDS if field != 'external_id'] + ['client', 'updated_at']
+
+# export_data projects の列名でも読み込めるようにする
+COLUMN_ALIASES = {
+    'client__company_name': 'company_name',
+    'client__contact_person': 'contact_person',
+    'client__email': 'email',
+    'client__industry': 'industry',
+}
+# ステータスは表示名（例: 商談中）でも指定できる
+STATUS_LABELS = {label: value for value, label in Project.STATUS_CHOICES}
+
+
+class ImportReport:
+    """インポート結果（バッチごとの件数とエラー）"""
+
+    def __init__(self):
+        self.rows = 0
+        self.clients = 0
+        self.projects = 0
+        self.batches = []
+
+    @property
+    def errors(self):
+        return [error for batch in self.batches for error in batch['errors']]
+
+    def add_batch(self, number, rows, clients, projects, errors):
+        self.rows += rows
+        self.clients += clients
+        self.projects += projects
+        self.batches.append({
+            'batch': number,
+            'rows': rows,
+            'clients': clients,
+            'projects': projects,
+            'errors': errors,
+        })
+
+
+def _normalize(row):
+    values = {}
+    for column, value in row.items():
+        if column is None:
+            continue
+        column = COLUMN_ALIASES.get(column.strip(), column.strip())
+        values[column] = (value or '').strip()
+    return values
+
+
+class _Column:
+    """1フィールド分の検証規則。Field.clean() と同じ検証をモデルなしで行う"""
+
+    def __init__(self, field):
+        self.field = field
+        self.name = field.name
+        self.choices = {value for value, _ in field.flatchoices} if field.choices else None
+        self.validators = field.validators
+        # 文字列以外（日付・金額）だけ Python の値への変換と DB 用の変換が要る
+        self.is_text = isinstance(field, (models.CharField, models.TextField))
+
+    def clean(self, raw):
+        field = self.field
+        if raw == '':
+            if not field.blank:
+                raise ValidationError(field.error_messages['blank'], code='blank')
+            return None if field.null else ''
+        value = raw if self.is_text else field.to_python(raw)
+        if self.choices is not None and value not in self.choices:
+            raise ValidationError(
+                field.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+        for validator in self.validators:
+            validator(value)
+        return value
+
+
+CLIENT_COLUMNS = [_Column(Client._meta.get_field(name)) for name in CLIENT_FIELDS]
+PROJECT_COLUMNS = [_Column(Project._meta.get_field(name)) for name in PROJECT_FIELDS]
+
+
+def _prepare(columns, rows, db):
+    """日付・金額を DB 用の値に変換する（bulk_create の get_db_prep_save に相当）"""
+    targets = [(index, column.field) for index, column in enumerate(columns) if not column.is_text]
+    for row in rows:
+        for index, field in targets:
+            if row[index] is not None:
+                row[index] = field.get_db_prep_save(row[index], db)
+
+
+def _clean_row(columns, values, errors):
+    row = []
+    for column in columns:
+        try:
+            row.append(column.clean(values.get(column.name, '')))
+        except ValidationError as exc:
+            errors[column.name] = exc.messages
+    return row
+
+
+def _client_key(company_name, email):
+    return company_name, email.lower()
+
+
+def _format_errors(error):
+    return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items())
+
+
+def _validate(values):
+    """1行を検証し、(顧客の値, 案件の値または None) を返す"""
+    values['email'] = values.get('email', '').lower()
+    if values.get('title'):
+        status = values.get('status') or 'inquiry'
+        values['status'] = STATUS_LABELS.get(status, status)
+
+    errors = {}
+    client = _clean_row(CLIENT_COLUMNS, values, errors)
+    project = _clean_row(PROJECT_COLUMNS, values, errors) if values.get('title') else None
+    if errors:
+        raise ValidationError(errors)
+    return client, project
+
+
+def _upsert_sql(db, model, columns, unique_fields, update_fields):
+    """bulk_create(update_conflicts=True) が発行するものと同じ UPSERT 文
+
+    unique_fields には式（Lower('email') など）も指定でき、ON CONFLICT の対象は
+    式のユニーク制約と同じ SQL になる（bulk_create は列名しか受け付けない）。
+    """
+    opts = model._meta
+    quote = db.ops.quote_name
+    column_names = [opts.get_field(name).column for name in columns]
+    query = Query(model, alias_cols=False)
+    compiler = query.get_compiler(connection=db)
+    target = [
+        quote(opts.get_field(field).column) if isinstance(field, str)
+        else compiler.compile(field.resolve_expression(query))[0]
+        for field in unique_fields
+    ]
+    updates = [quote(opts.get_field(name).column) for name in update_fields]
+    return 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT({}) DO UPDATE SET {}'.format(
+        quote(opts.db_table),
+        ', '.join(map(quote, column_names)),
+        ', '.join(['%s'] * len(column_names)),
+        ', '.join(target),
+        ', '.join(f'{column} = EXCLUDED.{column}' for column in updates),
+    )
+
+
+def _write_batch(clients, projects):
+    """検証済みの1バッチを書き込み、(顧客数, 案件数) を返す"""
+    db = connections[DEFAULT_DB_ALIAS]
+    changed_at = timezone.now()
+    now = Project._meta.get_field('created_at').get_db_prep_save(changed_at, db)
+    client_rows = [row + [now, now] for row in clients.values()]
+    project_rows = [row + [None, now, now] for _, row in projects]
+    _prepare(PROJECT_COLUMNS, project_rows, db)
+
+    with transaction.atomic(), db.cursor() as cursor:
+        # ステータス履歴のため、更新前のステータスを控えておく
+        external_ids = [row[0] for _, row in projects if row[0]]
+        previous = dict(Project.objects.filter(external_id__in=external_ids).values_list('external_id', 'status'))
+        cursor.executemany(
+            _upsert_sql(
+                db, Client, CLIENT_FIELDS + ['created_at', 'updated_at'], CLIENT_UNIQUE_FIELDS, CLIENT_UPDATE_FIELDS,
+            ),
+            client_rows,
+        )
+        # 既存顧客を更新した場合も id が必要なため、キーで引き直す
+        names = {company_name for company_name, _ in clients}
+        client_ids = {
+            _client_key(company_name, email): pk
+            for pk, company_name, email in Client.objects.filter(company_name__in=names)
+            .order_by().values_list('pk', 'company_name', 'email')
+        }
+        client_index = len(PROJECT_FIELDS)
+        for (key, _), row in zip(projects, project_rows):
+            row[client_index] = client_ids[key]
+        # 外部ID が空の案件は衝突しないため常に新規登録になる
+        cursor.executemany(
+            _upsert_sql(
+                db, Project, PROJECT_FIELDS + ['client', 'created_at', 'updated_at'],
+                ['external_id'], PROJECT_UPDATE_FIELDS,
+            ),
+            project_rows,
+        )
+        _record_history(previous, changed_at)
+        # 外部システム向けの変更履歴（追加・更新したすべての顧客・案件）
+        changefeed.record(Client, [client_ids[key] for key in clients])
+        changefeed.record_queryset(
+            Project.objects.filter(Q(created_at=changed_at) | Q(external_id__in=external_ids))
+        )
+    return len(client_rows), len(project_rows)
+
+
+def _record_history(previous, changed_at):
+    """バッチで追加した案件と、ステータスが変わった案件の履歴を追加する"""
+    # 新規の案件だけが created_at にこのバッチの書き込み時刻を持つ
+    history = [
+        ProjectStatusHistory(project_id=pk, from_status='', to_status=status, changed_at=changed_at)
+        for pk, status in Project.objects.filter(created_at=changed_at).values_list('pk', 'status')
+    ]
+    updated = Project.objects.filter(external_id__in=list(previous)).values_list('pk', 'external_id', 'status')
+    history += [
+        ProjectStatusHistory(
+            project_id=pk, from_status=previous[external_id], to_status=status, changed_at=changed_at,
+        )
+        for pk, external_id, status in updated
+        if previous[external_id] != status
+    ]
+    ProjectStatusHistory.objects.bulk_create(history)
+
+
+def import_csv(file, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, progress=None):
+    """CSV ファイルオブジェクト（テキストモード）を読み込んで登録する
+
+    progress を渡すと、バッチを書き込むたびにそれまでの ImportReport を渡して呼ぶ。
+    """
+    report = ImportReport()
+    reader = csv.DictReader(file)
+
+    def flush(number, rows, clients, projects, errors):
+        written = (0, 0)
+        if not dry_run and (clients or projects):
+            try:
+                written = _write_batch(clients, list(projects.values()))
+            except DatabaseError as exc:
+                errors.append({'line': None, 'message': f'バッチ {number} の書き込みに失敗しました: {exc}'})
+        report.add_batch(number, rows, *written, errors)
+        if progress is not None:
+            progress(report)
+
+    number, rows, clients, projects, errors = 1, 0, {}, {}, []
+    # 1行目はヘッダーなのでデータは2行目から
+    for line, row in enumerate(reader, start=2):
+        rows += 1
+        try:
+            client, project = _validate(_normalize(row))
+        except ValidationError as exc:
+            errors.append({'line': line, 'message': _format_errors(exc)})
+        else:
+            # 同じ顧客が複数行に出てくる場合は後の行の内容で上書きする
+            key = _client_key(client[0], client[2])
+            clients[key] = client
+            if project is not None:
+                # 同じ外部ID も後の行を優先する
+                projects[project[0] or ('new', line)] = (key, project)
+
+        if rows >= batch_size:
+            flush(number, rows, clients, projects, errors)
+            number, rows, clients, projects, errors = number + 1, 0, {}, {}, []
+
+    if rows:
+        flush(number, rows, clients, projects, errors)
+
+    if not dry_run and (report.clients or report.projects):
+        # シグナルを通らないため集計とキャッシュを作り直す
+        stats.rebuild()
+        summary.create_missing()
+        bump_version(Client, Project)
+        forecast.invalidate()
+    return report
@@ -0,0 +1,261 @@
+"""データベースを使ったバックグラウンド処理のキュー
+
+一括インポート・エクスポート・集計の作り直しなど時間のかかる処理は、リクエストの中では
+実行せず enqueue() で Job に登録し、manage.py run_worker が別プロセスで実行する。
+処理本体は @task で登録した関数（tasks.py）で、引数は JSON にできる値だけを渡す。
+
+- 取り出し: ワーカーは実行可能な Job を状態を条件にした UPDATE で「実行中」にする。
+  更新できた1件だけが自分の担当になるため、複数のワーカー・プロセスが同じ Job を
+  同時に実行することはない（SELECT ... FOR UPDATE SKIP LOCKED のない SQLite でも動く）。
+- 実行期限（visibility timeout）: 実行中の Job は locked_until までに進捗の報告がなければ
+  ワーカーが停止したものとみなし、ほかのワーカーが取り出して再実行する。
+  進捗を報告する（JobContext.progress）たびに期限を延ばす。
+- 再試行: 例外で終わった Job は max_attempts 回まで、RETRY_DELAY 秒から倍々に間隔を
+  空けて再実行する。最後まで失敗したら「失敗」にしてエラーを残す。
+
+ワーカーのプロセスを増やせば（run_worker --processes、または run_worker を複数起動）
+同時に実行できる Job の数が増える。
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing import get_context
+
+import django
+
+from django.conf import settings
+from django.db import OperationalError, connections, router
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# 処理名 → 関数
+REGISTRY = {}
+# 進捗を書き込む最短の間隔（秒）
+PROGRESS_INTERVAL = 1.0
+ERROR_LENGTH = 10000
+
+
+class JobLost(Exception):
+    """実行期限を過ぎてほかのワーカーに取り出された（この実行の結果は書き込まない）"""
+
+
+def task(name):
+    """関数を処理名 name で登録する。関数は (JobContext, **payload) で呼ばれ、戻り値が結果になる"""
+    def register(func):
+        REGISTRY[name] = func
+        return func
+    return register
+
+
+def visibility_timeout():
+    return getattr(settings, 'CRM_JOB_VISIBILITY_TIMEOUT', 300)
+
+
+def retry_delay():
+    return getattr(settings, 'CRM_JOB_RETRY_DELAY', 30)
+
+
+def enqueue(name, payload=None, *, delay=0, max_attempts=3):
+    """処理を登録する（トランザクション内で呼んだ場合はコミット後にワーカーから見える）"""
+    if name not in REGISTRY:
+        raise ValueError(f'未登録の処理です: {name}')
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def _claimable(now):
+    """実行できる Job（実行予定日時を過ぎた待機中と、実行期限を過ぎた実行中）"""
+    return Q(status='pending', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+def _fail_expired(now):
+    """実行期限を過ぎ、再実行の回数も使い切った Job を失敗にする"""
+    Job.objects.filter(status='running', locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+        status='failed',
+        locked_until=None,
+        error='実行期限までに終わりませんでした（ワーカーが停止した可能性があります）',
+        finished_at=now,
+    )
+
+
+def claim(worker, limit=1):
+    """実行できる Job を最大 limit 件取り出して実行中にし、その ID を返す"""
+    now = timezone.now()
+    _fail_expired(now)
+    candidates = list(
+        Job.objects.filter(_claimable(now)).order_by('run_at', 'id').values_list('pk', flat=True)[:limit * 4]
+    )
+    claimed = []
+    for pk in candidates:
+        # ほかのワーカーが先に取り出していれば0件の更新になる
+        updated = Job.objects.filter(_claimable(now), pk=pk).update(
+            status='running',
+            attempts=F('attempts') + 1,
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=visibility_timeout()),
+            started_at=now,
+        )
+        if updated:
+            claimed.append(pk)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+class JobContext:
+    """実行中の Job。処理本体は progress() で進捗を報告する"""
+
+    def __init__(self, job, worker):
+        self.job = job
+        self.worker = worker
+        self._reported = 0.0
+
+    @property
+    def id(self):
+        return self.job.pk
+
+    def _mine(self):
+        """この実行が担当している間だけ更新する条件"""
+        return Job.objects.filter(pk=self.job.pk, locked_by=self.worker, attempts=self.job.attempts)
+
+    def progress(self, done, total=None, message=''):
+        """進捗を書き込み、実行期限を延ばす（PROGRESS_INTERVAL 秒に1回まで）"""
+        now = time.monotonic()
+        finished = total is not None and done >= total
+        if not finished and now - self._reported < PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        changes = {
+            'progress_message': message[:200],
+            'locked_until': timezone.now() + timedelta(seconds=visibility_timeout()),
+        }
+        if total:
+            changes['progress'] = min(int(done * 100 / total), 100)
+        try:
+            updated = self._mine().update(**changes)
+        except OperationalError:
+            # SQLite では、読み取り中の接続はほかのプロセスが書き込んだあとだと書き込めない
+            # （database is locked）。トランザクションの外なら、この報告は見送って処理を続ける
+            if connections[router.db_for_write(Job)].in_atomic_block:
+                raise
+            logger.info('%s: 進捗を書き込めませんでした（ほかのプロセスが書き込み中）', self.job)
+            return
+        if not updated:
+            raise JobLost(f'{self.job} はほかのワーカーに取り出されました')
+
+
+def execute(job_id, worker):
+    """取り出した Job を1件実行し、終了時の状態を返す"""
+    job = Job.objects.get(pk=job_id)
+    context = JobContext(job, worker)
+    func = REGISTRY.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'未登録の処理です: {job.name}')
+        result = func(context, **job.payload)
+    except JobLost:
+        logger.warning('%s: 実行期限を過ぎたため結果を破棄しました', job)
+        return 'lost'
+    except Exception:
+        error = traceback.format_exc()[-ERROR_LENGTH:]
+        logger.exception('%s が失敗しました（%d/%d 回目）', job, job.attempts, job.max_attempts)
+        if func is not None and job.attempts < job.max_attempts:
+            status = 'pending'
+            changes = {'run_at': timezone.now() + timedelta(seconds=retry_delay() * 2 ** (job.attempts - 1))}
+        else:
+            status = 'failed'
+            changes = {'finished_at': timezone.now()}
+        context._mine().update(status=status, locked_until=None, error=error, **changes)
+        return status
+    context._mine().update(
+        status='succeeded', locked_until=None, progress=100, result=result, error='', finished_at=timezone.now(),
+    )
+    return 'succeeded'
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_pending(worker=None, limit=None):
+    """実行できる Job がなくなるまで（最大 limit 件）このプロセスで順に実行する"""
+    worker = worker or default_worker_name()
+    counts = {}
+    while limit is None or sum(counts.values()) < limit:
+        claimed = claim(worker)
+        if not claimed:
+            break
+        status = execute(claimed[0], worker)
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def _execute_in_process(job_id, worker):
+    try:
+        return execute(job_id, worker)
+    finally:
+        connections.close_all()
+
+
+def work(processes=1, poll=1.0, once=False, worker=None, log=None):
+    """Job を取り出して実行し続ける（once なら実行できる Job がなくなったら終わる）
+
+    processes が2以上なら Job をプロセスプールで並行に実行する。
+    親プロセスは空いているプロセスの数だけ Job を取り出して渡す。
+    """
+    worker = worker or default_worker_name()
+    log = log or (lambda message: None)
+    counts = {}
+
+    def count(status):
+        counts[status] = counts.get(status, 0) + 1
+
+    if processes <= 1:
+        while True:
+            claimed = claim(worker)
+            if claimed:
+                status = execute(claimed[0], worker)
+                count(status)
+                log(f'#{claimed[0]}: {status}')
+            elif once:
+                return counts
+            else:
+                time.sleep(poll)
+
+    # 子プロセスに親の DB 接続を引き継がないよう spawn で起動し、最初に Django を初期化する
+    # （このモジュールはモデルを読み込むため、初期化前の子プロセスでは import できない）
+    with ProcessPoolExecutor(processes, mp_context=get_context('spawn'), initializer=django.setup) as pool:
+        running = {}
+        while True:
+            free = processes - len(running)
+            if free:
+                for pk in claim(worker, free):
+                    running[pool.submit(_execute_in_process, pk, worker)] = pk
+            if not running:
+                if once:
+                    return counts
+                time.sleep(poll)
+                continue
+            done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                pk = running.pop(future)
+                try:
+                    status = future.result()
+                except Exception:
+                    # 子プロセスごと落ちた場合は実行期限を過ぎてから再実行される
+                    logger.exception('#%d を実行したプロセスが異常終了しました', pk)
+                    status = 'crashed'
+                count(status)
+                log(f'#{pk}: {status}')
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from projects import archive
+
+
+class Command(BaseCommand):
+    help = '完了・失注から一定期間が過ぎた案件を関連データごとアーカイブテーブルに移します（日次で実行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='完了・失注からこの日数が過ぎた案件を移す（省略時は CRM_ARCHIVE_AFTER_DAYS）')
+        parser.add_argument('--batch-size', type=int, default=archive.DEFAULT_BATCH_SIZE,
+                            help='1トランザクションで移す案件数')
+        parser.add_argument('--dry-run', action='store_true', help='対象の件数だけを表示する')
+
+    def handle(self, *args, **options):
+        before = None
+        if options['days'] is not None:
+            before = timezone.now() - timedelta(days=options['days'])
+        count = archive.archive(before, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f'アーカイブの対象: {count}件')
+            return
+        self.stdout.write(self.style.SUCCESS(f'案件をアーカイブしました: {count}件'))
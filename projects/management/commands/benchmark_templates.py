@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from projects import benchmarks
+
+
+class Command(BaseCommand):
+    help = '案件一覧の描画時間を、ステータス表示の方法・断片キャッシュの有無ごとに計測します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='描画する案件数')
+        parser.add_argument('--iterations', type=int, default=3, help='描画方法ごとの描画回数')
+
+    def handle(self, *args, **options):
+        results = benchmarks.compare_rendering(options['rows'], options['iterations'])
+
+        self.stdout.write(f"{'variant':<34}{'rows':>8}{'p50(ms)':>10}{'per row(us)':>13}")
+        for result in results:
+            self.stdout.write(
+                f"{result['variant']:<34}{result['rows']:>8}{result['p50_ms']:>10}{result['per_row_us']:>13}"
+            )
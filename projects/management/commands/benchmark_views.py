@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from projects import benchmarks
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = '各ビューのレイテンシ・クエリ数・取得行数を計測し、予算と比較します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10000, help='計測用に生成する案件数')
+        parser.add_argument('--seed', type=int, default=42, help='データ生成の乱数シード')
+        parser.add_argument('--iterations', type=int, default=20, help='ビューごとのリクエスト回数')
+        parser.add_argument('--output', help='計測結果を保存する JSON ファイル')
+        parser.add_argument('--compare', help='比較対象となる前回の JSON ファイル')
+        parser.add_argument('--keepdb', action='store_true', help='計測用データベースを残して再利用する')
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help='指定すると同期版（WSGI）と非同期版（ASGI）のスループットをこの同時接続数で比較する')
+        parser.add_argument('--requests', type=int, default=200, help='スループット計測で送るリクエスト数')
+
+    def handle(self, *args, **options):
+        # 開発用のデータベースを壊さないよう、テスト用データベースで計測する
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            # --keepdb で残したデータベースにデータがあれば、投入し直さずに再利用する
+            if not options['keepdb'] or not Project.objects.exists():
+                call_command('load_sample_data', scale=options['scale'], seed=options['seed'], stdout=self.stdout)
+            results = benchmarks.run(options['iterations'])
+            throughput = []
+            if options['concurrency']:
+                throughput = benchmarks.compare_servers(options['concurrency'], options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f"{'view':<24}{'p50(ms)':>10}{'p95(ms)':>10}{'queries':>9}{'rows':>8}")
+        for result in results:
+            self.stdout.write(
+                f"{result['view']:<24}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                f"{result['queries']:>9}{result['rows']:>8}"
+            )
+
+        if throughput:
+            self.stdout.write('')
+            self.stdout.write(f"{'view':<24}{'server':>7}{'req/s':>9}{'p50(ms)':>10}{'p95(ms)':>10}")
+            for result in throughput:
+                self.stdout.write(
+                    f"{result['view']:<24}{result['server']:>7}{result['rps']:>9}"
+                    f"{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                )
+
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text(encoding='utf-8'))
+            for line in benchmarks.compare(results, baseline['results']):
+                self.stdout.write(line)
+
+        if options['output']:
+            payload = {'scale': options['scale'], 'seed': options['seed'], 'results': results}
+            if throughput:
+                payload['throughput'] = throughput
+            Path(options['output']).write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding='utf-8')
+
+        violations = benchmarks.check_budgets(results)
+        if violations:
+            raise CommandError('予算超過:\n' + '\n'.join(violations))
+        self.stdout.write(self.style.SUCCESS('すべてのビューが予算内です'))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from projects import changefeed
+
+
+class Command(BaseCommand):
+    help = '保持期間を過ぎた変更履歴を、行ごとに最新の1件だけにします（日次で実行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='この日数より古い履歴を圧縮する（省略時は CRM_CHANGE_FEED_RETENTION_DAYS）')
+
+    def handle(self, *args, **options):
+        before = None
+        if options['days'] is not None:
+            before = timezone.now() - timedelta(days=options['days'])
+        deleted = changefeed.compact(before)
+        self.stdout.write(self.style.SUCCESS(
+            f'変更履歴を圧縮しました: {deleted}件を削除（最新の通し番号 {changefeed.last_seq()}）'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from projects import exports
+
+
+class Command(BaseCommand):
+    help = '案件・顧客・活動記録を CSV / JSONL で書き出します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(exports.EXPORTS), help='エクスポート対象')
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='csv', help='出力形式')
+        parser.add_argument('--output', help='出力先ファイル（省略時は標準出力）')
+        parser.add_argument('--status', help='案件ステータスで絞り込み（handovers / engineer_handoffs では対応状況）')
+        parser.add_argument('--search', help='キーワードで絞り込み')
+        parser.add_argument('--type', help='引継ぎ先で絞り込み（handovers のみ）')
+        parser.add_argument('--chunk-size', type=int, default=exports.DEFAULT_CHUNK_SIZE,
+                            help='データベースから一度に読み出す行数')
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ('status', 'search', 'type') if options[key]}
+        lines = exports.stream(options['name'], options['format'], params, options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                count = self.write(lines, output)
+            self.stderr.write(self.style.SUCCESS(f'{count}行を書き出しました: {options["output"]}'))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+
+    def write(self, lines, output):
+        count = 0
+        for line in lines:
+            output.write(line)
+            count += 1
+        return count
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from projects import imports
+
+
+class Command(BaseCommand):
+    help = '顧客・案件を CSV から一括登録・更新します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV ファイル（UTF-8、1行目はヘッダー）')
+        parser.add_argument('--batch-size', type=int, default=imports.DEFAULT_BATCH_SIZE,
+                            help='1回の bulk_create で書き込む行数')
+        parser.add_argument('--dry-run', action='store_true', help='検証だけ行い、書き込まない')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            # utf-8-sig で Excel が付ける BOM を読み飛ばす
+            with open(options['path'], encoding='utf-8-sig', newline='') as file:
+                report = imports.import_csv(file, options['batch_size'], options['dry_run'])
+        except OSError as exc:
+            raise CommandError(exc)
+        elapsed = time.perf_counter() - started
+
+        for batch in report.batches:
+            status = self.style.ERROR('NG') if batch['errors'] else self.style.SUCCESS('OK')
+            self.stdout.write(
+                f"[{status}] バッチ{batch['batch']}: {batch['rows']}行 "
+                f"（顧客 {batch['clients']}件・案件 {batch['projects']}件、エラー {len(batch['errors'])}件）"
+            )
+            for error in batch['errors']:
+                line = f"{error['line']}行目: " if error['line'] else ''
+                self.stdout.write(f"    {line}{error['message']}")
+
+        verb = '検証' if options['dry_run'] else 'インポート'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}が完了しました: {report.rows}行 / 顧客 {report.clients}件 / 案件 {report.projects}件 / '
+            f'エラー {len(report.errors)}件（{elapsed:.2f}秒、{report.rows / max(elapsed, 1e-9):,.0f}行/秒）'
+        ))
@@ -1,20 +1,245 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
 from django.core.management.base import BaseCommand
-from projects.models import Client, Project, Handover, ProgressLog, EngineerHandoff
+from django.db import connection, transaction
 from django.utils import timezone
-from datetime import timedelta
+from projects import analytics, changefeed, forecast, queues, stats, summary
+from projects.cache import bump_version
+from projects.models import (
+    Client, Project, Handover, ProgressLog, EngineerHandoff, ProjectStatusHistory, StageDailyStat, CohortDailyStat,
+    ProjectSummary, ChangeLog, ArchivedProject, ArchivedHandover, ArchivedProgressLog, ArchivedEngineerHandoff,
+    ArchivedStatusHistory,
+)
+
+
+COMPANY_WORDS = ['テック', 'グローバル', 'ネクスト', 'サン', 'みらい', 'スマート', 'デジタル', 'ユニバーサル', 'アーク', 'ブライト']
+COMPANY_SUFFIXES = ['ソリューションズ', '製造', '商事', 'ホールディングス', 'システムズ', '物流', 'ヘルスケア', '不動産']
+INDUSTRIES = ['IT・情報サービス', '製造業', '小売業', '金融・保険', '医療・福祉', '物流・運輸', '建設・不動産', 'スタートアップ']
+COMPANY_SIZES = ['小規模企業（～50名）', '中小企業（50-100名）', '中堅企業（100-500名）', '大企業（1000名以上）']
+FAMILY_NAMES = ['山田', '佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '中村', '小林', '加藤']
+GIVEN_NAMES = ['太郎', '花子', '一郎', '美咲', '健太', '由美', '翔', '陽子']
+PROJECT_THEMES = ['クラウド移行', 'データ活用基盤', 'DX戦略策定', 'セキュリティ強化', '業務自動化（RPA）',
+                  '基幹システム刷新', 'ECサイト構築', 'AI需要予測', 'ペーパーレス化', '社内ポータル構築']
+PROJECT_KINDS = ['支援', 'プロジェクト', '導入', 'PoC', '構想策定']
+STATUS_WEIGHTS = {
+    'inquiry': 10, 'hearing': 12, 'proposal': 10, 'quotation': 8, 'negotiation': 8,
+    'handover': 5, 'in_progress': 12, 'completed': 20, 'on_hold': 5, 'lost': 10,
+}
+# 見積金額を持つステータス
+PRICED_STATUSES = {'proposal', 'quotation', 'negotiation', 'handover', 'in_progress', 'completed', 'lost'}
+# エンジニアへのバトンタッチが発生するステータス
+HANDOFF_STATUSES = {'handover', 'in_progress', 'completed'}
+# 各ステータスの平均滞在日数（ステータス履歴の生成用）
+STAGE_MEAN_DAYS = {
+    'inquiry': 7, 'hearing': 14, 'proposal': 10, 'quotation': 7,
+    'negotiation': 21, 'handover': 7, 'in_progress': 60,
+}
+ACTIVITY_TYPES = ['meeting', 'phone', 'email', 'proposal', 'quotation', 'presentation', 'other']
+HANDOVER_TYPES = [('staff_notsu', 'Staff Notsu'), ('uragami', '浦上泰弘'), ('engineer', '田中エンジニア')]
+
+
+class ScaledDataGenerator:
+    """負荷試験用データの一括生成（固定シード・バッチ単位の bulk_create）"""
+
+    def __init__(self, seed, batch_size):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.statuses = list(STATUS_WEIGHTS)
+        self.status_weights = list(STATUS_WEIGHTS.values())
+
+    def person(self):
+        return self.random.choice(FAMILY_NAMES) + self.random.choice(GIVEN_NAMES)
+
+    def past(self, days):
+        return self.now - timedelta(days=self.random.random() * days)
+
+    def generate(self, project_count):
+        client_ids = self.create_clients(max(1, project_count // 10))
+        for offset in range(0, project_count, self.batch_size):
+            size = min(self.batch_size, project_count - offset)
+            projects = Project.objects.bulk_create(
+                [self.build_project(client_ids) for _ in range(size)],
+                batch_size=self.batch_size,
+            )
+            self.create_activity(projects)
+            ProjectStatusHistory.objects.bulk_create(
+                [history for project in projects for history in self.build_history(project)],
+                batch_size=self.batch_size,
+            )
+
+    def create_clients(self, count):
+        clients = []
+        for i in range(count):
+            name = f'{self.random.choice(COMPANY_WORDS)}{self.random.choice(COMPANY_SUFFIXES)}{i + 1}'
+            clients.append(Client(
+                company_name=f'株式会社{name}',
+                contact_person=self.person(),
+                email=f'contact{i + 1}@example.jp',
+                phone=f'03-{self.random.randint(1000, 9999)}-{self.random.randint(1000, 9999)}',
+                industry=self.random.choice(INDUSTRIES),
+                company_size=self.random.choice(COMPANY_SIZES),
+                created_at=self.past(365 * 4),
+            ))
+        return [client.pk for client in Client.objects.bulk_create(clients, batch_size=self.batch_size)]
+
+    def build_project(self, client_ids):
+        status = self.random.choices(self.statuses, self.status_weights)[0]
+        theme = self.random.choice(PROJECT_THEMES)
+        created_at = self.past(365 * 3)
+        amount = None
+        if status in PRICED_STATUSES:
+            amount = Decimal(self.random.randint(5, 500) * 100000)
+        start_date = end_date = None
+        if amount is not None:
+            start_date = (created_at + timedelta(days=self.random.randint(14, 90))).date()
+            end_date = start_date + timedelta(days=self.random.randint(30, 365))
+        return Project(
+            client_id=self.random.choice(client_ids),
+            title=f'{theme}{self.random.choice(PROJECT_KINDS)}',
+            status=status,
+            consultation_content=f'{theme}について相談を受けた。現状の課題と目標を整理したい。',
+            proposal_content=f'{theme}の段階的な実施を提案。' if amount is not None else '',
+            estimated_amount=amount,
+            start_date=start_date,
+            end_date=end_date,
+            created_at=created_at,
+        )
+
+    def build_history(self, project):
+        """作成から現在のステータスまでの遷移を、ファネルの順に作成日から現在までの間で生成する"""
+        if project.status in analytics.FUNNEL_STAGES:
+            path = analytics.FUNNEL_STAGES[:analytics.FUNNEL_STAGES.index(project.status) + 1]
+        else:
+            # 失注・保留は途中のステージから移る
+            path = analytics.FUNNEL_STAGES[:self.random.randint(1, 5)] + [project.status]
+        offsets, elapsed = [], 0.0
+        for stage in path[:-1]:
+            elapsed += self.random.expovariate(1 / STAGE_MEAN_DAYS[stage])
+            offsets.append(elapsed)
+        # 作成日から現在までに収まらない場合は全体を縮める
+        available = (self.now - project.created_at).total_seconds() / 86400
+        scale = min(1.0, available * self.random.uniform(0.5, 1.0) / elapsed) if elapsed else 1.0
+        history = [ProjectStatusHistory(
+            project_id=project.pk, from_status='', to_status=path[0], changed_at=project.created_at,
+        )]
+        for previous, stage, offset in zip(path, path[1:], offsets):
+            history.append(ProjectStatusHistory(
+                project_id=project.pk, from_status=previous, to_status=stage,
+                changed_at=project.created_at + timedelta(days=offset * scale),
+            ))
+        return history
+
+    def create_activity(self, projects):
+        handovers, logs, handoffs = [], [], []
+        for project in projects:
+            elapsed_days = max((self.now - project.created_at).days, 1)
+            for _ in range(self.random.randint(0, 6)):
+                logs.append(ProgressLog(
+                    project_id=project.pk,
+                    log_date=project.created_at + timedelta(days=self.random.random() * elapsed_days),
+                    activity_type=self.random.choice(ACTIVITY_TYPES),
+                    content=f'{project.title}について打ち合わせを実施。',
+                    next_action='次回の打ち合わせ日程を調整',
+                    created_by=self.person(),
+                ))
+            if self.random.random() < 0.3:
+                handover_type, handover_to = self.random.choice(HANDOVER_TYPES)
+                handovers.append(Handover(
+                    project_id=project.pk,
+                    handover_type=handover_type,
+                    handover_to=handover_to,
+                    handover_date=project.created_at + timedelta(days=self.random.random() * elapsed_days),
+                    handover_content=f'{project.title}の技術的な実現方法について相談。',
+                    is_completed=self.random.random() < 0.7,
+                ))
+            if project.status in HANDOFF_STATUSES:
+                handoffs.append(EngineerHandoff(
+                    project_id=project.pk,
+                    engineer_name=f'{self.random.choice(FAMILY_NAMES)}エンジニア',
+                    handoff_date=project.created_at + timedelta(days=self.random.random() * elapsed_days),
+                    technical_scope=f'{project.title}の設計・実装',
+                    current_status='要件定義完了',
+                    client_requirements='段階的なリリース',
+                    timeline='3ヶ月',
+                    budget=project.estimated_amount,
+                    is_accepted=project.status != 'handover' or self.random.random() < 0.3,
+                ))
+        ProgressLog.objects.bulk_create(logs, batch_size=self.batch_size)
+        Handover.objects.bulk_create(handovers, batch_size=self.batch_size)
+        EngineerHandoff.objects.bulk_create(handoffs, batch_size=self.batch_size)
 
 
 class Command(BaseCommand):
     help = 'サンプルデータを投入します'
 
-    def handle(self, *args, **kwargs):
-        # 既存データをクリア
-        EngineerHandoff.objects.all().delete()
-        ProgressLog.objects.all().delete()
-        Handover.objects.all().delete()
-        Project.objects.all().delete()
-        Client.objects.all().delete()
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=0,
+                            help='負荷試験用に指定件数の案件と関連データを一括生成します')
+        parser.add_argument('--seed', type=int, default=42, help='乱数シード（--scale 使用時）')
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk_create のバッチサイズ')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            # 既存データをクリア
+            self.truncate()
+            if options['scale']:
+                generator = ScaledDataGenerator(options['seed'], options['batch_size'])
+                generator.generate(options['scale'])
+                for model in changefeed.TRACKED_MODELS:
+                    changefeed.record_queryset(model.objects.all())
+            else:
+                self.load_samples()
+            # bulk_create / 一括削除はシグナルを通らないため集計とキャッシュを作り直す
+            stats.rebuild()
+            summary.rebuild()
+            queues.rebuild()
+            analytics.rollup(full=True)
+        bump_version(Client, Project, Handover, ProgressLog, EngineerHandoff)
+        forecast.invalidate()
+        elapsed = time.perf_counter() - started
 
+        self.stdout.write(self.style.SUCCESS('サンプルデータの投入が完了しました！'))
+        counts = {
+            '顧客': Client.objects.count(),
+            '案件': Project.objects.count(),
+            '引継ぎ': Handover.objects.count(),
+            'エンジニアバトンタッチ': EngineerHandoff.objects.count(),
+            '進捗記録': ProgressLog.objects.count(),
+            'ステータス履歴': ProjectStatusHistory.objects.count(),
+        }
+        for label, count in counts.items():
+            self.stdout.write(f'{label}: {count}件')
+        total = sum(counts.values())
+        self.stdout.write(f'所要時間: {elapsed:.2f}秒（{total / elapsed:,.0f}行/秒）')
+
+    def truncate(self):
+        """全データを削除する（行ごとの削除・シグナルを経由しない）"""
+        tables = [
+            model._meta.db_table
+            for model in (
+                StageDailyStat, CohortDailyStat, ProjectStatusHistory, ProjectSummary,
+                EngineerHandoff, ProgressLog, Handover, Project,
+                ArchivedStatusHistory, ArchivedEngineerHandoff, ArchivedProgressLog, ArchivedHandover, ArchivedProject,
+                Client, ChangeLog,
+            )
+        ]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # 先に全文検索索引を空にして、削除トリガーの処理を軽くする
+                cursor.execute('DELETE FROM projects_project_fts')
+                cursor.execute('DELETE FROM projects_client_fts')
+            for table in tables:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(table)}')
+        # 変更履歴の通し番号は削除後も続きから振られる。読み手には全件削除の印で知らせる
+        changefeed.reset(changefeed.TRACKED_MODELS)
+
+    def load_samples(self):
+        """デモ用の少量データを投入する"""
         # 顧客データ
         client1 = Client.objects.create(
             company_name='株式会社テックソリューションズ',
@@ -202,10 +427,3 @@ IoTセンサーからのデータ収集基盤とBIツールの導入を検討中
             next_action='中間報告会の開催（来月）',
             created_by='石黒 YUKIKO'
         )
-
-        self.stdout.write(self.style.SUCCESS('サンプルデータの投入が完了しました！'))
-        self.stdout.write(f'顧客: {Client.objects.count()}件')
-        self.stdout.write(f'案件: {Project.objects.count()}件')
-        self.stdout.write(f'引継ぎ: {Handover.objects.count()}件')
-        self.stdout.write(f'エンジニアバトンタッチ: {EngineerHandoff.objects.count()}件')
-        self.stdout.write(f'進捗記録: {ProgressLog.objects.count()}件')
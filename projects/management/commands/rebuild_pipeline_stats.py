@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from projects import stats
+from projects.models import PipelineStat, MonthlyProjectStat
+
+
+class Command(BaseCommand):
+    help = 'ダッシュボード用の集計テーブルを案件データから再構築します'
+
+    def handle(self, *args, **kwargs):
+        stats.rebuild()
+
+        self.stdout.write(self.style.SUCCESS('集計テーブルの再構築が完了しました！'))
+        self.stdout.write(f'ステータス別集計: {PipelineStat.objects.count()}件')
+        self.stdout.write(f'月別新規案件集計: {MonthlyProjectStat.objects.count()}件')
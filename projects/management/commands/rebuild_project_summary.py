@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from projects import summary
+from projects.cache import bump_version
+from projects.models import Project, ProjectSummary
+
+
+class Command(BaseCommand):
+    help = '案件サマリー（最終活動日時・進捗記録数など）を関連データから再構築します'
+
+    def handle(self, *args, **kwargs):
+        summary.rebuild()
+        bump_version(Project)
+
+        self.stdout.write(self.style.SUCCESS('案件サマリーの再構築が完了しました！'))
+        self.stdout.write(f'案件サマリー: {ProjectSummary.objects.count()}件')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from projects import analytics
+
+
+class Command(BaseCommand):
+    help = 'パイプライン分析用の日別集計を前日分まで更新します（日次で実行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='全期間を集計し直す（過去日付の履歴を追加・削除した場合）')
+
+    def handle(self, *args, **options):
+        days = analytics.rollup(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'日別集計を更新しました: {days}日分（{analytics.rolled_through() or "-"} まで）'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from projects import jobs
+
+
+class Command(BaseCommand):
+    help = 'バックグラウンド処理（Job）を取り出して実行します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='並行して実行するプロセス数（1 ならこのプロセスで順に実行）')
+        parser.add_argument('--poll', type=float, default=1.0, help='実行できる処理がないときの待ち時間（秒）')
+        parser.add_argument('--once', action='store_true', help='実行できる処理がなくなったら終了する')
+        parser.add_argument('--worker', help='ワーカー名（省略時は ホスト名:プロセスID）')
+
+    def handle(self, *args, **options):
+        worker = options['worker'] or jobs.default_worker_name()
+        self.stdout.write(f'ワーカー {worker} を起動しました（{options["processes"]}プロセス）')
+        try:
+            counts = jobs.work(
+                processes=options['processes'],
+                poll=options['poll'],
+                once=options['once'],
+                worker=worker,
+                log=self.stdout.write,
+            )
+        except KeyboardInterrupt:
+            # 実行中だった処理は実行期限を過ぎてから再実行される
+            self.stdout.write('停止しました')
+            return
+        summary = ' / '.join(f'{status} {count}件' for status, count in sorted(counts.items())) or 'なし'
+        self.stdout.write(self.style.SUCCESS(f'実行できる処理がなくなりました: {summary}'))
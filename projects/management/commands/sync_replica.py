@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from projects import replica
+
+
+class Command(BaseCommand):
+    help = 'プライマリのデータベースを読み取りレプリカに複製します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='指定した秒数ごとに複製を繰り返す（0 なら1回だけ）')
+
+    def handle(self, *args, **options):
+        if replica.replica_alias() is None:
+            raise CommandError('レプリカが設定されていません（環境変数 CRM_REPLICA_NAME を指定してください）')
+
+        while True:
+            elapsed = replica.sync()
+            self.stdout.write(self.style.SUCCESS(f'レプリカを同期しました（{elapsed:.2f}秒）'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
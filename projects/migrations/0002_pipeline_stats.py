@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:11
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_stats(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    PipelineStat = apps.get_model('projects', 'PipelineStat')
+    MonthlyProjectStat = apps.get_model('projects', 'MonthlyProjectStat')
+
+    for row in Project.objects.order_by().values('status').annotate(count=Count('id'), amount=Sum('estimated_amount')):
+        PipelineStat.objects.create(status=row['status'], project_count=row['count'], estimated_amount_sum=row['amount'] or 0)
+
+    months = (
+        Project.objects.order_by()
+        .annotate(month=TruncMonth('created_at', output_field=DateField()))
+        .values('month')
+        .annotate(count=Count('id'))
+    )
+    for row in months:
+        MonthlyProjectStat.objects.create(month=row['month'], project_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyProjectStat',
+            fields=[
+                ('month', models.DateField(primary_key=True, serialize=False, verbose_name='月')),
+                ('project_count', models.IntegerField(default=0, verbose_name='新規案件数')),
+            ],
+            options={
+                'verbose_name': '月別新規案件集計',
+                'verbose_name_plural': '月別新規案件集計',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PipelineStat',
+            fields=[
+                ('status', models.CharField(choices=[('inquiry', '初回相談'), ('hearing', 'ヒアリング中'), ('proposal', '提案作成中'), ('quotation', '見積提示'), ('negotiation', '商談中'), ('handover', 'エンジニア引継ぎ'), ('in_progress', '実施中'), ('completed', '完了'), ('on_hold', '保留'), ('lost', '失注')], max_length=20, primary_key=True, serialize=False, verbose_name='ステータス')),
+                ('project_count', models.IntegerField(default=0, verbose_name='案件数')),
+                ('estimated_amount_sum', models.DecimalField(decimal_places=0, default=0, max_digits=15, verbose_name='見積金額合計（円）')),
+            ],
+            options={
+                'verbose_name': 'ステータス別集計',
+                'verbose_name_plural': 'ステータス別集計',
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_pipeline_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['-created_at', '-id'], name='client_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='engineerhandoff',
+            index=models.Index(fields=['-handoff_date', '-id'], name='handoff_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='engineerhandoff',
+            index=models.Index(condition=models.Q(('is_accepted', False)), fields=['-handoff_date', '-id'], name='handoff_pending_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='engineerhandoff',
+            index=models.Index(condition=models.Q(('is_accepted', True)), fields=['-handoff_date', '-id'], name='handoff_accepted_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='engineerhandoff',
+            index=models.Index(fields=['project', '-handoff_date', '-id'], name='handoff_project_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='handover',
+            index=models.Index(fields=['-handover_date', '-id'], name='handover_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='handover',
+            index=models.Index(fields=['handover_type', '-handover_date', '-id'], name='handover_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='handover',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['-handover_date', '-id'], name='handover_pending_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='handover',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['-handover_date', '-id'], name='handover_completed_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='handover',
+            index=models.Index(fields=['project', '-handover_date', '-id'], name='handover_project_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progresslog',
+            index=models.Index(fields=['-log_date', '-id'], name='progresslog_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progresslog',
+            index=models.Index(fields=['project', '-log_date', '-id'], name='progresslog_project_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['-created_at', '-id'], name='project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='project_status_created_idx'),
+        ),
+    ]
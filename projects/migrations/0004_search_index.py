@@ -0,0 +1,93 @@
+from django.db import migrations
+
+# 日本語の部分一致に対応するため trigram トークナイザを使う
+FORWARD_SQL = [
+    """CREATE VIRTUAL TABLE projects_project_fts USING fts5(
+        title, consultation_content, proposal_content, company_name,
+        tokenize='trigram'
+    )""",
+    """CREATE VIRTUAL TABLE projects_client_fts USING fts5(
+        company_name, contact_person, industry,
+        tokenize='trigram'
+    )""",
+    """CREATE TRIGGER projects_project_fts_ai AFTER INSERT ON projects_project BEGIN
+        INSERT INTO projects_project_fts(rowid, title, consultation_content, proposal_content, company_name)
+        VALUES (new.id, new.title, new.consultation_content, new.proposal_content,
+                (SELECT company_name FROM projects_client WHERE id = new.client_id));
+    END""",
+    """CREATE TRIGGER projects_project_fts_au AFTER UPDATE ON projects_project
+    WHEN new.title IS NOT old.title
+        OR new.consultation_content IS NOT old.consultation_content
+        OR new.proposal_content IS NOT old.proposal_content
+        OR new.client_id IS NOT old.client_id
+    BEGIN
+        UPDATE projects_project_fts SET
+            title = new.title,
+            consultation_content = new.consultation_content,
+            proposal_content = new.proposal_content,
+            company_name = (SELECT company_name FROM projects_client WHERE id = new.client_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER projects_project_fts_ad AFTER DELETE ON projects_project BEGIN
+        DELETE FROM projects_project_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER projects_client_fts_ai AFTER INSERT ON projects_client BEGIN
+        INSERT INTO projects_client_fts(rowid, company_name, contact_person, industry)
+        VALUES (new.id, new.company_name, new.contact_person, new.industry);
+    END""",
+    """CREATE TRIGGER projects_client_fts_au AFTER UPDATE ON projects_client
+    WHEN new.company_name IS NOT old.company_name
+        OR new.contact_person IS NOT old.contact_person
+        OR new.industry IS NOT old.industry
+    BEGIN
+        UPDATE projects_client_fts SET
+            company_name = new.company_name,
+            contact_person = new.contact_person,
+            industry = new.industry
+        WHERE rowid = new.id;
+        UPDATE projects_project_fts SET company_name = new.company_name
+        WHERE new.company_name IS NOT old.company_name
+            AND rowid IN (SELECT id FROM projects_project WHERE client_id = new.id);
+    END""",
+    """CREATE TRIGGER projects_client_fts_ad AFTER DELETE ON projects_client BEGIN
+        DELETE FROM projects_client_fts WHERE rowid = old.id;
+    END""",
+    # 既存データを索引に投入
+    """INSERT INTO projects_project_fts(rowid, title, consultation_content, proposal_content, company_name)
+        SELECT p.id, p.title, p.consultation_content, p.proposal_content, c.company_name
+        FROM projects_project p JOIN projects_client c ON c.id = p.client_id""",
+    """INSERT INTO projects_client_fts(rowid, company_name, contact_person, industry)
+        SELECT id, company_name, contact_person, industry FROM projects_client""",
+]
+
+REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS projects_client_fts_ad',
+    'DROP TRIGGER IF EXISTS projects_client_fts_au',
+    'DROP TRIGGER IF EXISTS projects_client_fts_ai',
+    'DROP TRIGGER IF EXISTS projects_project_fts_ad',
+    'DROP TRIGGER IF EXISTS projects_project_fts_au',
+    'DROP TRIGGER IF EXISTS projects_project_fts_ai',
+    'DROP TABLE IF EXISTS projects_client_fts',
+    'DROP TABLE IF EXISTS projects_project_fts',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 は SQLite 専用。他のバックエンドでは icontains 検索にフォールバックする
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD_SQL), _run(REVERSE_SQL)),
+    ]
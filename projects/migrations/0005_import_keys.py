@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:23
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('projects.migrations.0004_search_index')
+
+# テーブルを作り直すマイグレーション（SQLite の AddField 等）では一度削除して
+# 作り直す必要があるため、全文検索のトリガーだけを取り出しておく
+TRIGGER_SQL = [sql for sql in search_index.FORWARD_SQL if sql.startswith('CREATE TRIGGER')]
+DROP_TRIGGER_SQL = [sql for sql in search_index.REVERSE_SQL if sql.startswith('DROP TRIGGER')]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_search_index'),
+    ]
+
+    # SQLite ではユニーク制約の追加でテーブルが作り直されるため、
+    # 全文検索のトリガーを外してから変更し、最後に付け直す
+    operations = [
+        migrations.RunPython(
+            search_index._run(DROP_TRIGGER_SQL), search_index._run(TRIGGER_SQL),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='CSV インポートで案件を更新する際のキー', max_length=100, null=True, unique=True, verbose_name='外部ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='client',
+            constraint=models.UniqueConstraint(fields=('company_name', 'email'), name='client_company_email_unique'),
+        ),
+        migrations.RunPython(
+            search_index._run(TRIGGER_SQL), search_index._run(DROP_TRIGGER_SQL),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_history(apps, schema_editor):
+    """既存の案件は作成時点で現在のステータスだったものとして履歴を1件ずつ作る"""
+    Project = apps.get_model('projects', 'Project')
+    ProjectStatusHistory = apps.get_model('projects', 'ProjectStatusHistory')
+    projects = Project.objects.order_by().values_list('pk', 'status', 'created_at')
+    ProjectStatusHistory.objects.bulk_create(
+        (
+            ProjectStatusHistory(project_id=pk, from_status='', to_status=status, changed_at=created_at)
+            for pk, status, created_at in projects.iterator(chunk_size=5000)
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_import_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日付')),
+                ('cohort', models.DateField(verbose_name='作成月')),
+                ('stage', models.CharField(choices=[('inquiry', '初回相談'), ('hearing', 'ヒアリング中'), ('proposal', '提案作成中'), ('quotation', '見積提示'), ('negotiation', '商談中'), ('handover', 'エンジニア引継ぎ'), ('in_progress', '実施中'), ('completed', '完了'), ('on_hold', '保留'), ('lost', '失注')], max_length=20, verbose_name='ステータス')),
+                ('reached', models.IntegerField(default=0, verbose_name='到達数')),
+            ],
+            options={
+                'verbose_name': '日別コホート集計',
+                'verbose_name_plural': '日別コホート集計',
+                'ordering': ['-day', 'cohort', 'stage'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'cohort', 'stage'), name='cohort_daily_stat_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StageDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日付')),
+                ('stage', models.CharField(choices=[('inquiry', '初回相談'), ('hearing', 'ヒアリング中'), ('proposal', '提案作成中'), ('quotation', '見積提示'), ('negotiation', '商談中'), ('handover', 'エンジニア引継ぎ'), ('in_progress', '実施中'), ('completed', '完了'), ('on_hold', '保留'), ('lost', '失注')], max_length=20, verbose_name='ステータス')),
+                ('entered', models.IntegerField(default=0, verbose_name='流入数')),
+                ('exited', models.IntegerField(default=0, verbose_name='流出数')),
+                ('days_total', models.FloatField(default=0, verbose_name='滞在日数合計')),
+                ('duration_histogram', models.JSONField(default=list, verbose_name='滞在日数の分布')),
+            ],
+            options={
+                'verbose_name': '日別ステージ集計',
+                'verbose_name_plural': '日別ステージ集計',
+                'ordering': ['-day', 'stage'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'stage'), name='stage_daily_stat_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('inquiry', '初回相談'), ('hearing', 'ヒアリング中'), ('proposal', '提案作成中'), ('quotation', '見積提示'), ('negotiation', '商談中'), ('handover', 'エンジニア引継ぎ'), ('in_progress', '実施中'), ('completed', '完了'), ('on_hold', '保留'), ('lost', '失注')], max_length=20, verbose_name='変更前')),
+                ('to_status', models.CharField(choices=[('inquiry', '初回相談'), ('hearing', 'ヒアリング中'), ('proposal', '提案作成中'), ('quotation', '見積提示'), ('negotiation', '商談中'), ('handover', 'エンジニア引継ぎ'), ('in_progress', '実施中'), ('completed', '完了'), ('on_hold', '保留'), ('lost', '失注')], max_length=20, verbose_name='変更後')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='変更日時')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='projects.project', verbose_name='案件')),
+            ],
+            options={
+                'verbose_name': 'ステータス履歴',
+                'verbose_name_plural': 'ステータス履歴',
+                'ordering': ['-changed_at', '-id'],
+                'indexes': [models.Index(fields=['project', 'changed_at', 'id'], name='status_history_project_idx'), models.Index(fields=['changed_at'], name='status_history_changed_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_status_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['end_date', 'status', 'start_date'], name='project_schedule_idx'),
+        ),
+    ]
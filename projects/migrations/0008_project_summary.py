@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_summary(apps, schema_editor):
+    """既存の案件のサマリーを関連テーブルから作る"""
+    Project = apps.get_model('projects', 'Project')
+    ProjectSummary = apps.get_model('projects', 'ProjectSummary')
+    ProgressLog = apps.get_model('projects', 'ProgressLog')
+    Handover = apps.get_model('projects', 'Handover')
+    EngineerHandoff = apps.get_model('projects', 'EngineerHandoff')
+    logs = {
+        project_id: (count, last)
+        for project_id, count, last in ProgressLog.objects.order_by().values_list('project_id')
+        .annotate(Count('id'), Max('log_date'))
+    }
+    handovers = dict(
+        Handover.objects.order_by().filter(is_completed=False).values_list('project_id').annotate(Count('id'))
+    )
+    handoffs = dict(
+        EngineerHandoff.objects.order_by().filter(is_accepted=False).values_list('project_id').annotate(Count('id'))
+    )
+    ProjectSummary.objects.bulk_create(
+        (
+            ProjectSummary(
+                project_id=pk,
+                log_count=logs.get(pk, (0, None))[0],
+                last_log_date=logs.get(pk, (0, None))[1],
+                open_handover_count=handovers.get(pk, 0),
+                pending_handoff_count=handoffs.get(pk, 0),
+            )
+            for pk in Project.objects.order_by().values_list('pk', flat=True).iterator(chunk_size=5000)
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_schedule_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectSummary',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='projects.project', verbose_name='案件')),
+                ('last_log_date', models.DateTimeField(blank=True, null=True, verbose_name='最終活動日時')),
+                ('log_count', models.IntegerField(default=0, verbose_name='進捗記録数')),
+                ('open_handover_count', models.IntegerField(default=0, verbose_name='未完了の引継ぎ数')),
+                ('pending_handoff_count', models.IntegerField(default=0, verbose_name='承認待ちのバトンタッチ数')),
+            ],
+            options={
+                'verbose_name': '案件サマリー',
+                'verbose_name_plural': '案件サマリー',
+            },
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
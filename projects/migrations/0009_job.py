@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_project_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='処理名')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='引数')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '実行中'), ('succeeded', '完了'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='状態')),
+                ('attempts', models.IntegerField(default=0, verbose_name='実行回数')),
+                ('max_attempts', models.IntegerField(default=3, verbose_name='最大実行回数')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='実行予定日時')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='実行期限')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='ワーカー')),
+                ('progress', models.IntegerField(default=0, verbose_name='進捗（%）')),
+                ('progress_message', models.CharField(blank=True, max_length=200, verbose_name='進捗メッセージ')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='結果')),
+                ('error', models.TextField(blank=True, verbose_name='エラー')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='登録日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+            ],
+            options={
+                'verbose_name': 'バックグラウンド処理',
+                'verbose_name_plural': 'バックグラウンド処理',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx'), models.Index(fields=['status', 'locked_until'], name='job_lock_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:24
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('projects.migrations.0004_search_index')
+import_keys = import_module('projects.migrations.0005_import_keys')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_job'),
+    ]
+
+    # SQLite では列の追加（既定値が定数でない）でテーブルが作り直されるため、
+    # 全文検索のトリガーを外してから変更し、最後に付け直す
+    operations = [
+        migrations.RunPython(
+            search_index._run(import_keys.DROP_TRIGGER_SQL), search_index._run(import_keys.TRIGGER_SQL),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新日'),
+        ),
+        migrations.AddField(
+            model_name='engineerhandoff',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新日'),
+        ),
+        migrations.AddField(
+            model_name='handover',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新日'),
+        ),
+        migrations.AddField(
+            model_name='progresslog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新日'),
+        ),
+        migrations.RunPython(
+            search_index._run(import_keys.TRIGGER_SQL), search_index._run(import_keys.DROP_TRIGGER_SQL),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeFeedConsumer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='読み手')),
+                ('last_seq', models.BigIntegerField(default=0, verbose_name='既読の通し番号')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日')),
+            ],
+            options={
+                'verbose_name': '変更履歴の読み手',
+                'verbose_name_plural': '変更履歴の読み手',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50, verbose_name='モデル')),
+                ('object_id', models.BigIntegerField(blank=True, null=True, verbose_name='対象の ID')),
+                ('action', models.CharField(choices=[('save', '保存'), ('delete', '削除'), ('reset', '全件削除')], max_length=10, verbose_name='操作')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='変更日時')),
+            ],
+            options={
+                'verbose_name': '変更履歴',
+                'verbose_name_plural': '変更履歴',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['model', 'object_id', 'id'], name='changelog_object_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_change_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changelog',
+            name='action',
+            field=models.CharField(choices=[('save', '保存'), ('delete', '削除'), ('reset', '全件削除'), ('archive', 'アーカイブ')], max_length=10, verbose_name='操作'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedProject',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('external_id', models.CharField(blank=True, max_length=100, null=True, verbose_name='外部ID')),
+                ('title', models.CharField(max_length=200, verbose_name='案件名')),
+                ('status', models.CharField(choices=[('inquiry', '初回相談'), ('hearing', 'ヒアリング中'), ('proposal', '提案作成中'), ('quotation', '見積提示'), ('negotiation', '商談中'), ('handover', 'エンジニア引継ぎ'), ('in_progress', '実施中'), ('completed', '完了'), ('on_hold', '保留'), ('lost', '失注')], max_length=20, verbose_name='ステータス')),
+                ('consultation_content', models.TextField(blank=True, verbose_name='ご相談内容')),
+                ('proposal_content', models.TextField(blank=True, verbose_name='提案内容')),
+                ('estimated_amount', models.DecimalField(blank=True, decimal_places=0, max_digits=10, null=True, verbose_name='見積金額（円）')),
+                ('start_date', models.DateField(blank=True, null=True, verbose_name='開始予定日')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='完了予定日')),
+                ('created_at', models.DateTimeField(verbose_name='作成日')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日')),
+                ('closed_at', models.DateTimeField(verbose_name='完了・失注日時')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='アーカイブ日時')),
+                ('last_log_date', models.DateTimeField(blank=True, null=True, verbose_name='最終活動日時')),
+                ('log_count', models.IntegerField(default=0, verbose_name='進捗記録数')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_projects', to='projects.client', verbose_name='顧客')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済みの案件',
+                'verbose_name_plural': 'アーカイブ済みの案件',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedProgressLog',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('log_date', models.DateTimeField(verbose_name='記録日時')),
+                ('activity_type', models.CharField(choices=[('meeting', '打ち合わせ'), ('phone', '電話'), ('email', 'メール'), ('proposal', '提案作成'), ('quotation', '見積作成'), ('presentation', 'プレゼン'), ('other', 'その他')], max_length=100, verbose_name='活動種別')),
+                ('content', models.TextField(verbose_name='内容')),
+                ('next_action', models.TextField(blank=True, verbose_name='次回アクション')),
+                ('created_by', models.CharField(max_length=100, verbose_name='記録者')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_logs', to='projects.archivedproject', verbose_name='案件')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済みの進捗記録',
+                'verbose_name_plural': 'アーカイブ済みの進捗記録',
+                'ordering': ['-log_date'],
+                'indexes': [models.Index(fields=['project', '-log_date', '-id'], name='archived_log_project_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedHandover',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('handover_type', models.CharField(choices=[('staff_notsu', '@Staff_Notsuさんへの引継ぎ'), ('uragami', '浦上泰弘さんへの引継ぎ'), ('engineer', 'その他エンジニアへの引継ぎ')], max_length=20, verbose_name='引継ぎ先')),
+                ('handover_to', models.CharField(max_length=100, verbose_name='引継ぎ先担当者名')),
+                ('handover_date', models.DateTimeField(verbose_name='引継ぎ日時')),
+                ('handover_content', models.TextField(verbose_name='引継ぎ内容')),
+                ('technical_requirements', models.TextField(blank=True, verbose_name='技術要件')),
+                ('notes', models.TextField(blank=True, verbose_name='備考')),
+                ('is_completed', models.BooleanField(default=False, verbose_name='引継ぎ完了')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='handovers', to='projects.archivedproject', verbose_name='案件')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済みの引継ぎ記録',
+                'verbose_name_plural': 'アーカイブ済みの引継ぎ記録',
+                'ordering': ['-handover_date'],
+                'indexes': [models.Index(fields=['project', '-handover_date', '-id'], name='archived_handover_project_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedEngineerHandoff',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('engineer_name', models.CharField(max_length=100, verbose_name='エンジニア名')),
+                ('handoff_date', models.DateTimeField(verbose_name='バトンタッチ日時')),
+                ('technical_scope', models.TextField(verbose_name='技術的な対応範囲')),
+                ('current_status', models.TextField(verbose_name='現在の状況')),
+                ('client_requirements', models.TextField(verbose_name='顧客要件')),
+                ('timeline', models.TextField(blank=True, verbose_name='スケジュール')),
+                ('budget', models.DecimalField(blank=True, decimal_places=0, max_digits=10, null=True, verbose_name='予算（円）')),
+                ('special_notes', models.TextField(blank=True, verbose_name='特記事項')),
+                ('is_accepted', models.BooleanField(default=False, verbose_name='エンジニア承認済み')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engineer_handoffs', to='projects.archivedproject', verbose_name='案件')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済みのエンジニアバトンタッチ',
+                'verbose_name_plural': 'アーカイブ済みのエンジニアバトンタッチ',
+                'ordering': ['-handoff_date'],
+                'indexes': [models.Index(fields=['project', '-handoff_date', '-id'], name='archived_handoff_project_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedStatusHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('from_status', models.CharField(blank=True, choices=[('inquiry', '初回相談'), ('hearing', 'ヒアリング中'), ('proposal', '提案作成中'), ('quotation', '見積提示'), ('negotiation', '商談中'), ('handover', 'エンジニア引継ぎ'), ('in_progress', '実施中'), ('completed', '完了'), ('on_hold', '保留'), ('lost', '失注')], max_length=20, verbose_name='変更前')),
+                ('to_status', models.CharField(choices=[('inquiry', '初回相談'), ('hearing', 'ヒアリング中'), ('proposal', '提案作成中'), ('quotation', '見積提示'), ('negotiation', '商談中'), ('handover', 'エンジニア引継ぎ'), ('in_progress', '実施中'), ('completed', '完了'), ('on_hold', '保留'), ('lost', '失注')], max_length=20, verbose_name='変更後')),
+                ('changed_at', models.DateTimeField(verbose_name='変更日時')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='projects.archivedproject', verbose_name='案件')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済みのステータス履歴',
+                'verbose_name_plural': 'アーカイブ済みのステータス履歴',
+                'ordering': ['-changed_at', '-id'],
+                'indexes': [models.Index(fields=['project', 'changed_at', 'id'], name='archived_history_project_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    """既存の未完了の引継ぎ・承認待ちのバトンタッチを担当ごとに数える"""
+    QueueCounter = apps.get_model('projects', 'QueueCounter')
+    Handover = apps.get_model('projects', 'Handover')
+    EngineerHandoff = apps.get_model('projects', 'EngineerHandoff')
+    sources = [
+        ('handover', Handover.objects.filter(is_completed=False).values_list('handover_type')),
+        ('handoff', EngineerHandoff.objects.filter(is_accepted=False).values_list('engineer_name')),
+    ]
+    QueueCounter.objects.bulk_create(
+        QueueCounter(kind=kind, assignee=assignee, open_count=count)
+        for kind, rows in sources
+        for assignee, count in rows.order_by().annotate(Count('id'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0012_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueueCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('handover', '引継ぎ'), ('handoff', 'エンジニアバトンタッチ')], max_length=20, verbose_name='種類')),
+                ('assignee', models.CharField(max_length=100, verbose_name='担当')),
+                ('open_count', models.IntegerField(default=0, verbose_name='未完了の件数')),
+            ],
+            options={
+                'verbose_name': '作業キューの件数',
+                'verbose_name_plural': '作業キューの件数',
+                'ordering': ['kind', 'assignee'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='engineerhandoff',
+            index=models.Index(condition=models.Q(('is_accepted', False)), fields=['engineer_name', 'handoff_date'], name='handoff_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='handover',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['handover_type', 'handover_date'], name='handover_queue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='queuecounter',
+            constraint=models.UniqueConstraint(fields=('kind', 'assignee'), name='queue_counter_unique'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
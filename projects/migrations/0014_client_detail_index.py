@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0013_work_queues'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['client', '-created_at', '-id'], name='project_client_created_idx'),
+        ),
+    ]
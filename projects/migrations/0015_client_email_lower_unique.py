@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:58
+
+from importlib import import_module
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+search_index = import_module('projects.migrations.0004_search_index')
+import_keys = import_module('projects.migrations.0005_import_keys')
+
+
+def merge_duplicate_clients(apps, schema_editor):
+    """（会社名, メールアドレスの小文字）が重複する顧客を最も古い1件にまとめる
+
+    大文字小文字だけが違うメールアドレスの顧客は新しい制約に反するため、
+    後から登録された顧客の案件（アーカイブ済みを含む）を残す顧客に付け替えてから削除する。
+    """
+    Client = apps.get_model('projects', 'Client')
+    Project = apps.get_model('projects', 'Project')
+    ArchivedProject = apps.get_model('projects', 'ArchivedProject')
+    ChangeLog = apps.get_model('projects', 'ChangeLog')
+    clients = Client.objects.order_by().annotate(lower_email=Lower('email'))
+    duplicates = (
+        clients.values('company_name', 'lower_email')
+        .annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        merged = list(
+            clients.filter(company_name=duplicate['company_name'], lower_email=duplicate['lower_email'])
+            .exclude(pk=duplicate['keep']).values_list('pk', flat=True)
+        )
+        moved = list(Project.objects.filter(client_id__in=merged).values_list('pk', flat=True))
+        Project.objects.filter(pk__in=moved).update(client_id=duplicate['keep'])
+        ArchivedProject.objects.filter(client_id__in=merged).update(client_id=duplicate['keep'])
+        Client.objects.filter(pk__in=merged).delete()
+        # 外部システムにも付け替え・削除を伝える（projects/changefeed.py）
+        ChangeLog.objects.bulk_create(
+            [ChangeLog(model='project', object_id=pk, action='save') for pk in moved]
+            + [ChangeLog(model='client', object_id=pk, action='delete') for pk in merged]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0014_client_detail_index'),
+    ]
+
+    # SQLite では列のユニーク制約の削除でテーブルが作り直されるため、
+    # 全文検索のトリガーを外してから変更し、最後に付け直す
+    operations = [
+        migrations.RunPython(merge_duplicate_clients, migrations.RunPython.noop),
+        migrations.RunPython(
+            search_index._run(import_keys.DROP_TRIGGER_SQL), search_index._run(import_keys.TRIGGER_SQL),
+        ),
+        migrations.RemoveConstraint(
+            model_name='client',
+            name='client_company_email_unique',
+        ),
+        migrations.AddConstraint(
+            model_name='client',
+            constraint=models.UniqueConstraint(models.F('company_name'), django.db.models.functions.text.Lower('email'), name='client_company_email_unique'),
+        ),
+        migrations.RunPython(
+            search_index._run(import_keys.TRIGGER_SQL), search_index._run(import_keys.DROP_TRIGGER_SQL),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:03
+
+import django.db.models.deletion
+import projects.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0015_client_email_lower_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientSearchIndex',
+            fields=[
+                ('client', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='projects.client')),
+                ('document', projects.models.FullTextField(db_column='projects_client_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'projects_client_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectSearchIndex',
+            fields=[
+                ('project', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='projects.project')),
+                ('document', projects.models.FullTextField(db_column='projects_project_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'projects_project_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
@@ -11,11 +13,19 @@ class Client(models.Model):
     industry = models.CharField('業種', max_length=100, blank=True)
     company_size = models.CharField('企業規模', max_length=50, blank=True)
     created_at = models.DateTimeField('登録日', default=timezone.now)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
     
     class Meta:
         verbose_name = '顧客'
         verbose_name_plural = '顧客'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='client_created_idx'),
+        ]
+        constraints = [
+            # CSV インポート時の重複排除・更新のキー（メールアドレスは大文字小文字を区別しない）
+            models.UniqueConstraint('company_name', Lower('email'), name='client_company_email_unique'),
+        ]
     
     def __str__(self):
         return self.company_name
@@ -36,7 +46,16 @@ class Project(models.Model):
         ('lost', '失注'),
     ]
     
+    # 進行中とみなすステータス
+    ACTIVE_STATUSES = ['hearing', 'proposal', 'quotation', 'negotiation', 'handover', 'in_progress']
+    # 見積総額の集計対象ステータス
+    ESTIMATED_STATUSES = ['quotation', 'negotiation', 'handover', 'in_progress']
+    # 受注したとみなすステータス（顧客ごとの受注額）
+    WON_STATUSES = ['handover', 'in_progress', 'completed']
+    
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='projects', verbose_name='顧客')
+    external_id = models.CharField('外部ID', max_length=100, null=True, blank=True, unique=True,
+                                   help_text='CSV インポートで案件を更新する際のキー')
     title = models.CharField('案件名', max_length=200)
     status = models.CharField('ステータス', max_length=20, choices=STATUS_CHOICES, default='inquiry')
     consultation_content = models.TextField('ご相談内容', blank=True)
@@ -51,6 +70,14 @@ class Project(models.Model):
         verbose_name = '案件'
         verbose_name_plural = '案件'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='project_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='project_status_created_idx'),
+            # 売上予測（forecast.py）で予測期間に重なる案件だけを読む
+            models.Index(fields=['end_date', 'status', 'start_date'], name='project_schedule_idx'),
+            # 顧客詳細の最近の案件
+            models.Index(fields=['client', '-created_at', '-id'], name='project_client_created_idx'),
+        ]
     
     def __str__(self):
         return f'{self.client.company_name} - {self.title}'
@@ -72,11 +99,22 @@ class Handover(models.Model):
     technical_requirements = models.TextField('技術要件', blank=True)
     notes = models.TextField('備考', blank=True)
     is_completed = models.BooleanField('引継ぎ完了', default=False)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
     
     class Meta:
         verbose_name = '引継ぎ記録'
         verbose_name_plural = '引継ぎ記録'
         ordering = ['-handover_date']
+        indexes = [
+            models.Index(fields=['-handover_date', '-id'], name='handover_date_idx'),
+            models.Index(fields=['handover_type', '-handover_date', '-id'], name='handover_type_date_idx'),
+            # 真偽値の条件は NOT col / col で発行されるため部分インデックスで受ける
+            models.Index(fields=['-handover_date', '-id'], condition=Q(is_completed=False), name='handover_pending_date_idx'),
+            models.Index(fields=['-handover_date', '-id'], condition=Q(is_completed=True), name='handover_completed_date_idx'),
+            models.Index(fields=['project', '-handover_date', '-id'], name='handover_project_date_idx'),
+            # 作業キュー（projects/queues.py）は未完了の行だけを引継ぎ先ごとに読む
+            models.Index(fields=['handover_type', 'handover_date'], condition=Q(is_completed=False), name='handover_queue_idx'),
+        ]
     
     def __str__(self):
         return f'{self.project.title} - {self.get_handover_type_display()}'
@@ -84,27 +122,32 @@ class Handover(models.Model):
 
 class ProgressLog(models.Model):
     """進捗記録"""
+    ACTIVITY_TYPE_CHOICES = [
+        ('meeting', '打ち合わせ'),
+        ('phone', '電話'),
+        ('email', 'メール'),
+        ('proposal', '提案作成'),
+        ('quotation', '見積作成'),
+        ('presentation', 'プレゼン'),
+        ('other', 'その他'),
+    ]
+
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='progress_logs', verbose_name='案件')
     log_date = models.DateTimeField('記録日時', default=timezone.now)
-    activity_type = models.CharField('活動種別', max_length=100, 
-        choices=[
-            ('meeting', '打ち合わせ'),
-            ('phone', '電話'),
-            ('email', 'メール'),
-            ('proposal', '提案作成'),
-            ('quotation', '見積作成'),
-            ('presentation', 'プレゼン'),
-            ('other', 'その他'),
-        ]
-    )
+    activity_type = models.CharField('活動種別', max_length=100, choices=ACTIVITY_TYPE_CHOICES)
     content = models.TextField('内容')
     next_action = models.TextField('次回アクション', blank=True)
     created_by = models.CharField('記録者', max_length=100, default='担当者')
+    updated_at = models.DateTimeField('更新日', auto_now=True)
     
     class Meta:
         verbose_name = '進捗記録'
         verbose_name_plural = '進捗記録'
         ordering = ['-log_date']
+        indexes = [
+            models.Index(fields=['-log_date', '-id'], name='progresslog_date_idx'),
+            models.Index(fields=['project', '-log_date', '-id'], name='progresslog_project_date_idx'),
+        ]
     
     def __str__(self):
         return f'{self.project.title} - {self.log_date.strftime("%Y-%m-%d")}'
@@ -122,11 +165,407 @@ class EngineerHandoff(models.Model):
     budget = models.DecimalField('予算（円）', max_digits=10, decimal_places=0, null=True, blank=True)
     special_notes = models.TextField('特記事項', blank=True)
     is_accepted = models.BooleanField('エンジニア承認済み', default=False)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
     
     class Meta:
         verbose_name = 'エンジニアバトンタッチ'
         verbose_name_plural = 'エンジニアバトンタッチ'
         ordering = ['-handoff_date']
+        indexes = [
+            models.Index(fields=['-handoff_date', '-id'], name='handoff_date_idx'),
+            # 真偽値の条件は NOT col / col で発行されるため部分インデックスで受ける
+            models.Index(fields=['-handoff_date', '-id'], condition=Q(is_accepted=False), name='handoff_pending_date_idx'),
+            models.Index(fields=['-handoff_date', '-id'], condition=Q(is_accepted=True), name='handoff_accepted_date_idx'),
+            models.Index(fields=['project', '-handoff_date', '-id'], name='handoff_project_date_idx'),
+            # 作業キュー（projects/queues.py）は承認待ちの行だけをエンジニアごとに読む
+            models.Index(fields=['engineer_name', 'handoff_date'], condition=Q(is_accepted=False), name='handoff_queue_idx'),
+        ]
     
     def __str__(self):
         return f'{self.project.title} → {self.engineer_name}'
+
+
+class PipelineStat(models.Model):
+    """ステータス別の案件数・見積金額（ダッシュボード用の集計テーブル）"""
+    status = models.CharField('ステータス', max_length=20, choices=Project.STATUS_CHOICES, primary_key=True)
+    project_count = models.IntegerField('案件数', default=0)
+    estimated_amount_sum = models.DecimalField('見積金額合計（円）', max_digits=15, decimal_places=0, default=0)
+    
+    class Meta:
+        verbose_name = 'ステータス別集計'
+        verbose_name_plural = 'ステータス別集計'
+    
+    def __str__(self):
+        return f'{self.get_status_display()}: {self.project_count}件'
+
+
+class MonthlyProjectStat(models.Model):
+    """月別の新規案件数（ダッシュボード用の集計テーブル）"""
+    month = models.DateField('月', primary_key=True)
+    project_count = models.IntegerField('新規案件数', default=0)
+    
+    class Meta:
+        verbose_name = '月別新規案件集計'
+        verbose_name_plural = '月別新規案件集計'
+        ordering = ['-month']
+    
+    def __str__(self):
+        return f'{self.month:%Y-%m}: {self.project_count}件'
+
+
+class ProjectSummary(models.Model):
+    """案件ごとの活動サマリー（一覧・詳細画面用。関連データの保存・削除時に差分更新する）"""
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='summary', verbose_name='案件')
+    last_log_date = models.DateTimeField('最終活動日時', null=True, blank=True)
+    log_count = models.IntegerField('進捗記録数', default=0)
+    open_handover_count = models.IntegerField('未完了の引継ぎ数', default=0)
+    pending_handoff_count = models.IntegerField('承認待ちのバトンタッチ数', default=0)
+
+    class Meta:
+        verbose_name = '案件サマリー'
+        verbose_name_plural = '案件サマリー'
+
+    def __str__(self):
+        return f'{self.project_id}: 進捗記録{self.log_count}件'
+
+
+class ProjectStatusHistory(models.Model):
+    """案件のステータス遷移履歴（1回の遷移で1行）"""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='status_history', verbose_name='案件')
+    # 空文字は案件の新規作成を表す
+    from_status = models.CharField('変更前', max_length=20, choices=Project.STATUS_CHOICES, blank=True)
+    to_status = models.CharField('変更後', max_length=20, choices=Project.STATUS_CHOICES)
+    changed_at = models.DateTimeField('変更日時', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'ステータス履歴'
+        verbose_name_plural = 'ステータス履歴'
+        ordering = ['-changed_at', '-id']
+        indexes = [
+            # 分析の窓関数は案件ごとに時系列で並べる
+            models.Index(fields=['project', 'changed_at', 'id'], name='status_history_project_idx'),
+            models.Index(fields=['changed_at'], name='status_history_changed_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.project_id}: {self.from_status or "新規"} → {self.to_status}'
+
+
+class StageDailyStat(models.Model):
+    """日別・ステータス別の流入数と滞在日数（分析レポート用の集計テーブル）
+
+    exited は day にそのステータスから次へ移った件数、days_total はその滞在日数の合計、
+    duration_histogram は滞在日数を analytics.DURATION_BUCKETS で区切った件数。
+    """
+    day = models.DateField('日付')
+    stage = models.CharField('ステータス', max_length=20, choices=Project.STATUS_CHOICES)
+    entered = models.IntegerField('流入数', default=0)
+    exited = models.IntegerField('流出数', default=0)
+    days_total = models.FloatField('滞在日数合計', default=0)
+    duration_histogram = models.JSONField('滞在日数の分布', default=list)
+    
+    class Meta:
+        verbose_name = '日別ステージ集計'
+        verbose_name_plural = '日別ステージ集計'
+        ordering = ['-day', 'stage']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'stage'], name='stage_daily_stat_unique'),
+        ]
+    
+    def __str__(self):
+        return f'{self.day}: {self.get_stage_display()}'
+
+
+class CohortDailyStat(models.Model):
+    """日別・作成月（コホート）別に、初めて各ステータスに到達した案件数（分析レポート用の集計テーブル）"""
+    day = models.DateField('日付')
+    cohort = models.DateField('作成月')
+    stage = models.CharField('ステータス', max_length=20, choices=Project.STATUS_CHOICES)
+    reached = models.IntegerField('到達数', default=0)
+    
+    class Meta:
+        verbose_name = '日別コホート集計'
+        verbose_name_plural = '日別コホート集計'
+        ordering = ['-day', 'cohort', 'stage']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'cohort', 'stage'], name='cohort_daily_stat_unique'),
+        ]
+    
+    def __str__(self):
+        return f'{self.day}: {self.cohort:%Y-%m} {self.get_stage_display()}'
+
+
+class Job(models.Model):
+    """バックグラウンドで実行する処理（projects/jobs.py のキュー。manage.py run_worker が実行する）"""
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '実行中'),
+        ('succeeded', '完了'),
+        ('failed', '失敗'),
+    ]
+
+    name = models.CharField('処理名', max_length=100)
+    payload = models.JSONField('引数', default=dict, blank=True)
+    status = models.CharField('状態', max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField('実行回数', default=0)
+    max_attempts = models.IntegerField('最大実行回数', default=3)
+    # 待機中は実行可能になる日時、実行中はこの日時を過ぎたら停止したものとみなして再実行する
+    run_at = models.DateTimeField('実行予定日時', default=timezone.now)
+    locked_until = models.DateTimeField('実行期限', null=True, blank=True)
+    locked_by = models.CharField('ワーカー', max_length=100, blank=True)
+    progress = models.IntegerField('進捗（%）', default=0)
+    progress_message = models.CharField('進捗メッセージ', max_length=200, blank=True)
+    result = models.JSONField('結果', null=True, blank=True)
+    error = models.TextField('エラー', blank=True)
+    created_at = models.DateTimeField('登録日時', default=timezone.now)
+    started_at = models.DateTimeField('開始日時', null=True, blank=True)
+    finished_at = models.DateTimeField('終了日時', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'バックグラウンド処理'
+        verbose_name_plural = 'バックグラウンド処理'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # ワーカーは状態ごとに実行予定日時・実行期限の古い順に取り出す
+            models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_lock_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}（{self.get_status_display()}）'
+
+
+class QueueCounter(models.Model):
+    """担当ごとの未完了の件数（作業キュー用。引継ぎ・バトンタッチの保存・削除時に差分更新する）"""
+    KIND_CHOICES = [
+        ('handover', '引継ぎ'),
+        ('handoff', 'エンジニアバトンタッチ'),
+    ]
+
+    kind = models.CharField('種類', max_length=20, choices=KIND_CHOICES)
+    # 引継ぎは引継ぎ先（handover_type）、バトンタッチはエンジニア名
+    assignee = models.CharField('担当', max_length=100)
+    open_count = models.IntegerField('未完了の件数', default=0)
+
+    class Meta:
+        verbose_name = '作業キューの件数'
+        verbose_name_plural = '作業キューの件数'
+        ordering = ['kind', 'assignee']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'assignee'], name='queue_counter_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.assignee}: {self.open_count}件'
+
+
+class ChangeLog(models.Model):
+    """顧客・案件・引継ぎ・進捗記録・バトンタッチの変更履歴（projects/changefeed.py。追記のみ）
+
+    id が単調に増える通し番号で、外部システムは「N 番より後」を読んで差分だけを同期する。
+    """
+    ACTION_CHOICES = [
+        ('save', '保存'),
+        ('delete', '削除'),
+        # そのモデルの全行を削除した（サンプルデータの投入など）。object_id は空
+        ('reset', '全件削除'),
+        # アーカイブテーブルに移した（projects/archive.py）
+        ('archive', 'アーカイブ'),
+    ]
+
+    model = models.CharField('モデル', max_length=50)
+    object_id = models.BigIntegerField('対象の ID', null=True, blank=True)
+    action = models.CharField('操作', max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField('変更日時', default=timezone.now)
+
+    class Meta:
+        verbose_name = '変更履歴'
+        verbose_name_plural = '変更履歴'
+        ordering = ['id']
+        indexes = [
+            # 圧縮でモデル・行ごとに最新の1件を探す
+            models.Index(fields=['model', 'object_id', 'id'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return f'#{self.pk} {self.model} {self.object_id} {self.action}'
+
+
+class ChangeFeedConsumer(models.Model):
+    """変更履歴の読み手ごとの既読位置（manage.py consume_changes --consumer）"""
+    name = models.CharField('読み手', max_length=100, unique=True)
+    last_seq = models.BigIntegerField('既読の通し番号', default=0)
+    updated_at = models.DateTimeField('更新日', auto_now=True)
+
+    class Meta:
+        verbose_name = '変更履歴の読み手'
+        verbose_name_plural = '変更履歴の読み手'
+
+    def __str__(self):
+        return f'{self.name}（{self.last_seq}）'
+
+
+# 以下は全文検索の索引（projects/search.py）。SQLite FTS5 の仮想テーブルで、
+# マイグレーション 0004 で作成しトリガーで同期するため、Django では作成・更新しない。
+# rowid が元の行の id で、検索時に元のテーブルと結合して MATCH・rank を読むためだけに使う。
+
+
+class FullTextMatch(models.Lookup):
+    """FTS5 の MATCH（左辺は仮想テーブルと同じ名前の隠し列で、全列が対象になる）"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class FullTextField(models.TextField):
+    """FTS5 の仮想テーブルと同じ名前の隠し列（match で検索する）"""
+
+
+FullTextField.register_lookup(FullTextMatch)
+
+
+class ProjectSearchIndex(models.Model):
+    """案件の全文検索の索引（案件名・相談内容・提案内容・顧客名）"""
+    project = models.OneToOneField(
+        Project, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_index',
+    )
+    document = FullTextField(db_column='projects_project_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'projects_project_fts'
+
+
+class ClientSearchIndex(models.Model):
+    """顧客の全文検索の索引（会社名・担当者名・業種）"""
+    client = models.OneToOneField(
+        Client, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_index',
+    )
+    document = FullTextField(db_column='projects_client_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'projects_client_fts'
+
+
+# 以下はアーカイブテーブル（projects/archive.py）。完了・失注から一定期間が過ぎた案件と
+# その関連データを元の id のまま移し、案件詳細・検索からだけ読む（書き換えない）。
+
+
+class ArchivedProject(models.Model):
+    """アーカイブした案件"""
+    id = models.BigIntegerField(primary_key=True)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='archived_projects', verbose_name='顧客')
+    external_id = models.CharField('外部ID', max_length=100, null=True, blank=True)
+    title = models.CharField('案件名', max_length=200)
+    status = models.CharField('ステータス', max_length=20, choices=Project.STATUS_CHOICES)
+    consultation_content = models.TextField('ご相談内容', blank=True)
+    proposal_content = models.TextField('提案内容', blank=True)
+    estimated_amount = models.DecimalField('見積金額（円）', max_digits=10, decimal_places=0, null=True, blank=True)
+    start_date = models.DateField('開始予定日', null=True, blank=True)
+    end_date = models.DateField('完了予定日', null=True, blank=True)
+    created_at = models.DateTimeField('作成日')
+    updated_at = models.DateTimeField('更新日')
+    closed_at = models.DateTimeField('完了・失注日時')
+    archived_at = models.DateTimeField('アーカイブ日時', default=timezone.now)
+    # アーカイブ時点の案件サマリー（以後は変わらない）
+    last_log_date = models.DateTimeField('最終活動日時', null=True, blank=True)
+    log_count = models.IntegerField('進捗記録数', default=0)
+
+    class Meta:
+        verbose_name = 'アーカイブ済みの案件'
+        verbose_name_plural = 'アーカイブ済みの案件'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.client.company_name} - {self.title}'
+
+
+class ArchivedHandover(models.Model):
+    """アーカイブした案件の引継ぎ記録"""
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(ArchivedProject, on_delete=models.CASCADE, related_name='handovers', verbose_name='案件')
+    handover_type = models.CharField('引継ぎ先', max_length=20, choices=Handover.HANDOVER_TYPE_CHOICES)
+    handover_to = models.CharField('引継ぎ先担当者名', max_length=100)
+    handover_date = models.DateTimeField('引継ぎ日時')
+    handover_content = models.TextField('引継ぎ内容')
+    technical_requirements = models.TextField('技術要件', blank=True)
+    notes = models.TextField('備考', blank=True)
+    is_completed = models.BooleanField('引継ぎ完了', default=False)
+    updated_at = models.DateTimeField('更新日')
+
+    class Meta:
+        verbose_name = 'アーカイブ済みの引継ぎ記録'
+        verbose_name_plural = 'アーカイブ済みの引継ぎ記録'
+        ordering = ['-handover_date']
+        indexes = [
+            models.Index(fields=['project', '-handover_date', '-id'], name='archived_handover_project_idx'),
+        ]
+
+
+class ArchivedProgressLog(models.Model):
+    """アーカイブした案件の進捗記録"""
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(ArchivedProject, on_delete=models.CASCADE, related_name='progress_logs', verbose_name='案件')
+    log_date = models.DateTimeField('記録日時')
+    activity_type = models.CharField('活動種別', max_length=100, choices=ProgressLog.ACTIVITY_TYPE_CHOICES)
+    content = models.TextField('内容')
+    next_action = models.TextField('次回アクション', blank=True)
+    created_by = models.CharField('記録者', max_length=100)
+    updated_at = models.DateTimeField('更新日')
+
+    class Meta:
+        verbose_name = 'アーカイブ済みの進捗記録'
+        verbose_name_plural = 'アーカイブ済みの進捗記録'
+        ordering = ['-log_date']
+        indexes = [
+            models.Index(fields=['project', '-log_date', '-id'], name='archived_log_project_idx'),
+        ]
+
+
+class ArchivedEngineerHandoff(models.Model):
+    """アーカイブした案件のエンジニアバトンタッチ記録"""
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(ArchivedProject, on_delete=models.CASCADE, related_name='engineer_handoffs', verbose_name='案件')
+    engineer_name = models.CharField('エンジニア名', max_length=100)
+    handoff_date = models.DateTimeField('バトンタッチ日時')
+    technical_scope = models.TextField('技術的な対応範囲')
+    current_status = models.TextField('現在の状況')
+    client_requirements = models.TextField('顧客要件')
+    timeline = models.TextField('スケジュール', blank=True)
+    budget = models.DecimalField('予算（円）', max_digits=10, decimal_places=0, null=True, blank=True)
+    special_notes = models.TextField('特記事項', blank=True)
+    is_accepted = models.BooleanField('エンジニア承認済み', default=False)
+    updated_at = models.DateTimeField('更新日')
+
+    class Meta:
+        verbose_name = 'アーカイブ済みのエンジニアバトンタッチ'
+        verbose_name_plural = 'アーカイブ済みのエンジニアバトンタッチ'
+        ordering = ['-handoff_date']
+        indexes = [
+            models.Index(fields=['project', '-handoff_date', '-id'], name='archived_handoff_project_idx'),
+        ]
+
+
+class ArchivedStatusHistory(models.Model):
+    """アーカイブした案件のステータス遷移履歴（パイプライン分析の全期間の再集計で読む）"""
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey(ArchivedProject, on_delete=models.CASCADE, related_name='status_history', verbose_name='案件')
+    from_status = models.CharField('変更前', max_length=20, choices=Project.STATUS_CHOICES, blank=True)
+    to_status = models.CharField('変更後', max_length=20, choices=Project.STATUS_CHOICES)
+    changed_at = models.DateTimeField('変更日時')
+
+    class Meta:
+        verbose_name = 'アーカイブ済みのステータス履歴'
+        verbose_name_plural = 'アーカイブ済みのステータス履歴'
+        ordering = ['-changed_at', '-id']
+        indexes = [
+            models.Index(fields=['project', 'changed_at', 'id'], name='archived_history_project_idx'),
+        ]
@@ -0,0 +1,216 @@
+"""キーセット（カーソル）ページネーション
+
+OFFSET を使わず、並び順のキー（Meta.ordering の先頭フィールド + id）を
+境界条件にして次ページ・前ページを取得する。ページ番号に関係なく
+1ページ分の取得コストが一定になる。
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 50
+CURSOR_PARAM = 'cursor'
+# 一覧の件数はここまでしか数えない（超えた分は「以上」と表示する）
+COUNT_LIMIT = 1000
+
+
+class InvalidCursor(ValueError):
+    """不正なカーソルトークン"""
+
+
+def _ordering_of(queryset):
+    """クエリセットの並び順フィールドと降順かどうかを返す"""
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    if not ordering:
+        return 'id', False
+    first = ordering[0]
+    if first.startswith('-'):
+        return first[1:], True
+    return first, False
+
+
+def encode_cursor(value, pk, direction):
+    """境界行のキーを不透明なトークンに変換する"""
+    payload = json.dumps({'v': value, 'id': pk, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """トークンから (値, id, 方向) を復元する"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d']
+        if direction not in ('next', 'prev'):
+            raise InvalidCursor(token)
+        return payload['v'], int(payload['id']), direction
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor(token)
+
+
+class KeysetPage:
+    """1ページ分の結果とナビゲーション用トークン"""
+
+    def __init__(self, object_list, next_cursor, prev_cursor, params):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def _querystring(self, cursor):
+        params = self._params.copy()
+        params[CURSOR_PARAM] = cursor
+        return params.urlencode()
+
+    @property
+    def next_querystring(self):
+        """フィルタ条件を保持した次ページのクエリ文字列"""
+        return self._querystring(self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_querystring(self):
+        """フィルタ条件を保持した前ページのクエリ文字列"""
+        return self._querystring(self.prev_cursor) if self.has_previous else ''
+
+
+class KeysetPaginator:
+    """並び順フィールド + id をキーにしたページネーター"""
+
+    def __init__(self, queryset, per_page=DEFAULT_PER_PAGE):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field_name, self.descending = _ordering_of(queryset)
+        # 検索の関連度など、アノテーションでの並び替えはそのままの値をキーにする
+        if self.field_name in queryset.query.annotations:
+            self.field = None
+            self.output_field = queryset.query.annotations[self.field_name].output_field
+        else:
+            self.field = self.output_field = queryset.model._meta.get_field(self.field_name)
+
+    def _key(self, obj):
+        if self.field is None:
+            return getattr(obj, self.field_name), obj.pk
+        value = getattr(obj, self.field.attname)
+        return self.field.value_to_string(obj) if value is not None else None, obj.pk
+
+    def _decode(self, cursor):
+        """トークンから (値, id, 方向) を復元し、値を並び順のフィールドの型に変換する"""
+        value, pk, direction = decode_cursor(cursor)
+        # _key() は値のない行のトークンを作るが、None は境界条件に使えない
+        if value is None:
+            raise InvalidCursor(cursor)
+        try:
+            return self.output_field.to_python(value), pk, direction
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+
+    def _boundary(self, value, pk, forward):
+        """境界行より後ろ（forward=False なら前）の行を表す条件"""
+        # 降順で「後ろ」は値が小さい側
+        op = 'lt' if self.descending == forward else 'gt'
+        return (
+            Q(**{f'{self.field_name}__{op}': value}) |
+            Q(**{self.field_name: value, f'pk__{op}': pk})
+        )
+
+    def _ordered(self, forward):
+        prefix = '-' if self.descending == forward else ''
+        return self.queryset.order_by(f'{prefix}{self.field_name}', f'{prefix}pk')
+
+    def _window(self, cursor):
+        """カーソル位置から1件多く取得するクエリセットと方向"""
+        direction = 'next'
+        queryset = self._ordered(forward=True)
+        if cursor:
+            value, pk, direction = self._decode(cursor)
+            forward = direction == 'next'
+            queryset = self._ordered(forward).filter(self._boundary(value, pk, forward))
+        # 1件多く取得して続きの有無を判定する
+        return queryset[:self.per_page + 1], direction
+
+    def _build(self, rows, direction, cursor, params):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+
+        next_cursor = prev_cursor = None
+        if rows:
+            if direction == 'next':
+                if has_more:
+                    next_cursor = encode_cursor(*self._key(rows[-1]), 'next')
+                if cursor:
+                    prev_cursor = encode_cursor(*self._key(rows[0]), 'prev')
+            else:
+                next_cursor = encode_cursor(*self._key(rows[-1]), 'next')
+                if has_more:
+                    prev_cursor = encode_cursor(*self._key(rows[0]), 'prev')
+
+        return KeysetPage(rows, next_cursor, prev_cursor, params)
+
+    def page(self, cursor=None, params=None):
+        """カーソル位置から1ページ分を取得する"""
+        queryset, direction = self._window(cursor)
+        return self._build(list(queryset), direction, cursor, params)
+
+    async def apage(self, cursor=None, params=None):
+        """page() の非同期版"""
+        queryset, direction = self._window(cursor)
+        return self._build([obj async for obj in queryset], direction, cursor, params)
+
+
+def _cursor_of(request):
+    params = request.GET.copy()
+    return params, params.pop(CURSOR_PARAM, [None])[-1]
+
+
+def count_up_to(queryset, limit=COUNT_LIMIT):
+    """limit 件までの件数と、それより多くあるかどうか
+
+    全件の COUNT(*) はページ送りと違って件数に比例するため、LIMIT を付けたサブクエリで数える。
+    """
+    count = queryset.order_by().values('pk')[:limit + 1].count()
+    return min(count, limit), count > limit
+
+
+async def acount_up_to(queryset, limit=COUNT_LIMIT):
+    """count_up_to() の非同期版"""
+    count = await queryset.order_by().values('pk')[:limit + 1].acount()
+    return min(count, limit), count > limit
+
+
+def paginate(request, queryset, per_page=DEFAULT_PER_PAGE):
+    """リクエストのカーソルを読み取り、フィルタ条件を保持したページを返す"""
+    params, cursor = _cursor_of(request)
+    paginator = KeysetPaginator(queryset, per_page=per_page)
+    try:
+        return paginator.page(cursor, params)
+    except InvalidCursor:
+        return paginator.page(None, params)
+
+
+async def apaginate(request, queryset, per_page=DEFAULT_PER_PAGE):
+    """paginate() の非同期版"""
+    params, cursor = _cursor_of(request)
+    paginator = KeysetPaginator(queryset, per_page=per_page)
+    try:
+        return await paginator.apage(cursor, params)
+    except InvalidCursor:
+        return await paginator.apage(None, params)
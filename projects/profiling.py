@@ -0,0 +1,283 @@
+"""リクエストごとの SQL・テンプレート描画・メモリの計測
+
+settings.CRM_PROFILING が True のときだけ ProfilingMiddleware が有効になり、
+1リクエストごとに次の値を記録する。無効なときはミドルウェアごと外れるため負荷はない。
+
+- SQL の本数と実行時間の合計、遅い SQL の上位、同じ SQL の重複（N+1 クエリの目安）
+- テンプレートの描画時間（include などの入れ子は外側の描画に含める）
+- それ以外（ビューの Python 処理・ORM のインスタンス生成など）の時間
+- メモリ使用量のピーク（CRM_PROFILING_MEMORY。tracemalloc は重いため別に有効化する）
+
+SQL は CursorWrapper、描画は Template.render を記録付きのものに差し替えて測る。
+記録先は contextvars で持つため、非同期ビューから sync_to_async で実行した ORM も
+同じリクエストに記録される。集計はプロセス内に保持し、ビューごとのヒストグラムを
+views.profiling_stats（スタッフ限定）で JSON として返す。
+CRM_PROFILING_SAMPLE_RATE の割合で同期リクエストを cProfile にかけ、.prof を保存する。
+"""
+import contextvars
+import cProfile
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.utils import CursorWrapper
+from django.template.base import Template
+from django.utils import timezone
+
+# レイテンシ（ミリ秒）と SQL 本数のヒストグラムの区切り（最後の区間はそれ以上）
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+SLOWEST_QUERIES = 5
+RECENT_REQUESTS = 200
+SQL_PREVIEW = 300
+
+_current = contextvars.ContextVar('profiling_record', default=None)
+_installed = False
+
+
+def _install():
+    """SQL の実行とテンプレートの描画を記録付きのものに差し替える（一度だけ）"""
+    global _installed
+    if _installed:
+        return
+    execute_with_wrappers = CursorWrapper._execute_with_wrappers
+    render = Template.render
+
+    def _execute(self, sql, params, many, executor):
+        record = _current.get()
+        if record is None:
+            return execute_with_wrappers(self, sql, params, many, executor)
+        started = time.perf_counter()
+        try:
+            return execute_with_wrappers(self, sql, params, many, executor)
+        finally:
+            record.add_query(sql, params, many, time.perf_counter() - started)
+
+    def _render(self, context):
+        record = _current.get()
+        # 入れ子の描画（include など）は外側の描画時間に含まれる
+        if record is None or context.template is not None:
+            return render(self, context)
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            record.template_seconds += time.perf_counter() - started
+
+    CursorWrapper._execute_with_wrappers = _execute
+    Template.render = _render
+    _installed = True
+
+
+class RequestProfile:
+    """1リクエスト分の計測値"""
+
+    def __init__(self):
+        self.queries = []
+        self.template_seconds = 0.0
+        self.total_seconds = 0.0
+        self.peak_bytes = None
+        self.profile_path = None
+        # 非同期ビューでは ORM が別スレッドで動くため、追加はロックで守る
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, params, many, seconds):
+        with self._lock:
+            self.queries.append((sql, None if many else repr(params), seconds))
+
+    def summary(self, request, response):
+        sql_seconds = sum(seconds for _, _, seconds in self.queries)
+        similar = Counter(sql for sql, _, _ in self.queries)
+        exact = Counter((sql, params) for sql, params, _ in self.queries)
+        slowest = sorted(self.queries, key=lambda query: query[2], reverse=True)[:SLOWEST_QUERIES]
+        match = request.resolver_match
+        return {
+            'view': match.view_name if match else request.path,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'at': timezone.now().isoformat(),
+            'total_ms': round(self.total_seconds * 1000, 2),
+            'sql_ms': round(sql_seconds * 1000, 2),
+            'template_ms': round(self.template_seconds * 1000, 2),
+            'other_ms': round(max(self.total_seconds - sql_seconds - self.template_seconds, 0) * 1000, 2),
+            'queries': len(self.queries),
+            'slowest': [
+                {'sql': sql[:SQL_PREVIEW], 'ms': round(seconds * 1000, 2)} for sql, _, seconds in slowest
+            ],
+            # 同じ SQL（パラメータ違いを含む）が複数回。exact はパラメータまで同じ回数
+            'duplicates': [
+                {
+                    'sql': sql[:SQL_PREVIEW],
+                    'count': count,
+                    'exact': max(n for (s, _), n in exact.items() if s == sql),
+                }
+                for sql, count in similar.most_common() if count > 1
+            ],
+            'peak_kb': round(self.peak_bytes / 1024, 1) if self.peak_bytes is not None else None,
+            'profile': self.profile_path,
+        }
+
+
+def _bucket(value, buckets):
+    for index, upper in enumerate(buckets):
+        if value <= upper:
+            return index
+    return len(buckets)
+
+
+class ProfileStore:
+    """プロセス内のビューごとの集計と、直近のリクエストの計測値"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.since = timezone.now()
+            self.views = {}
+            self.recent = deque(maxlen=RECENT_REQUESTS)
+
+    def add(self, record):
+        with self._lock:
+            stats = self.views.setdefault(record['view'], {
+                'requests': 0,
+                'total_ms': 0.0,
+                'sql_ms': 0.0,
+                'template_ms': 0.0,
+                'other_ms': 0.0,
+                'queries': 0,
+                'max_queries': 0,
+                'requests_with_duplicates': 0,
+                'max_peak_kb': None,
+                'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                'query_histogram': [0] * (len(QUERY_BUCKETS) + 1),
+            })
+            stats['requests'] += 1
+            for key in ('total_ms', 'sql_ms', 'template_ms', 'other_ms', 'queries'):
+                stats[key] += record[key]
+            stats['max_queries'] = max(stats['max_queries'], record['queries'])
+            stats['requests_with_duplicates'] += bool(record['duplicates'])
+            if record['peak_kb'] is not None:
+                stats['max_peak_kb'] = max(stats['max_peak_kb'] or 0, record['peak_kb'])
+            stats['latency_histogram'][_bucket(record['total_ms'], LATENCY_BUCKETS_MS)] += 1
+            stats['query_histogram'][_bucket(record['queries'], QUERY_BUCKETS)] += 1
+            self.recent.append(record)
+
+    def snapshot(self, slowest=20):
+        """ビューごとの平均とヒストグラム、直近で遅かったリクエスト"""
+        with self._lock:
+            views = {}
+            for name, stats in self.views.items():
+                count = stats['requests']
+                views[name] = {
+                    'requests': count,
+                    **{
+                        f'mean_{key}': round(stats[key] / count, 2)
+                        for key in ('total_ms', 'sql_ms', 'template_ms', 'other_ms', 'queries')
+                    },
+                    'max_queries': stats['max_queries'],
+                    'requests_with_duplicates': stats['requests_with_duplicates'],
+                    'max_peak_kb': stats['max_peak_kb'],
+                    'latency_histogram': dict(zip(_labels(LATENCY_BUCKETS_MS, 'ms'), stats['latency_histogram'])),
+                    'query_histogram': dict(zip(_labels(QUERY_BUCKETS, ''), stats['query_histogram'])),
+                }
+            recent = sorted(self.recent, key=lambda record: record['total_ms'], reverse=True)[:slowest]
+            return {'since': self.since.isoformat(), 'views': views, 'slowest_requests': recent}
+
+
+def _labels(buckets, unit):
+    return [f'<={upper}{unit}' for upper in buckets] + [f'>{buckets[-1]}{unit}']
+
+
+store = ProfileStore()
+
+
+@contextmanager
+def profile_request(memory=False):
+    """区間内の SQL・テンプレート描画・メモリを記録する"""
+    _install()
+    record = RequestProfile()
+    token = _current.set(record)
+    # tracemalloc はプロセス全体で1つのため、別のリクエストが計測中なら測らない
+    trace_memory = memory and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.total_seconds = time.perf_counter() - started
+        if trace_memory:
+            record.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        _current.reset(token)
+
+
+class ProfilingMiddleware:
+    """リクエストごとの計測値を集計し、Server-Timing ヘッダーに載せる
+
+    settings.CRM_PROFILING が False なら MiddlewareNotUsed でミドルウェアごと外れる。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CRM_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.memory = getattr(settings, 'CRM_PROFILING_MEMORY', False)
+        self.sample_rate = getattr(settings, 'CRM_PROFILING_SAMPLE_RATE', 0)
+        self.profile_dir = Path(getattr(settings, 'CRM_PROFILING_DIR', 'profiles'))
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        _install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profiler = cProfile.Profile() if self.sample_rate and random.random() < self.sample_rate else None
+        with profile_request(self.memory) as record:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        if profiler is not None:
+            record.profile_path = self._dump(request, profiler)
+        return self._finish(request, response, record)
+
+    async def __acall__(self, request):
+        # cProfile はスレッドごとのため、非同期リクエストは対象にしない
+        with profile_request(self.memory) as record:
+            response = await self.get_response(request)
+        return self._finish(request, response, record)
+
+    def _dump(self, request, profiler):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        match = request.resolver_match
+        name = (match.view_name if match else 'unresolved').replace(':', '_')
+        path = self.profile_dir / f'{timezone.now():%Y%m%d_%H%M%S_%f}_{name}.prof'
+        profiler.dump_stats(path)
+        return str(path)
+
+    def _finish(self, request, response, record):
+        summary = record.summary(request, response)
+        store.add(summary)
+        response['Server-Timing'] = ', '.join([
+            f"sql;dur={summary['sql_ms']};desc=\"{summary['queries']} queries\"",
+            f"template;dur={summary['template_ms']}",
+            f"total;dur={summary['total_ms']}",
+        ])
+        return response
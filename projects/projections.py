@@ -0,0 +1,97 @@
+"""一覧画面・ダッシュボードで読む列の指定
+
+一覧の表に出すのは短い列だけなので、ご相談内容・引継ぎ内容・技術的な対応範囲などの
+TextField は読み込まない（only() で列を絞る）。表に抜粋を出す長文は、
+先頭 EXCERPT_LENGTH＋1 文字だけを SQL で切り出して *_excerpt として持たせる
+（テンプレートでは truncatechars:excerpt_length で省略記号を付ける）。
+
+ここに挙げていない列をテンプレートで使うと、行ごとに SQL が1本ずつ発行される。
+テストでは debug.forbid_lazy_loads() でこれを検出する。
+"""
+from django.db.models.functions import Substr
+
+from .models import Project, Handover, ProgressLog, EngineerHandoff
+
+# 一覧に表示する長文の抜粋の文字数
+EXCERPT_LENGTH = 60
+
+PROJECT_LIST_FIELDS = [
+    'title', 'status', 'estimated_amount', 'start_date', 'created_at', 'updated_at',
+    'client__company_name',
+    'summary__last_log_date', 'summary__open_handover_count', 'summary__pending_handoff_count',
+]
+HANDOVER_LIST_FIELDS = [
+    'handover_type', 'handover_to', 'handover_date', 'is_completed',
+    'project__title', 'project__client__company_name',
+]
+HANDOFF_LIST_FIELDS = [
+    'engineer_name', 'handoff_date', 'budget', 'is_accepted',
+    'project__title', 'project__client__company_name',
+]
+CLIENT_PROJECT_FIELDS = [
+    'client', 'title', 'status', 'estimated_amount', 'start_date', 'created_at',
+    'summary__last_log_date', 'summary__pending_handoff_count',
+]
+RECENT_PROJECT_FIELDS = ['title', 'status', 'estimated_amount', 'created_at', 'client__company_name']
+PENDING_HANDOFF_FIELDS = [
+    'engineer_name', 'handoff_date', 'budget',
+    'project__title', 'project__estimated_amount', 'project__start_date',
+]
+RECENT_ACTIVITY_FIELDS = ['log_date', 'activity_type', 'created_by', 'project__title']
+
+
+def _excerpt(field):
+    return Substr(field, 1, EXCERPT_LENGTH + 1)
+
+
+def project_rows(projects=None):
+    """案件一覧の行"""
+    projects = Project.objects.all() if projects is None else projects
+    return projects.select_related('client', 'summary').only(*PROJECT_LIST_FIELDS)
+
+
+def handover_rows(handovers=None):
+    """引継ぎ一覧の行（引継ぎ内容は抜粋だけ）"""
+    handovers = Handover.objects.all() if handovers is None else handovers
+    return (
+        handovers.select_related('project', 'project__client')
+        .only(*HANDOVER_LIST_FIELDS)
+        .annotate(content_excerpt=_excerpt('handover_content'))
+    )
+
+
+def handoff_rows(handoffs=None):
+    """エンジニアバトンタッチ一覧の行（技術的な対応範囲は抜粋だけ）"""
+    handoffs = EngineerHandoff.objects.all() if handoffs is None else handoffs
+    return (
+        handoffs.select_related('project', 'project__client')
+        .only(*HANDOFF_LIST_FIELDS)
+        .annotate(scope_excerpt=_excerpt('technical_scope'))
+    )
+
+
+def client_projects(client):
+    """顧客詳細の案件（新しい順。顧客は表示中の1社なので結合しない）"""
+    return (
+        client.projects.select_related('summary').only(*CLIENT_PROJECT_FIELDS)
+        .order_by('-created_at', '-id')
+    )
+
+
+def recent_projects(limit=10):
+    """ダッシュボードの最近の案件"""
+    return Project.objects.select_related('client').only(*RECENT_PROJECT_FIELDS)[:limit]
+
+
+def pending_handoffs():
+    """ダッシュボードのエンジニアへの引継ぎ待ち（古い順。優先度は queues.top() で付ける）"""
+    return (
+        EngineerHandoff.objects.filter(is_accepted=False)
+        .select_related('project').only(*PENDING_HANDOFF_FIELDS)
+        .order_by('handoff_date', 'id')
+    )
+
+
+def recent_activities(limit=10):
+    """ダッシュボードの最近の活動記録"""
+    return ProgressLog.objects.select_related('project').only(*RECENT_ACTIVITY_FIELDS)[:limit]
@@ -0,0 +1,173 @@
+"""担当ごとの作業キュー（未完了の引継ぎ・承認待ちのエンジニアバトンタッチ）
+
+引継ぎは引継ぎ先（handover_type）、バトンタッチはエンジニア名を担当とし、
+未完了の行だけを部分インデックス（handover_queue_idx / handoff_queue_idx）で読む。
+完了・承認済みの行がいくら増えても、読む行数は未完了の件数で決まる。
+
+担当ごとの件数は QueueCounter に持ち、保存・削除のたびにシグナル（signals.py）から
+変更前後の差分だけを反映する（キューの一覧は件数の表を読むだけで済む）。
+シグナルを通らない一括処理のあとは rebuild() で数え直す。
+
+優先度は経過日数・案件の見積金額・開始予定日の近さの重み付き和で、
+時刻によって変わるため SQL ではなく読み込んだ行に付ける（rank()）。
+見積金額・開始予定日の近さでも順位が変わるため、古い順の先頭だけでなく未完了の行すべてに
+優先度を付ける（読む行数は未完了の件数で、完了済みの行が増えても変わらない）。
+件数は QueueCounter から読む。
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Handover, EngineerHandoff, QueueCounter
+
+Queue = namedtuple('Queue', ['model', 'assignee', 'open', 'date'])
+
+# 種類 → (モデル, 担当の列, 未完了の条件, 日時の列)
+QUEUES = {
+    'handover': Queue(Handover, 'handover_type', {'is_completed': False}, 'handover_date'),
+    'handoff': Queue(EngineerHandoff, 'engineer_name', {'is_accepted': False}, 'handoff_date'),
+}
+KINDS = {queue.model: kind for kind, queue in QUEUES.items()}
+
+# 優先度の重み（settings.CRM_QUEUE_WEIGHTS で上書きできる）
+QUEUE_WEIGHTS = {'age': 1, 'amount': 1, 'start': 1}
+# 経過 AGE_UNIT_DAYS 日・見積金額 AMOUNT_UNIT 円がそれぞれ優先度 1 にあたる
+AGE_UNIT_DAYS = 30
+AMOUNT_UNIT = 10_000_000
+# 開始予定日の START_WINDOW_DAYS 日前から優先度が上がり始める（過ぎた分はさらに上がる）
+START_WINDOW_DAYS = 60
+# キューの画面・ダッシュボードに表示する件数
+QUEUE_LIMIT = 50
+DASHBOARD_LIMIT = 5
+
+# 行を読むときの列（長文は読まない）
+QUEUE_FIELDS = {
+    'handover': ['handover_type', 'handover_to', 'handover_date'],
+    'handoff': ['engineer_name', 'handoff_date', 'budget'],
+}
+PROJECT_FIELDS = ['project__title', 'project__estimated_amount', 'project__start_date', 'project__client__company_name']
+
+
+def get_weights():
+    """既定の重みに settings.CRM_QUEUE_WEIGHTS の上書きを反映する"""
+    weights = dict(QUEUE_WEIGHTS)
+    weights.update(getattr(settings, 'CRM_QUEUE_WEIGHTS', {}))
+    return weights
+
+
+def open_items(kind, assignee=None):
+    """未完了の行（担当を指定するとその担当だけ）。古い順"""
+    queue = QUEUES[kind]
+    items = queue.model.objects.filter(**queue.open)
+    if assignee is not None:
+        items = items.filter(**{queue.assignee: assignee})
+    return items.order_by(queue.date, 'id')
+
+
+def priority(item, date, now, weights):
+    """1件の優先度"""
+    project = item.project
+    age = max(0, (now - date).total_seconds() / 86400) / AGE_UNIT_DAYS
+    amount = float(project.estimated_amount or 0) / AMOUNT_UNIT
+    start = 0
+    if project.start_date is not None:
+        start = max(0, 1 - (project.start_date - timezone.localdate(now)).days / START_WINDOW_DAYS)
+    return weights['age'] * age + weights['amount'] * amount + weights['start'] * start
+
+
+def rank(items, now=None):
+    """各行に priority を付け、優先度の高い順（同じなら古い順）に並べたリストを返す
+
+    items の行は project の見積金額・開始予定日を読み込んでおくこと。
+    """
+    now = now or timezone.now()
+    weights = get_weights()
+    items = list(items)
+    if not items:
+        return items
+    date_field = QUEUES[KINDS[type(items[0])]].date
+    for item in items:
+        item.priority = priority(item, getattr(item, date_field), now, weights)
+    return sorted(items, key=lambda item: (-item.priority, getattr(item, date_field), item.pk))
+
+
+def queue_rows(kind, assignee=None):
+    """キューの画面で読む列だけを指定した未完了の行"""
+    return (
+        open_items(kind, assignee)
+        .select_related('project', 'project__client')
+        .only(*QUEUE_FIELDS[kind], *PROJECT_FIELDS)
+    )
+
+
+def top(rows, limit):
+    """未完了の行すべてに優先度を付け、上位 limit 件を返す"""
+    return rank(rows)[:limit]
+
+
+def counters(kind):
+    """未完了の行がある担当の件数（担当順）"""
+    return QueueCounter.objects.filter(kind=kind, open_count__gt=0)
+
+
+def snapshot(instance):
+    """キューの件数に関係する値（未完了なら (種類, 担当)、完了していれば None）"""
+    kind = KINDS[type(instance)]
+    queue = QUEUES[kind]
+    is_open = all(getattr(instance, name) == value for name, value in queue.open.items())
+    return (kind, getattr(instance, queue.assignee)) if is_open else None
+
+
+def previous_snapshot(instance):
+    """保存前の行のスナップショット（新規作成なら None）"""
+    if instance._state.adding:
+        return None
+    queue = QUEUES[KINDS[type(instance)]]
+    previous = (
+        queue.model.objects.filter(pk=instance.pk)
+        .only(queue.assignee, *queue.open).first()
+    )
+    return snapshot(previous) if previous is not None else None
+
+
+def _bump(kind, assignee, delta):
+    updated = QueueCounter.objects.filter(kind=kind, assignee=assignee).update(open_count=F('open_count') + delta)
+    if not updated:
+        QueueCounter.objects.create(kind=kind, assignee=assignee, open_count=delta)
+
+
+def apply_change(old, new):
+    """1件の変更（old → new のスナップショット）を担当ごとの件数に差分反映する"""
+    if old == new:
+        return
+    with transaction.atomic():
+        if old is not None:
+            _bump(*old, -1)
+        if new is not None:
+            _bump(*new, 1)
+
+
+def rebuild():
+    """未完了の行から担当ごとの件数を数え直す"""
+    with transaction.atomic():
+        QueueCounter.objects.all().delete()
+        QueueCounter.objects.bulk_create(
+            QueueCounter(kind=kind, assignee=assignee, open_count=count)
+            for kind, queue in QUEUES.items()
+            for assignee, count in (
+                open_items(kind).order_by().values_list(queue.assignee).annotate(count=Count('id'))
+            )
+        )
+
+
+def open_total(kind):
+    """種類ごとの未完了の件数の合計"""
+    return counters(kind).aggregate(total=Sum('open_count'))['total'] or 0
+
+
+async def aopen_total(kind):
+    """open_total() の非同期版"""
+    return (await counters(kind).aaggregate(total=Sum('open_count')))['total'] or 0
@@ -0,0 +1,187 @@
+"""集計・一覧画面の読み取りレプリカ
+
+use_replica を付けたビュー（ダッシュボード・案件一覧・顧客一覧・エクスポート）の
+projects アプリの読み取りだけを settings.CRM_REPLICA_ALIAS のデータベースに向ける。
+セッション・認証など他アプリのテーブルは常にプライマリを読む。
+
+- 書き込んだセッションは CRM_REPLICA_STICKY_SECONDS の間プライマリを読む
+  （自分の変更がすぐ一覧に反映されるように）。
+- レプリカの最終同期から CRM_REPLICA_MAX_LAG 秒を超えたらプライマリを読む。
+
+ローカルでは SQLite のバックアップ API でプライマリを別ファイルに複製する
+（manage.py sync_replica）。同期時刻はレプリカ側の SYNC_TABLE に記録する。
+"""
+import contextvars
+import logging
+import sqlite3
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SYNC_TABLE = 'projects_replica_sync'
+STICKY_SESSION_KEY = '_crm_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# 現在のビューで読み取りに使うエイリアス（None ならプライマリ）
+_read_alias = contextvars.ContextVar('replica_read_alias', default=None)
+# 現在のリクエストで書き込みがあったか（ReplicaStickyMiddleware が設定する）
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+
+
+def replica_alias():
+    """設定されたレプリカのエイリアス。未設定なら None"""
+    return getattr(settings, 'CRM_REPLICA_ALIAS', None)
+
+
+def current_read_alias():
+    """このコンテキストで projects の読み取りに使うエイリアス"""
+    state = _request_state.get()
+    if state is not None and state['wrote']:
+        return DEFAULT_DB_ALIAS
+    return _read_alias.get() or DEFAULT_DB_ALIAS
+
+
+def replica_lag(alias=None):
+    """レプリカの最終同期からの経過秒数。同期記録がなければ None"""
+    alias = alias or replica_alias()
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'SELECT synced_at FROM {SYNC_TABLE}')
+            row = cursor.fetchone()
+    except DatabaseError as exc:
+        logger.warning('レプリカ %s の同期状態を取得できません: %s', alias, exc)
+        return None
+    return time.time() - row[0] if row else None
+
+
+def sync(alias=None):
+    """プライマリをバックアップ API でレプリカのファイルに複製し、同期時刻を記録する"""
+    alias = alias or replica_alias()
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    started = time.time()
+    target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+    try:
+        source.connection.backup(target)
+        with target:
+            target.execute(f'CREATE TABLE IF NOT EXISTS {SYNC_TABLE} (synced_at REAL NOT NULL)')
+            target.execute(f'DELETE FROM {SYNC_TABLE}')
+            # 複製を始めた時刻を記録する（それ以降の書き込みは含まれない可能性がある）
+            target.execute(f'INSERT INTO {SYNC_TABLE} (synced_at) VALUES (?)', [started])
+    finally:
+        target.close()
+    return time.time() - started
+
+
+def _is_sticky(until):
+    return until is not None and until > time.time()
+
+
+def _choose_alias(sticky_until):
+    alias = replica_alias()
+    if alias is None or _is_sticky(sticky_until):
+        return None
+    lag = replica_lag(alias)
+    if lag is None or lag > settings.CRM_REPLICA_MAX_LAG:
+        logger.info('レプリカ %s の遅延が大きいためプライマリを読みます（%s 秒）', alias, lag)
+        return None
+    return alias
+
+
+def use_replica(view_func):
+    """ビュー内の projects の読み取りをレプリカに向ける（async def のビューにも使える）"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            sticky_until = await request.session.aget(STICKY_SESSION_KEY)
+            token = _read_alias.set(await sync_to_async(_choose_alias)(sticky_until))
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        token = _read_alias.set(_choose_alias(request.session.get(STICKY_SESSION_KEY)))
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """use_replica の区間だけ projects の読み取りをレプリカに向ける。書き込みは常にプライマリ"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'projects':
+            return None
+        alias = current_read_alias()
+        return alias if alias != DEFAULT_DB_ALIAS else None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカはプライマリの複製なので、どちらから読んだ行同士でも関連付けてよい
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # レプリカのスキーマは sync で複製する
+        if replica_alias() and db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaStickyMiddleware:
+    """書き込みのあったセッションを一定時間プライマリに固定する
+
+    SessionMiddleware より後ろ（内側）に置く。管理画面は GET でも
+    db_for_write のエイリアスでトランザクションを開くため、固定するのは
+    POST など安全でないメソッドで書き込みがあったときだけにする。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _should_stick(request, state):
+        return state['wrote'] and request.method not in SAFE_METHODS and replica_alias() is not None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = {'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if self._should_stick(request, state):
+            request.session[STICKY_SESSION_KEY] = time.time() + settings.CRM_REPLICA_STICKY_SECONDS
+        return response
+
+    async def __acall__(self, request):
+        state = {'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if self._should_stick(request, state):
+            await request.session.aset(STICKY_SESSION_KEY, time.time() + settings.CRM_REPLICA_STICKY_SECONDS)
+        return response
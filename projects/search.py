@@ -0,0 +1,49 @@
+"""全文検索（SQLite FTS5 trigram）
+
+SQLite では FTS5 の索引（マイグレーション 0004 で作成し、トリガーで同期）を
+使って関連度順に検索する。索引は ProjectSearchIndex / ClientSearchIndex（管理しない
+モデル）として元のテーブルと結合する。trigram は3文字未満の語を検索できないため、
+短い検索語と SQLite 以外のバックエンドでは icontains 検索にフォールバックする。
+"""
+from django.db import connections
+from django.db.models import F, Q
+
+MIN_QUERY_LENGTH = 3
+
+PROJECT_FALLBACK_FIELDS = ['title', 'client__company_name', 'consultation_content', 'proposal_content']
+CLIENT_FALLBACK_FIELDS = ['company_name', 'contact_person', 'industry']
+
+
+def _match_expression(queryset, search):
+    """FTS5 の MATCH 式を返す。FTS が使えない場合は None"""
+    if connections[queryset.db].vendor != 'sqlite' or len(search) < MIN_QUERY_LENGTH:
+        return None
+    # 入力全体を1つのフレーズとして扱い、icontains と同じ部分一致にする
+    return '"{}"'.format(search.replace('"', '""'))
+
+
+def _search(queryset, search, fallback_fields):
+    match = _match_expression(queryset, search)
+    if match is None:
+        condition = Q()
+        for field in fallback_fields:
+            condition |= Q(**{f'{field}__icontains': search})
+        return queryset.filter(condition)
+
+    # 索引テーブルを結合して rank を取り出す（相関サブクエリだと行ごとに MATCH が走る）
+    return (
+        queryset
+        .filter(search_index__document__match=match)
+        .annotate(search_rank=F('search_index__rank'))
+        .order_by('search_rank')
+    )
+
+
+def search_projects(queryset, search):
+    """案件名・相談内容・提案内容・顧客名で検索する（関連度順）"""
+    return _search(queryset, search, PROJECT_FALLBACK_FIELDS)
+
+
+def search_clients(queryset, search):
+    """会社名・担当者名・業種で検索する（関連度順）"""
+    return _search(queryset, search, CLIENT_FALLBACK_FIELDS)
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import changefeed, queues, stats, summary
+from .cache import bump_version_on_commit
+from .models import Client, Project, Handover, ProgressLog, EngineerHandoff, ProjectStatusHistory
+
+
+@receiver(pre_save, sender=Project)
+def remember_pipeline_snapshot(sender, instance, raw=False, **kwargs):
+    """更新前の集計値（ステータス履歴にも使う）を保持しておく"""
+    instance._pipeline_snapshot = None
+    if raw or instance._state.adding:
+        return
+    previous = (
+        Project.objects.filter(pk=instance.pk)
+        .values_list('status', 'estimated_amount', 'created_at')
+        .first()
+    )
+    if previous:
+        instance._pipeline_snapshot = stats.snapshot(*previous)
+
+
+@receiver(post_save, sender=Project)
+def update_pipeline_stats_on_save(sender, instance, raw=False, **kwargs):
+    """案件の作成・ステータス変更を集計テーブルに反映する"""
+    if raw:
+        return
+    stats.apply_project_change(
+        getattr(instance, '_pipeline_snapshot', None),
+        stats.snapshot(instance.status, instance.estimated_amount, instance.created_at),
+    )
+
+
+@receiver(post_save, sender=Project)
+def record_status_history(sender, instance, created, raw=False, **kwargs):
+    """案件の作成・ステータス変更を履歴に残す（分析レポート用）"""
+    if raw:
+        return
+    if created:
+        summary.create(instance)
+        ProjectStatusHistory.objects.create(
+            project=instance, from_status='', to_status=instance.status, changed_at=instance.created_at,
+        )
+        return
+    previous = getattr(instance, '_pipeline_snapshot', None)
+    if previous is not None and previous.status != instance.status:
+        ProjectStatusHistory.objects.create(
+            project=instance, from_status=previous.status, to_status=instance.status, changed_at=instance.updated_at,
+        )
+
+
+@receiver(post_delete, sender=Project)
+def update_pipeline_stats_on_delete(sender, instance, **kwargs):
+    """案件の削除を集計テーブルに反映する"""
+    stats.apply_project_change(
+        stats.snapshot(instance.status, instance.estimated_amount, instance.created_at),
+        None,
+    )
+
+
+def remember_summary_snapshot(sender, instance, raw=False, **kwargs):
+    """更新前の案件・件数の条件を保持しておく（案件サマリー用）"""
+    instance._summary_snapshot = None if raw else summary.previous_snapshot(instance)
+
+
+def update_summary_on_save(sender, instance, raw=False, **kwargs):
+    """進捗記録・引継ぎ・バトンタッチの作成・変更を案件サマリーに反映する"""
+    if raw:
+        return
+    summary.apply_change(sender, getattr(instance, '_summary_snapshot', None), summary.snapshot(instance))
+
+
+def update_summary_on_delete(sender, instance, origin=None, **kwargs):
+    """進捗記録・引継ぎ・バトンタッチの削除を案件サマリーに反映する"""
+    if summary.is_cascade(sender, origin):
+        return
+    summary.apply_change(sender, summary.snapshot(instance), None)
+
+
+for model in summary.COUNTERS:
+    pre_save.connect(remember_summary_snapshot, sender=model, dispatch_uid=f'remember_summary_snapshot_{model.__name__}')
+    post_save.connect(update_summary_on_save, sender=model, dispatch_uid=f'update_summary_on_save_{model.__name__}')
+    post_delete.connect(update_summary_on_delete, sender=model, dispatch_uid=f'update_summary_on_delete_{model.__name__}')
+
+
+def remember_queue_snapshot(sender, instance, raw=False, **kwargs):
+    """更新前の担当・未完了かどうかを保持しておく（作業キューの件数用）"""
+    instance._queue_snapshot = None if raw else queues.previous_snapshot(instance)
+
+
+def update_queue_counter_on_save(sender, instance, raw=False, **kwargs):
+    """引継ぎ・バトンタッチの作成・変更を担当ごとの件数に反映する"""
+    if raw:
+        return
+    queues.apply_change(getattr(instance, '_queue_snapshot', None), queues.snapshot(instance))
+
+
+def update_queue_counter_on_delete(sender, instance, **kwargs):
+    """引継ぎ・バトンタッチの削除（案件・顧客の削除に伴う連鎖削除も含む）を担当ごとの件数に反映する"""
+    queues.apply_change(queues.snapshot(instance), None)
+
+
+for model in queues.KINDS:
+    pre_save.connect(remember_queue_snapshot, sender=model, dispatch_uid=f'remember_queue_snapshot_{model.__name__}')
+    post_save.connect(update_queue_counter_on_save, sender=model, dispatch_uid=f'update_queue_counter_on_save_{model.__name__}')
+    post_delete.connect(update_queue_counter_on_delete, sender=model, dispatch_uid=f'update_queue_counter_on_delete_{model.__name__}')
+
+
+def invalidate_view_cache(sender, **kwargs):
+    """保存・削除されたモデルに依存するビューのキャッシュを無効化する"""
+    bump_version_on_commit(sender)
+
+
+for model in (Client, Project, Handover, ProgressLog, EngineerHandoff):
+    post_save.connect(invalidate_view_cache, sender=model, dispatch_uid=f'invalidate_view_cache_{model.__name__}')
+    post_delete.connect(invalidate_view_cache, sender=model, dispatch_uid=f'invalidate_view_cache_{model.__name__}')
+
+
+def record_change_on_save(sender, instance, raw=False, **kwargs):
+    """保存を変更履歴に追記する（外部システムの差分同期用）"""
+    if raw:
+        return
+    changefeed.record(sender, [instance.pk])
+
+
+def record_change_on_delete(sender, instance, **kwargs):
+    """削除を変更履歴に追記する（案件・顧客の削除に伴う連鎖削除も1行ずつ記録する）"""
+    changefeed.record(sender, [instance.pk], action='delete')
+
+
+for model in changefeed.TRACKED_MODELS:
+    post_save.connect(record_change_on_save, sender=model, dispatch_uid=f'record_change_on_save_{model.__name__}')
+    post_delete.connect(record_change_on_delete, sender=model, dispatch_uid=f'record_change_on_delete_{model.__name__}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """SQLite の接続ごとに settings.CRM_SQLITE_PRAGMAS の PRAGMA を設定する"""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in getattr(settings, 'CRM_SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,140 @@
+"""ダッシュボード用集計テーブルの更新・再構築"""
+from collections import Counter, namedtuple
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Project, PipelineStat, MonthlyProjectStat, ArchivedProject
+
+ProjectSnapshot = namedtuple('ProjectSnapshot', ['status', 'amount', 'month'])
+
+
+def month_of(value):
+    """日時をローカルタイムの月初日に変換する"""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def snapshot(status, amount, created_at):
+    """集計に関係する値だけを取り出す"""
+    return ProjectSnapshot(status, amount or 0, month_of(created_at))
+
+
+def _bump_status(status, count, amount):
+    updated = PipelineStat.objects.filter(status=status).update(
+        project_count=F('project_count') + count,
+        estimated_amount_sum=F('estimated_amount_sum') + amount,
+    )
+    if not updated:
+        PipelineStat.objects.create(status=status, project_count=count, estimated_amount_sum=amount)
+
+
+def _bump_month(month, count):
+    updated = MonthlyProjectStat.objects.filter(month=month).update(
+        project_count=F('project_count') + count,
+    )
+    if not updated:
+        MonthlyProjectStat.objects.create(month=month, project_count=count)
+
+
+def apply_project_change(old, new):
+    """案件1件の変更（old → new）を集計テーブルに差分反映する
+
+    old が None なら新規作成、new が None なら削除を表す。
+    """
+    if old == new:
+        return
+    with transaction.atomic():
+        if old is None or new is None or (old.status, old.amount) != (new.status, new.amount):
+            if old is not None:
+                _bump_status(old.status, -1, -old.amount)
+            if new is not None:
+                _bump_status(new.status, 1, new.amount)
+        if old is None or new is None or old.month != new.month:
+            if old is not None:
+                _bump_month(old.month, -1)
+            if new is not None:
+                _bump_month(new.month, 1)
+
+
+def rebuild():
+    """Project テーブル（とアーカイブした案件）から集計テーブルを作り直す"""
+    counts, amounts, months = Counter(), Counter(), Counter()
+    with transaction.atomic():
+        PipelineStat.objects.all().delete()
+        MonthlyProjectStat.objects.all().delete()
+
+        for model in (Project, ArchivedProject):
+            by_status = (
+                model.objects.order_by()
+                .values('status')
+                .annotate(count=Count('id'), amount=Sum('estimated_amount'))
+            )
+            for row in by_status:
+                counts[row['status']] += row['count']
+                amounts[row['status']] += row['amount'] or 0
+
+            by_month = (
+                model.objects.order_by()
+                .annotate(month=TruncMonth('created_at', output_field=DateField()))
+                .values('month')
+                .annotate(count=Count('id'))
+            )
+            for row in by_month:
+                months[row['month']] += row['count']
+
+        PipelineStat.objects.bulk_create(
+            PipelineStat(status=status, project_count=count, estimated_amount_sum=amounts[status])
+            for status, count in counts.items()
+        )
+        MonthlyProjectStat.objects.bulk_create(
+            MonthlyProjectStat(month=month, project_count=count)
+            for month, count in months.items()
+        )
+
+
+def _summarize(stats):
+    status_stats = [
+        {'status': value, 'count': stats[value].project_count}
+        for value, _ in Project.STATUS_CHOICES
+        if value in stats and stats[value].project_count
+    ]
+    active_projects_count = sum(
+        stats[value].project_count for value in Project.ACTIVE_STATUSES if value in stats
+    )
+    total_estimated = sum(
+        stats[value].estimated_amount_sum for value in Project.ESTIMATED_STATUSES if value in stats
+    )
+
+    return {
+        'status_stats': status_stats,
+        'active_projects_count': active_projects_count,
+        'total_estimated': total_estimated,
+    }
+
+
+def pipeline_summary():
+    """ダッシュボードに表示するステータス別集計を返す"""
+    return _summarize({stat.status: stat for stat in PipelineStat.objects.all()})
+
+
+async def apipeline_summary():
+    """pipeline_summary() の非同期版"""
+    return _summarize({stat.status: stat async for stat in PipelineStat.objects.all()})
+
+
+def _this_month():
+    return timezone.localdate().replace(day=1)
+
+
+def new_projects_count(month=None):
+    """指定月（省略時は今月）の新規案件数"""
+    stat = MonthlyProjectStat.objects.filter(month=month or _this_month()).first()
+    return stat.project_count if stat else 0
+
+
+async def anew_projects_count(month=None):
+    """new_projects_count() の非同期版"""
+    stat = await MonthlyProjectStat.objects.filter(month=month or _this_month()).afirst()
+    return stat.project_count if stat else 0
@@ -0,0 +1,142 @@
+"""案件ごとの活動サマリー（最終活動日時・進捗記録数・未完了の引継ぎ数・承認待ちのバトンタッチ数）
+
+進捗記録・引継ぎ・バトンタッチの保存・削除のたびに、シグナル（signals.py）から
+変更前後の差分だけを ProjectSummary に反映する。一覧画面は案件と1対1で結合して
+読むだけで済み、行ごとに関連テーブルを数える必要がない。
+
+最終活動日時は進捗記録が変わった案件だけ、(project, -log_date) のインデックスで
+最新の1件を引き直す（最新の記録が削除されても正しい値になる）。
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Project, ProjectSummary, ProgressLog, Handover, EngineerHandoff
+
+# 関連モデル → (件数の列, 数える条件)
+COUNTERS = {
+    ProgressLog: ('log_count', {}),
+    Handover: ('open_handover_count', {'is_completed': False}),
+    EngineerHandoff: ('pending_handoff_count', {'is_accepted': False}),
+}
+
+Snapshot = namedtuple('Snapshot', ['project_id', 'counted', 'log_date'])
+
+
+def _tracked_fields(model):
+    _, conditions = COUNTERS[model]
+    return ['project', *conditions] + (['log_date'] if model is ProgressLog else [])
+
+
+def snapshot(instance):
+    """サマリーに関係する値だけを取り出す"""
+    _, conditions = COUNTERS[type(instance)]
+    counted = all(getattr(instance, name) == value for name, value in conditions.items())
+    return Snapshot(instance.project_id, counted, getattr(instance, 'log_date', None))
+
+
+def previous_snapshot(instance):
+    """保存前の行のスナップショット（新規作成なら None）"""
+    if instance._state.adding:
+        return None
+    model = type(instance)
+    previous = model.objects.filter(pk=instance.pk).only(*_tracked_fields(model)).first()
+    return snapshot(previous) if previous is not None else None
+
+
+def is_cascade(sender, origin):
+    """案件・顧客の削除に伴う連鎖削除か（サマリーも一緒に削除されるため更新しない）"""
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is not sender
+
+
+def _latest_log_date(project_id):
+    return Subquery(
+        ProgressLog.objects.filter(project_id=project_id).order_by('-log_date', '-id').values('log_date')[:1]
+    )
+
+
+def apply_change(model, old, new):
+    """関連データ1件の変更（old → new）を案件サマリーに差分反映する
+
+    old が None なら新規作成、new が None なら削除を表す。
+    """
+    if old == new:
+        return
+    field, _ = COUNTERS[model]
+    deltas = defaultdict(int)
+    for value, sign in ((old, -1), (new, 1)):
+        if value is not None:
+            deltas[value.project_id] += sign if value.counted else 0
+
+    with transaction.atomic():
+        for project_id, delta in deltas.items():
+            changes = {}
+            if delta:
+                changes[field] = F(field) + delta
+            if model is ProgressLog:
+                changes['last_log_date'] = _latest_log_date(project_id)
+            if changes and not ProjectSummary.objects.filter(project_id=project_id).update(**changes):
+                # サマリーがない案件（一括登録の直後など）はその場で作る
+                rebuild([project_id])
+
+
+def create(project):
+    """新規作成した案件の空のサマリーを作る"""
+    ProjectSummary.objects.create(project=project)
+
+
+def create_missing():
+    """サマリーのない案件（bulk_create で登録した案件）のサマリーを作る"""
+    using = router.db_for_write(ProjectSummary)
+    with transaction.atomic(using=using):
+        _insert(Project.objects.using(using).filter(summary__isnull=True), using)
+
+
+def _count(model):
+    """案件ごとの関連データの件数（(project, ...) のインデックスで数える相関サブクエリ）"""
+    _, conditions = COUNTERS[model]
+    counts = (
+        model.objects.filter(project=OuterRef('pk'), **conditions)
+        .order_by().values('project').annotate(count=Count('id')).values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def _insert(projects, using):
+    """projects の各案件のサマリーを、モデルインスタンスを作らず INSERT ... SELECT 1本で書き込む"""
+    rows = projects.order_by().annotate(
+        summary_last_log_date=_latest_log_date(OuterRef('pk')),
+        summary_log_count=_count(ProgressLog),
+        summary_open_handover_count=_count(Handover),
+        summary_pending_handoff_count=_count(EngineerHandoff),
+    ).values_list(
+        'pk', 'summary_last_log_date', 'summary_log_count',
+        'summary_open_handover_count', 'summary_pending_handoff_count',
+    )
+    db = connections[using]
+    columns = ['project_id', 'last_log_date', 'log_count', 'open_handover_count', 'pending_handoff_count']
+    sql, params = rows.query.sql_with_params()
+    with db.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {db.ops.quote_name(ProjectSummary._meta.db_table)} '
+            f'({", ".join(db.ops.quote_name(column) for column in columns)}) {sql}',
+            params,
+        )
+
+
+def rebuild(project_ids=None):
+    """関連テーブルから案件サマリーを作り直す（project_ids を指定するとその案件だけ）"""
+    using = router.db_for_write(ProjectSummary)
+    summaries = ProjectSummary.objects.using(using)
+    projects = Project.objects.using(using)
+    if project_ids is not None:
+        summaries = summaries.filter(project_id__in=project_ids)
+        projects = projects.filter(pk__in=project_ids)
+    with transaction.atomic(using=using):
+        summaries.delete()
+        _insert(projects, using)
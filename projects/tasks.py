@@ -0,0 +1,102 @@
+"""バックグラウンドで実行する処理（jobs.enqueue(処理名, 引数) で登録する）"""
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+from . import analytics, archive, changefeed, exports, forecast, imports, queues, stats, summary
+from .cache import bump_version
+from .jobs import task
+from .models import Client, Project, Handover, ProgressLog, EngineerHandoff
+
+# 結果に残すエラーの件数
+MAX_REPORTED_ERRORS = 100
+
+
+def job_file_dir():
+    """アップロードされた CSV・エクスポート結果を置くディレクトリ"""
+    path = Path(settings.CRM_JOB_FILE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _count_lines(path):
+    with open(path, 'rb') as file:
+        return sum(1 for _ in file)
+
+
+@task('import_csv')
+def import_csv(job, path, batch_size=imports.DEFAULT_BATCH_SIZE, dry_run=False, remove=False):
+    """CSV の一括インポート（manage.py import_data・管理画面と同じ処理）
+
+    remove が True なら、成功したあとに CSV を削除する（管理画面からアップロードされたファイル）。
+    """
+    # ヘッダー行を除いた行数（改行を含む値があると実際の行数より多くなる目安）
+    total = max(_count_lines(path) - 1, 1)
+
+    def progress(report):
+        job.progress(report.rows, total, f'{report.rows}行 / 顧客 {report.clients}件 / 案件 {report.projects}件')
+
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        report = imports.import_csv(file, batch_size, dry_run, progress=progress)
+    if remove:
+        os.remove(path)
+    return {
+        'rows': report.rows,
+        'clients': report.clients,
+        'projects': report.projects,
+        'error_count': len(report.errors),
+        'errors': report.errors[:MAX_REPORTED_ERRORS],
+    }
+
+
+@task('export')
+def export(job, name, fmt='csv', params=None, output=None):
+    """一覧データのエクスポートをファイルに書き出す（output を省略すると job_file_dir() に作る）"""
+    if name not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise ValueError(f'エクスポートできません: {name}.{fmt}')
+    params = params or {}
+    build_queryset, _ = exports.EXPORTS[name]
+    total = build_queryset(params).count()
+    output = output or str(job_file_dir() / f'{name}_{job.id}.{fmt}')
+    count = 0
+    with open(output, 'w', encoding='utf-8', newline='') as file:
+        for line in exports.stream(name, fmt, params):
+            file.write(line)
+            count += 1
+            job.progress(count, total, f'{count}行')
+    # CSV はヘッダー行を除く
+    return {'output': output, 'rows': count - 1 if fmt == 'csv' else count}
+
+
+def _invalidate_caches():
+    bump_version(Client, Project, Handover, ProgressLog, EngineerHandoff)
+    forecast.invalidate()
+
+
+@task('rebuild_derived_data')
+def rebuild_derived_data(job):
+    """集計テーブル・案件サマリー・作業キューの件数・分析の日別集計・キャッシュをすべて作り直す"""
+    steps = [
+        ('ステータス別・月別集計', stats.rebuild),
+        ('案件サマリー', summary.rebuild),
+        ('作業キューの件数', queues.rebuild),
+        ('パイプライン分析の日別集計', lambda: analytics.rollup(full=True)),
+        ('キャッシュ', _invalidate_caches),
+    ]
+    for done, (label, step) in enumerate(steps):
+        job.progress(done, len(steps), f'{label}を作り直しています')
+        step()
+    return {'steps': [label for label, _ in steps]}
+
+
+@task('compact_changes')
+def compact_changes(job):
+    """保持期間を過ぎた変更履歴を、行ごとに最新の1件だけにする"""
+    return {'deleted': changefeed.compact()}
+
+
+@task('archive_projects')
+def archive_projects(job):
+    """完了・失注から一定期間が過ぎた案件をアーカイブテーブルに移す"""
+    return {'archived': archive.archive()}
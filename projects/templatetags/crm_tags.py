@@ -0,0 +1,46 @@
+"""CRM 画面共通のテンプレートフィルタ
+
+ステータスのバッジは Project.STATUS_CHOICES から起動時に一度だけ HTML を組み立てておき、
+描画時は辞書を引くだけにする（行ごとに10分岐の {% if %} を評価しない）。
+"""
+from django import template
+from django.utils.html import format_html
+
+from ..models import Project
+
+register = template.Library()
+
+# ステータス → バッジの CSS クラス（base.html の .badge-*）
+STATUS_BADGE_CLASSES = {
+    'inquiry': 'badge-info',
+    'hearing': 'badge-primary',
+    'proposal': 'badge-warning',
+    'quotation': 'badge-warning',
+    'negotiation': 'badge-warning',
+    'handover': 'badge-info',
+    'in_progress': 'badge-success',
+    'completed': 'badge-success',
+    'on_hold': '',
+    'lost': 'badge-danger',
+}
+
+STATUS_LABELS = dict(Project.STATUS_CHOICES)
+STATUS_BADGES = {
+    value: format_html('<span class="{}">{}</span>', f'badge {STATUS_BADGE_CLASSES.get(value, "")}'.strip(), label)
+    for value, label in Project.STATUS_CHOICES
+}
+
+
+@register.filter
+def status_label(status):
+    """ステータスの表示名（例: 'negotiation' → 商談中）"""
+    return STATUS_LABELS.get(status, status)
+
+
+@register.filter
+def status_badge(status):
+    """ステータスのバッジ HTML（未知の値はそのまま表示する）"""
+    badge = STATUS_BADGES.get(status)
+    if badge is None:
+        return format_html('<span class="badge">{}</span>', status)
+    return badge
@@ -1,3 +1,1934 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+import base64
+import contextlib
+import csv
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.template import Context as TemplateContext, Template
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    analytics, archive, benchmarks, changefeed, client_stats, forecast, imports, jobs, profiling, projections, queues, replica, stats,
+    summary,
+)
+from .debug import LazyLoadError, forbid_lazy_loads
+from .models import (
+    Client, Project, Handover, ProgressLog, EngineerHandoff, PipelineStat, MonthlyProjectStat, ProjectStatusHistory,
+    ProjectSummary, Job, ChangeLog, ChangeFeedConsumer, ArchivedProject, QueueCounter,
+)
+from .pagination import KeysetPaginator, count_up_to, encode_cursor, paginate
+from .search import search_projects, search_clients
+
+
+class CRMTestCase(TestCase):
+    """テストごとにビューキャッシュを空にする（DB のロールバックはキャッシュに反映されないため）"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        caches['fragments'].clear()
+
+
+def make_client(**kwargs):
+    defaults = {'company_name': 'テスト株式会社', 'contact_person': '山田太郎'}
+    defaults.update(kwargs)
+    return Client.objects.create(**defaults)
+
+
+def make_project(client, **kwargs):
+    defaults = {'title': 'テスト案件', 'status': 'inquiry'}
+    defaults.update(kwargs)
+    return Project.objects.create(client=client, **defaults)
+
+
+class KeysetPaginationTests(CRMTestCase):
+    """キーセットページネーション"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_obj = make_client()
+        base = timezone.now()
+        # 同一 created_at を含めて id のタイブレークを確認する
+        cls.projects = [
+            make_project(
+                cls.client_obj,
+                title=f'案件{i}',
+                status='hearing' if i % 2 else 'inquiry',
+                created_at=base - timedelta(minutes=i // 2),
+            )
+            for i in range(7)
+        ]
+
+    def expected_order(self, queryset):
+        return list(queryset.order_by('-created_at', '-pk'))
+
+    def test_walks_all_pages_forward_and_back(self):
+        paginator = KeysetPaginator(Project.objects.all(), per_page=3)
+        expected = self.expected_order(Project.objects.all())
+
+        seen, pages, cursor = [], [], None
+        while True:
+            page = paginator.page(cursor)
+            pages.append(page)
+            seen.extend(page.object_list)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous)
+
+        back = paginator.page(pages[-1].prev_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        self.assertTrue(back.has_previous)
+        first = paginator.page(back.prev_cursor)
+        self.assertEqual(first.object_list, pages[0].object_list)
+        self.assertFalse(first.has_previous)
+
+    def test_querystring_preserves_filters(self):
+        request = RequestFactory().get('/projects/', {'status': 'hearing', 'search': '案件'})
+        queryset = Project.objects.filter(status='hearing')
+        page = paginate(request, queryset, per_page=2)
+        self.assertIn('status=hearing', page.next_querystring)
+
+        request = RequestFactory().get('/projects/?' + page.next_querystring)
+        second = paginate(request, queryset, per_page=2)
+        self.assertEqual(
+            page.object_list + second.object_list,
+            self.expected_order(queryset)[:4],
+        )
+        self.assertIn('status=hearing', second.previous_querystring)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        request = RequestFactory().get('/projects/', {'cursor': 'not-a-cursor'})
+        page = paginate(request, Project.objects.all(), per_page=3)
+        self.assertEqual(page.object_list, self.expected_order(Project.objects.all())[:3])
+
+    def test_tampered_cursor_value_falls_back_to_first_page(self):
+        first = self.expected_order(Project.objects.all())[:3]
+        for value in ('garbage', None, {'a': 1}, [1], 12.5):
+            cursor = encode_cursor(value, 1, 'next')
+            with self.subTest(value=value):
+                request = RequestFactory().get('/projects/', {'cursor': cursor})
+                self.assertEqual(paginate(request, Project.objects.all(), per_page=3).object_list, first)
+                response = self.client.get(reverse('projects:project_list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+
+    def test_count_is_capped(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(count_up_to(Project.objects.all(), limit=3), (3, True))
+        # 上限 + 1 件までしか読まない
+        self.assertIn('LIMIT 4', ctx.captured_queries[0]['sql'])
+        self.assertEqual(count_up_to(Project.objects.all(), limit=7), (7, False))
+
+    def test_list_views_render_pages(self):
+        url = reverse('projects:project_list')
+        response = self.client.get(url, {'status': 'hearing'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_count'], 3)
+        for name in ('client_list', 'handover_list', 'engineer_handoff_list'):
+            response = self.client.get(reverse(f'projects:{name}'))
+            self.assertEqual(response.status_code, 200)
+
+
+class PipelineStatsTests(CRMTestCase):
+    """ダッシュボード用集計テーブル"""
+
+    def setUp(self):
+        self.client_obj = make_client()
+
+    def stat(self, status):
+        return PipelineStat.objects.filter(status=status).values_list(
+            'project_count', 'estimated_amount_sum').first()
+
+    def test_incremental_updates_follow_project_changes(self):
+        project = make_project(self.client_obj, status='quotation', estimated_amount=100)
+        make_project(self.client_obj, status='quotation', estimated_amount=50)
+        self.assertEqual(self.stat('quotation'), (2, 150))
+
+        project.status = 'negotiation'
+        project.estimated_amount = 300
+        project.save()
+        self.assertEqual(self.stat('quotation'), (1, 50))
+        self.assertEqual(self.stat('negotiation'), (1, 300))
+
+        project.delete()
+        self.assertEqual(self.stat('negotiation'), (0, 0))
+        self.assertEqual(stats.new_projects_count(), 1)
+
+    def test_rebuild_matches_incremental_state(self):
+        make_project(self.client_obj, status='hearing')
+        make_project(self.client_obj, status='in_progress', estimated_amount=1000)
+        make_project(self.client_obj, status='lost', created_at=timezone.now() - timedelta(days=70))
+        expected_status = set(PipelineStat.objects.filter(project_count__gt=0).values_list(
+            'status', 'project_count', 'estimated_amount_sum'))
+        expected_month = set(MonthlyProjectStat.objects.filter(project_count__gt=0).values_list(
+            'month', 'project_count'))
+
+        stats.rebuild()
+        self.assertEqual(set(PipelineStat.objects.values_list(
+            'status', 'project_count', 'estimated_amount_sum')), expected_status)
+        self.assertEqual(set(MonthlyProjectStat.objects.values_list('month', 'project_count')), expected_month)
+
+    def test_dashboard_reads_summary(self):
+        make_project(self.client_obj, status='hearing', estimated_amount=10)
+        make_project(self.client_obj, status='negotiation', estimated_amount=200)
+        make_project(self.client_obj, status='completed', estimated_amount=999)
+
+        response = self.client.get(reverse('projects:dashboard'))
+        self.assertEqual(response.context['active_projects_count'], 2)
+        self.assertEqual(response.context['total_estimated'], 200)
+        self.assertEqual(response.context['new_projects_count'], 3)
+        self.assertEqual(
+            [row['status'] for row in response.context['status_stats']],
+            ['hearing', 'negotiation', 'completed'],
+        )
+
+
+class PipelineAnalyticsTests(CRMTestCase):
+    """ステータス履歴とパイプライン分析"""
+
+    def setUp(self):
+        super().setUp()
+        self.client_obj = make_client()
+        self.start = timezone.now() - timedelta(days=40)
+
+    def build(self, *path):
+        """(ステータス, 作成からの日数) の順に遷移した案件を作る"""
+        project = make_project(self.client_obj, status=path[-1][0], created_at=self.start)
+        ProjectStatusHistory.objects.filter(project=project).delete()
+        previous = ''
+        for status, days in path:
+            ProjectStatusHistory.objects.create(
+                project=project, from_status=previous, to_status=status, changed_at=self.start + timedelta(days=days),
+            )
+            previous = status
+        return project
+
+    def build_pipeline(self):
+        self.build(('inquiry', 0), ('hearing', 2), ('completed', 12))
+        # 商談中で登録して失注（初回相談〜商談中を通ったとみなす）
+        self.build(('negotiation', 0), ('lost', 3))
+        self.build(('inquiry', 0))
+
+    def test_status_changes_are_recorded(self):
+        project = make_project(self.client_obj, status='inquiry')
+        project.title = '名称変更'
+        project.save()
+        project.status = 'hearing'
+        project.save()
+        self.assertEqual(
+            list(project.status_history.order_by('changed_at', 'id').values_list('from_status', 'to_status')),
+            [('', 'inquiry'), ('inquiry', 'hearing')],
+        )
+
+    def test_funnel_time_in_stage_and_cohorts(self):
+        self.build_pipeline()
+        report = analytics.report()
+
+        funnel = report['funnel']
+        self.assertEqual([row['reached'] for row in funnel['stages']], [3, 2, 2, 2, 2, 1, 1, 1])
+        self.assertEqual((funnel['created'], funnel['won'], funnel['lost'], funnel['win_rate']), (3, 1, 1, 0.5))
+
+        stages = {row['stage']: row for row in report['stages']}
+        self.assertEqual((stages['inquiry']['exited'], stages['inquiry']['mean_days']), (1, 2))
+        self.assertEqual((stages['hearing']['exited'], stages['hearing']['mean_days']), (1, 10))
+        self.assertEqual(stages['negotiation']['mean_days'], 3)
+        # 中央値は区間（10〜14日）の中で補間する
+        self.assertTrue(10 <= stages['hearing']['median_days'] < 14)
+
+        [cohort] = report['cohorts']
+        self.assertEqual(cohort['month'], timezone.localtime(self.start).date().replace(day=1))
+        self.assertEqual((cohort['created'], cohort['won'], cohort['lost']), (3, 1, 1))
+
+    def test_rollup_matches_live_report(self):
+        self.build_pipeline()
+        live = analytics.report()
+
+        out = StringIO()
+        call_command('rollup_pipeline_history', stdout=out)
+        self.assertIn('日別集計を更新しました', out.getvalue())
+        self.assertEqual(analytics.rolled_through(), timezone.localtime(self.start + timedelta(days=12)).date())
+        self.build(('inquiry', 39), ('hearing', 40))
+        expected = analytics.report()
+        expected.pop('rolled_through')
+
+        # 集計済みの日は集計テーブルから、それ以降は履歴から読む
+        with self.assertNumQueries(5):
+            report = analytics.report()
+        self.assertIsNotNone(report.pop('rolled_through'))
+        self.assertEqual(report, expected)
+        self.assertEqual(report['funnel']['created'], live['funnel']['created'] + 1)
+
+        analytics.rollup(full=True)
+        self.assertEqual({key: value for key, value in analytics.report().items() if key != 'rolled_through'}, expected)
+
+    def test_date_range(self):
+        self.build_pipeline()
+        start = timezone.localtime(self.start).date() + timedelta(days=5)
+        report = analytics.report(start=start)
+        # 滞在日数は期間内の遷移だけ（ヒアリング→完了）
+        self.assertEqual([row['stage'] for row in report['stages'] if row['exited']], ['hearing'])
+
+    def test_import_records_history(self):
+        header = 'company_name,contact_person,email,industry,external_id,title,status\n'
+        imports.import_csv(StringIO(header + 'テック,山田,a@example.jp,IT,P-1,移行,hearing\n'))
+        imports.import_csv(StringIO(header + 'テック,山田,a@example.jp,IT,P-1,移行,proposal\n'))
+        imports.import_csv(StringIO(header + 'テック,山田,a@example.jp,IT,P-1,移行,proposal\n'))
+        self.assertEqual(
+            list(ProjectStatusHistory.objects.order_by('id').values_list('from_status', 'to_status')),
+            [('', 'hearing'), ('hearing', 'proposal')],
+        )
+
+    def test_view(self):
+        self.build_pipeline()
+        response = self.client.get(reverse('projects:pipeline_analytics'), {'start': 'invalid'})
+        self.assertContains(response, 'ステージ転換率')
+        self.assertEqual(response.context['funnel']['created'], 3)
+
+
+class RevenueForecastTests(CRMTestCase):
+    """売上予測"""
+
+    def setUp(self):
+        super().setUp()
+        self.client_obj = make_client()
+        self.first = forecast._month_index(timezone.localdate())
+
+    def month(self, offset, last_day=False):
+        """今月から offset か月後の月初日（last_day なら月末日）"""
+        if last_day:
+            return forecast._month_start(self.first + offset + 1) - timedelta(days=1)
+        return forecast._month_start(self.first + offset)
+
+    def build_projects(self):
+        # 商談中（確度60%）を3か月に按分し、予算も同じ期間・確度で按分する
+        project = make_project(
+            self.client_obj, status='negotiation', estimated_amount=1200000,
+            start_date=self.month(0), end_date=self.month(2, last_day=True),
+        )
+        EngineerHandoff.objects.create(
+            project=project, engineer_name='田中', technical_scope='範囲',
+            current_status='状況', client_requirements='要件', budget=300000,
+        )
+        # 終了日がなければ開始月に計上する
+        make_project(self.client_obj, status='in_progress', estimated_amount=500000, start_date=self.month(0))
+        # 期間の前から始まる案件は期間内の月の分だけ
+        make_project(
+            self.client_obj, status='proposal', estimated_amount=300000,
+            start_date=self.month(-2), end_date=self.month(0, last_day=True),
+        )
+        make_project(self.client_obj, status='quotation', estimated_amount=100000)
+        make_project(self.client_obj, status='lost', estimated_amount=900000, start_date=self.month(0))
+        make_project(
+            self.client_obj, status='completed', estimated_amount=900000,
+            start_date=self.month(-14), end_date=self.month(-12),
+        )
+
+    def test_weighted_monthly_spread(self):
+        self.build_projects()
+        result = forecast.compute(months=6)
+
+        months = result['months']
+        self.assertEqual(len(months), 6)
+        self.assertEqual(months[0]['month'], self.month(0))
+        self.assertEqual([round(row['weighted']) for row in months], [760000, 240000, 240000, 0, 0, 0])
+        self.assertEqual([round(row['amount']) for row in months], [1000000, 400000, 400000, 0, 0, 0])
+        self.assertEqual([round(row['budget']) for row in months], [60000, 60000, 60000, 0, 0, 0])
+        self.assertEqual([row['projects'] for row in months], [3, 1, 1, 0, 0, 0])
+        self.assertEqual(round(result['totals']['margin']), 1240000 - 180000)
+
+        stages = {row['status']: row for row in result['stages']}
+        self.assertEqual(set(stages), {'negotiation', 'in_progress', 'proposal'})
+        self.assertEqual(round(stages['proposal']['amount']), 100000)
+        self.assertEqual(round(stages['negotiation']['budget']), 180000)
+        self.assertEqual(result['unscheduled']['count'], 1)
+        self.assertEqual(round(result['unscheduled']['weighted']), 40000)
+
+    def test_end_date_before_start_date(self):
+        # 終了日が開始日より前の案件は開始月だけに計上する（前月・期間より前の終了日）
+        make_project(
+            self.client_obj, status='in_progress', estimated_amount=300000,
+            start_date=self.month(1), end_date=self.month(0),
+        )
+        make_project(
+            self.client_obj, status='in_progress', estimated_amount=200000,
+            start_date=self.month(2), end_date=self.month(-3),
+        )
+        result = forecast.compute(months=4)
+        self.assertEqual([round(row['amount']) for row in result['months']], [0, 300000, 200000, 0])
+        self.assertEqual(self.client.get(reverse('projects:revenue_forecast')).status_code, 200)
+
+    def test_unscheduled_ignores_past_end_date(self):
+        # 開始日が未定なら終了日が予測期間より前でも時期未定に数える
+        make_project(self.client_obj, status='negotiation', estimated_amount=400000, end_date=self.month(-3))
+        make_project(self.client_obj, status='negotiation', estimated_amount=100000)
+        unscheduled = forecast.compute(months=3)['unscheduled']
+        self.assertEqual((unscheduled['count'], round(unscheduled['amount'])), (2, 500000))
+
+    def test_report_is_cached_per_day(self):
+        self.build_projects()
+        with self.assertNumQueries(1):
+            expected = forecast.report()
+        make_project(self.client_obj, status='in_progress', estimated_amount=500000, start_date=self.month(1))
+        # 当日中は同じ結果を返す
+        with self.assertNumQueries(0):
+            self.assertEqual(forecast.report(), expected)
+
+        forecast.invalidate()
+        with self.assertNumQueries(1):
+            result = forecast.report()
+        self.assertEqual(round(result['totals']['weighted'] - expected['totals']['weighted']), 500000)
+
+    def test_view(self):
+        self.build_projects()
+        response = self.client.get(reverse('projects:revenue_forecast'), {'months': 'invalid'})
+        self.assertContains(response, '月別の見込み')
+        self.assertEqual(len(response.context['months']), forecast.DEFAULT_MONTHS)
+        response = self.client.get(reverse('projects:revenue_forecast'), {'months': 100})
+        self.assertEqual(len(response.context['months']), forecast.MAX_MONTHS)
+
+
+class QueryPlanTests(CRMTestCase):
+    """各ビューのクエリがフルスキャン・ソートに退行していないことを確認する"""
+
+    # 行数がステータス数で頭打ちになる集計テーブルと、一覧の件数を数える LIMIT 付きの
+    # サブクエリ（pagination.count_up_to）はスキャンを許容する
+    BOUNDED_TABLES = {'projects_pipelinestat', 'subquery'}
+
+    URLS = [
+        ('projects:dashboard', {}),
+        ('projects:project_list', {}),
+        ('projects:project_list', {'status': 'hearing'}),
+        ('projects:client_list', {}),
+        ('projects:handover_list', {}),
+        ('projects:handover_list', {'type': 'uragami'}),
+        ('projects:handover_list', {'status': 'pending'}),
+        ('projects:handover_list', {'status': 'completed'}),
+        ('projects:engineer_handoff_list', {}),
+        ('projects:engineer_handoff_list', {'status': 'pending'}),
+        ('projects:engineer_handoff_list', {'status': 'accepted'}),
+        ('projects:work_queues', {}),
+        ('projects:work_queues', {'kind': 'handoff', 'assignee': '田中'}),
+        ('projects:work_queues', {'kind': 'handover'}),
+        ('projects:work_queues', {'kind': 'handover', 'assignee': 'uragami'}),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        client = make_client()
+        project = make_project(client, status='hearing')
+        Handover.objects.create(project=project, handover_type='uragami', handover_to='浦上', handover_content='内容')
+        ProgressLog.objects.create(project=project, activity_type='meeting', content='内容')
+        EngineerHandoff.objects.create(
+            project=project, engineer_name='田中', technical_scope='範囲',
+            current_status='状況', client_requirements='要件',
+        )
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_plan_uses_indexes(self, sql):
+        for step in self.query_plan(sql):
+            full_scan = re.fullmatch(r'SCAN (\w+)', step)
+            if full_scan and full_scan.group(1) not in self.BOUNDED_TABLES:
+                self.fail(f'フルスキャン: {step}\n{sql}')
+            if 'TEMP B-TREE' in step:
+                self.fail(f'インデックスを使わないソート: {step}\n{sql}')
+
+    def test_view_queries_use_indexes(self):
+        project = Project.objects.get()
+        urls = [(reverse(name), params) for name, params in self.URLS]
+        urls.append((reverse('projects:project_detail', args=[project.pk]), {}))
+        urls.append((reverse('projects:client_detail', args=[project.client_id]), {}))
+        for url, params in urls:
+            with self.subTest(url=url, params=params):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.client.get(url, params)
+                for query in ctx.captured_queries:
+                    self.assert_plan_uses_indexes(query['sql'])
+
+
+class SearchTests(CRMTestCase):
+    """全文検索（FTS5）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = make_client(company_name='テックソリューションズ', industry='IT・情報サービス')
+        cls.mfg = make_client(company_name='グローバル製造', contact_person='佐藤花子', industry='製造業')
+        cls.cloud = make_project(cls.tech, title='クラウド移行支援', consultation_content='基幹システムをクラウドへ移行')
+        cls.data = make_project(cls.mfg, title='データ活用基盤', proposal_content='データレイク構築（AWS）')
+        cls.security = make_project(cls.tech, title='セキュリティ強化')
+
+    def search(self, query):
+        return set(search_projects(Project.objects.all(), query))
+
+    def test_matches_project_and_client_fields(self):
+        self.assertEqual(self.search('クラウド'), {self.cloud})
+        self.assertEqual(self.search('データレイク'), {self.data})
+        self.assertEqual(self.search('テックソリュ'), {self.cloud, self.security})
+        self.assertEqual(self.search('aws'), {self.data})
+        self.assertEqual(self.search('存在しない語'), set())
+
+    def test_short_query_falls_back_to_icontains(self):
+        self.assertEqual(self.search('移行'), {self.cloud})
+        self.assertEqual(set(search_clients(Client.objects.all(), '製造')), {self.mfg})
+
+    def test_index_follows_updates_and_deletes(self):
+        self.tech.company_name = '新社名テクノロジー'
+        self.tech.save()
+        self.assertEqual(self.search('新社名テクノ'), {self.cloud, self.security})
+        self.assertEqual(self.search('テックソリュ'), set())
+
+        self.security.title = 'ゼロトラスト導入'
+        self.security.save()
+        self.assertEqual(self.search('ゼロトラスト'), {self.security})
+
+        self.cloud.delete()
+        self.assertEqual(self.search('クラウド'), set())
+        self.assertEqual(set(search_clients(Client.objects.all(), '佐藤花子')), {self.mfg})
+
+    def test_ranked_results_paginate(self):
+        for i in range(5):
+            make_project(self.mfg, title=f'クラウド案件{i}', consultation_content='クラウド' * (i + 1))
+        queryset = search_projects(Project.objects.all(), 'クラウド')
+        paginator = KeysetPaginator(queryset, per_page=4)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        ranks = [p.search_rank for p in first.object_list + second.object_list]
+        self.assertEqual(len(ranks), 6)
+        self.assertEqual(ranks, sorted(ranks))
+        self.assertFalse(second.has_next)
+        # 関連度のカーソルの値を書き換えても先頭ページに戻る
+        for value in ('garbage', None, {'rank': 1}):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    reverse('projects:project_list'), {'search': 'クラウド', 'cursor': encode_cursor(value, 1, 'next')},
+                )
+                self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('projects:project_list'), {'search': 'クラウド'})
+        self.assertEqual(response.context['total_count'], 6)
+
+
+class ProjectSummaryTests(CRMTestCase):
+    """案件サマリーの差分更新と案件詳細のページ送り"""
+
+    def setUp(self):
+        super().setUp()
+        self.client_obj = make_client()
+        self.project = make_project(self.client_obj)
+        self.now = timezone.now()
+
+    def log(self, project, days_ago, content='内容'):
+        return ProgressLog.objects.create(
+            project=project, activity_type='meeting', content=content, log_date=self.now - timedelta(days=days_ago),
+        )
+
+    def handoff(self, project, **kwargs):
+        return EngineerHandoff.objects.create(
+            project=project, engineer_name='田中', technical_scope='範囲',
+            current_status='状況', client_requirements='要件', **kwargs,
+        )
+
+    def summary_of(self, project):
+        return ProjectSummary.objects.values(
+            'last_log_date', 'log_count', 'open_handover_count', 'pending_handoff_count',
+        ).get(project=project)
+
+    def assert_matches_rebuild(self):
+        incremental = {row.pop('project_id'): row for row in ProjectSummary.objects.values()}
+        summary.rebuild()
+        self.assertEqual({row.pop('project_id'): row for row in ProjectSummary.objects.values()}, incremental)
+
+    def test_incremental_updates(self):
+        other = make_project(self.client_obj, title='別案件')
+        latest = self.log(self.project, 1)
+        older = self.log(self.project, 5)
+        handover = Handover.objects.create(
+            project=self.project, handover_type='uragami', handover_to='浦上', handover_content='内容',
+        )
+        handoff = self.handoff(self.project)
+        self.assertEqual(self.summary_of(self.project), {
+            'last_log_date': latest.log_date, 'log_count': 2, 'open_handover_count': 1, 'pending_handoff_count': 1,
+        })
+
+        handover.is_completed = True
+        handover.save()
+        handoff.is_accepted = True
+        handoff.save()
+        # 最新の記録を削除すると、その前の記録の日時に戻る
+        latest.delete()
+        # 別の案件に付け替えた記録は両方の案件に反映する
+        older.project = other
+        older.save()
+        self.assertEqual(self.summary_of(self.project), {
+            'last_log_date': None, 'log_count': 0, 'open_handover_count': 0, 'pending_handoff_count': 0,
+        })
+        self.assertEqual(self.summary_of(other)['log_count'], 1)
+        self.assert_matches_rebuild()
+
+    def test_cascade_delete_and_bulk_import(self):
+        self.log(self.project, 1)
+        self.handoff(self.project)
+        self.project.delete()
+        self.assertFalse(ProjectSummary.objects.exists())
+
+        header = 'company_name,contact_person,email,industry,external_id,title,status\n'
+        imports.import_csv(StringIO(header + 'テック,山田,a@example.jp,IT,P-1,移行,hearing\n'))
+        project = Project.objects.get(external_id='P-1')
+        self.assertEqual(self.summary_of(project)['log_count'], 0)
+        # サマリーがなくても関連データの保存時に作り直す
+        ProjectSummary.objects.all().delete()
+        self.log(project, 0)
+        self.assertEqual(self.summary_of(project)['log_count'], 1)
+
+    def test_detail_pages_progress_logs(self):
+        for days_ago in range(25):
+            self.log(self.project, days_ago, content=f'記録{days_ago:02d}')
+        url = reverse('projects:project_detail', args=[self.project.pk])
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, '全25件')
+        page = response.context['progress_logs']
+        self.assertEqual([log.content for log in page][:2], ['記録00', '記録01'])
+        self.assertEqual(len(page), 20)
+
+        response = self.client.get(url + '?' + page.next_querystring)
+        self.assertEqual([log.content for log in response.context['progress_logs']][-1], '記録24')
+        self.assertEqual(len(response.context['progress_logs']), 5)
+
+    def test_detail_without_summary(self):
+        ProjectSummary.objects.all().delete()
+        response = self.client.get(reverse('projects:project_detail', args=[self.project.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['summary'])
+
+    def test_list_shows_last_activity(self):
+        log = self.log(self.project, 0)
+        self.handoff(self.project)
+        response = self.client.get(reverse('projects:project_list'))
+        self.assertContains(response, '承認待ち 1')
+        self.assertContains(response, timezone.localtime(log.log_date).strftime('%Y/%m/%d'))
+
+
+class ViewCacheTests(CRMTestCase):
+    """ビューのレスポンスキャッシュ"""
+
+    def setUp(self):
+        super().setUp()
+        self.client_obj = make_client()
+        self.project = make_project(self.client_obj, title='キャッシュ案件')
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse('projects:project_list')
+        self.client.get(url, {'status': 'inquiry', 'search': ''})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'search': '', 'status': 'inquiry'})
+        self.assertContains(response, 'キャッシュ案件')
+
+    def test_saving_a_dependency_invalidates(self):
+        url = reverse('projects:project_list')
+        self.client.get(url)
+        self.project.title = '更新後の案件'
+        self.project.save()
+        self.assertContains(self.client.get(url), '更新後の案件')
+
+        self.client_obj.company_name = '新社名'
+        self.client_obj.save()
+        self.assertContains(self.client.get(url), '新社名')
+
+    def test_unrelated_model_keeps_cache(self):
+        url = reverse('projects:handover_list')
+        self.client.get(url)
+        ProgressLog.objects.create(project=self.project, activity_type='meeting', content='打ち合わせ')
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        detail = reverse('projects:project_detail', args=[self.project.pk])
+        self.client.get(detail)
+        ProgressLog.objects.create(project=self.project, activity_type='phone', content='電話で確認')
+        self.assertContains(self.client.get(detail), '電話で確認')
+
+    @override_settings(CRM_VIEW_CACHE_TIMEOUT=0)
+    def test_disabled_cache_always_renders(self):
+        url = reverse('projects:client_list')
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+
+class LoadSampleDataTests(CRMTestCase):
+    """サンプルデータ投入コマンド"""
+
+    def load(self, *args):
+        out = StringIO()
+        call_command('load_sample_data', *args, stdout=out)
+        return out.getvalue()
+
+    def test_scaled_generation_is_deterministic(self):
+        output = self.load('--scale', '300', '--batch-size', '64', '--seed', '7')
+        self.assertIn('行/秒', output)
+        self.assertEqual(Project.objects.count(), 300)
+        self.assertEqual(Client.objects.count(), 30)
+        self.assertGreater(ProgressLog.objects.count(), 0)
+        self.assertGreater(Handover.objects.count(), 0)
+        self.assertGreater(EngineerHandoff.objects.count(), 0)
+        self.assertEqual(
+            set(Project.objects.values_list('status', flat=True)),
+            {value for value, _ in Project.STATUS_CHOICES},
+        )
+        # bulk_create で投入しても集計テーブルと検索索引は揃っている
+        self.assertEqual(sum(PipelineStat.objects.values_list('project_count', flat=True)), 300)
+        self.assertEqual(
+            sum(ProjectSummary.objects.values_list('log_count', flat=True)), ProgressLog.objects.count(),
+        )
+        self.assertTrue(search_projects(Project.objects.all(), 'クラウド移行').exists())
+        # ステータス履歴は現在のステータスで終わり、分析の集計も作られている
+        self.assertEqual(analytics.report()['funnel']['created'], 300)
+        last = ProjectStatusHistory.objects.filter(project=OuterRef('pk')).order_by('-changed_at', '-id')
+        self.assertFalse(
+            Project.objects.annotate(last=Subquery(last.values('to_status')[:1])).exclude(last=F('status')).exists()
+        )
+
+        first = list(Project.objects.order_by('pk').values_list('title', 'status', 'estimated_amount'))
+        self.load('--scale', '300', '--batch-size', '64', '--seed', '7')
+        second = list(Project.objects.order_by('pk').values_list('title', 'status', 'estimated_amount'))
+        self.assertEqual(first, second)
+
+    def test_default_mode_replaces_existing_data(self):
+        self.load('--scale', '50')
+        self.load()
+        self.assertEqual(Project.objects.count(), 4)
+        self.assertEqual(Client.objects.count(), 3)
+
+
+class BenchmarkTests(CRMTestCase):
+    """ビューのベンチマーク（クエリ数・取得行数の予算）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('load_sample_data', scale=400, stdout=StringIO())
+
+    def test_views_stay_within_query_and_row_budgets(self):
+        results = benchmarks.run(iterations=2)
+        self.assertEqual(
+            {result['view'] for result in results},
+            set(benchmarks.DEFAULT_BUDGETS),
+        )
+        # レイテンシは実行環境に左右されるため、ここではクエリ数と行数だけを確認する
+        budgets = {
+            name: {metric: limit for metric, limit in budget.items() if metric != 'p95_ms'}
+            for name, budget in benchmarks.get_budgets().items()
+        }
+        self.assertEqual(benchmarks.check_budgets(results, budgets), [])
+
+    def test_budget_violations_and_comparison(self):
+        result = {'view': 'project_list', 'p50_ms': 10, 'p95_ms': 20, 'queries': 9, 'rows': 40}
+        self.assertEqual(
+            benchmarks.check_budgets([result], {'project_list': {'queries': 2, 'rows': 60}}),
+            ['project_list: queries=9 (予算 2)'],
+        )
+        baseline = dict(result, queries=2)
+        self.assertEqual(
+            benchmarks.compare([result], [baseline]),
+            ['project_list: queries 2 → 9 (+7)'],
+        )
+
+    def test_compare_rendering(self):
+        # 描画結果が描画方法によらず一致しなければ AssertionError になる
+        results = benchmarks.compare_rendering(rows=30, iterations=1)
+        self.assertEqual(
+            [result['variant'] for result in results],
+            ['if_chain', 'status_badge', 'project_list_no_fragment_cache',
+             'project_list_fragment_cold', 'project_list_fragment_warm'],
+        )
+
+
+class StatusBadgeTests(CRMTestCase):
+    """ステータスのバッジと一覧の行の断片キャッシュ"""
+
+    def render(self, source, **context):
+        return Template('{% load crm_tags %}' + source).render(TemplateContext(context))
+
+    def test_badge_and_label(self):
+        self.assertEqual(
+            self.render('{{ status|status_badge }}', status='negotiation'),
+            '<span class="badge badge-warning">商談中</span>',
+        )
+        self.assertEqual(self.render('{{ status|status_badge }}', status='on_hold'), '<span class="badge">保留</span>')
+        self.assertEqual(self.render('{{ status|status_label }}', status='lost'), '失注')
+        # 未知の値はエスケープして表示する
+        self.assertEqual(
+            self.render('{{ status|status_badge }}', status='<b>'), '<span class="badge">&lt;b&gt;</span>',
+        )
+
+    def test_cached_rows_follow_changes(self):
+        client_obj = make_client()
+        project = make_project(client_obj, title='断片キャッシュ案件', status='hearing')
+        url = reverse('projects:project_list')
+        self.assertContains(self.client.get(url), 'ヒアリング中')
+
+        project.status = 'negotiation'
+        project.save()
+        self.assertContains(self.client.get(url), '<span class="badge badge-warning">商談中</span>')
+
+        # updated_at が変わらない顧客名・案件サマリーの変更も反映される
+        Client.objects.filter(pk=client_obj.pk).update(company_name='新社名')
+        EngineerHandoff.objects.create(
+            project=project, engineer_name='田中', technical_scope='範囲',
+            current_status='状況', client_requirements='要件',
+        )
+        response = self.client.get(url)
+        self.assertContains(response, '新社名')
+        self.assertContains(response, '承認待ち 1')
+
+
+class LazyLoadTests(CRMTestCase):
+    """管理画面・テンプレート描画での外部キーの遅延読み込み"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('load_sample_data', scale=120, stdout=StringIO())
+        cls.user = User.objects.create_superuser('admin', 'admin@example.jp', 'password')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_guard_detects_lazy_foreign_key(self):
+        log = ProgressLog.objects.first()
+        with self.assertRaises(LazyLoadError):
+            with forbid_lazy_loads():
+                str(log)
+        log = ProgressLog.objects.select_related('project').first()
+        with forbid_lazy_loads():
+            str(log)
+
+    def test_guard_detects_deferred_field(self):
+        project = Project.objects.only('title').first()
+        with self.assertRaisesRegex(LazyLoadError, 'Project.consultation_content'):
+            with forbid_lazy_loads():
+                project.consultation_content
+        with forbid_lazy_loads():
+            project.title
+
+    def test_list_views_do_not_load_text_fields(self):
+        pages = {
+            'projects:dashboard': {
+                'recent_projects': {'consultation_content', 'proposal_content'},
+                'recent_activities': {'content', 'next_action'},
+                'pending_handoffs': {'technical_scope', 'client_requirements'},
+            },
+            'projects:project_list': {'projects': {'consultation_content', 'proposal_content'}},
+            'projects:handover_list': {'handovers': {'handover_content', 'technical_requirements', 'notes'}},
+            'projects:engineer_handoff_list': {'handoffs': {'technical_scope', 'current_status', 'special_notes'}},
+        }
+        for name, keys in pages.items():
+            with forbid_lazy_loads():
+                response = self.client.get(reverse(name))
+            for key, text_fields in keys.items():
+                with self.subTest(name=name, key=key):
+                    rows = list(response.context[key])
+                    self.assertTrue(rows)
+                    for row in rows:
+                        self.assertLessEqual(text_fields, row.get_deferred_fields())
+
+    def test_list_excerpt_is_truncated_in_sql(self):
+        handover = Handover.objects.first()
+        handover.handover_content = 'あ' * 500
+        handover.save()
+        response = self.client.get(reverse('projects:handover_list'))
+        row = next(row for row in response.context['handovers'] if row.pk == handover.pk)
+        self.assertEqual(len(row.content_excerpt), projections.EXCERPT_LENGTH + 1)
+        self.assertContains(response, 'あ' * (projections.EXCERPT_LENGTH - 1) + '…')
+
+    def test_admin_pages_do_not_lazy_load(self):
+        project = Project.objects.filter(progress_logs__isnull=False).first()
+        urls = [
+            '/admin/projects/project/',
+            '/admin/projects/handover/',
+            '/admin/projects/progresslog/',
+            '/admin/projects/engineerhandoff/',
+            f'/admin/projects/project/{project.pk}/change/',
+            f'/admin/projects/handover/{Handover.objects.first().pk}/change/',
+            f'/admin/projects/progresslog/add/?project={project.pk}',
+            f'/admin/projects/engineerhandoff/{EngineerHandoff.objects.first().pk}/change/',
+            '/admin/autocomplete/?app_label=projects&model_name=progresslog&field_name=project&term=クラウド',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with forbid_lazy_loads(), CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                # 行数・選択肢の数に比例してクエリが増えないこと
+                self.assertLess(len(ctx.captured_queries), 15)
+
+    def test_public_views_do_not_lazy_load(self):
+        project = Project.objects.filter(progress_logs__isnull=False).first()
+        urls = [
+            reverse('projects:dashboard'),
+            reverse('projects:project_list'),
+            reverse('projects:project_detail', args=[project.pk]),
+            reverse('projects:client_list'),
+            reverse('projects:handover_list'),
+            reverse('projects:engineer_handoff_list'),
+        ]
+        for url in urls:
+            with self.subTest(url=url), forbid_lazy_loads():
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(CRM_PROFILING=True, CRM_PROFILING_SAMPLE_RATE=0)
+class ProfilingTests(CRMTestCase):
+    """リクエストごとの計測（projects/profiling.py）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        client = make_client()
+        for index in range(3):
+            make_project(client, title=f'案件{index}')
+        cls.user = User.objects.create_superuser('admin', 'admin@example.jp', 'password')
+
+    def setUp(self):
+        super().setUp()
+        profiling.store.reset()
+
+    def test_records_queries_and_duplicates(self):
+        with profiling.profile_request() as record:
+            for project in Project.objects.order_by('pk'):
+                project.client.company_name
+            Project.objects.count()
+            Project.objects.count()
+        summary = record.summary(RequestFactory().get('/'), HttpResponse())
+        self.assertEqual(summary['queries'], 6)
+        # 同じ顧客の遅延読み込み3回と count() 2回が重複として出る
+        self.assertEqual([(row['count'], row['exact']) for row in summary['duplicates']], [(3, 3), (2, 2)])
+        self.assertEqual(len(summary['slowest']), profiling.SLOWEST_QUERIES)
+
+    def test_template_time_counts_outermost_render_only(self):
+        with profiling.profile_request() as record:
+            Template('{% include "projects/_pagination.html" %}').render(TemplateContext({}))
+        self.assertGreater(record.template_seconds, 0)
+        self.assertLessEqual(record.template_seconds, record.total_seconds)
+
+    def test_middleware_records_per_view(self):
+        for _ in range(2):
+            response = self.client.get(reverse('projects:project_list'))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        views = profiling.store.snapshot()['views']
+        stats = views['projects:project_list']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['mean_template_ms'], 0)
+        self.assertEqual(sum(stats['latency_histogram'].values()), 2)
+
+    def test_memory_and_sampled_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(CRM_PROFILING_MEMORY=True, CRM_PROFILING_SAMPLE_RATE=1,
+                                   CRM_PROFILING_DIR=directory):
+                self.client.get(reverse('projects:client_list'))
+            record = profiling.store.snapshot()['slowest_requests'][0]
+            self.assertGreater(record['peak_kb'], 0)
+            self.assertTrue(os.path.exists(record['profile']))
+
+    def test_stats_endpoint_is_staff_only(self):
+        url = reverse('projects:profiling_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.user)
+        data = self.client.get(url).json()
+        self.assertTrue(data['enabled'])
+        self.assertIn('projects:profiling_stats', data['views'])
+        # リセット後に記録されるのはリセットした POST 自身だけ
+        self.client.post(url)
+        views = profiling.store.snapshot()['views']
+        self.assertEqual(list(views), ['projects:profiling_stats'])
+        self.assertEqual(views['projects:profiling_stats']['requests'], 1)
+
+    @override_settings(CRM_PROFILING=False)
+    def test_disabled_middleware_is_not_loaded(self):
+        response = self.client.get(reverse('projects:project_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(profiling.store.snapshot()['views'], {})
+
+
+class ExportTests(CRMTestCase):
+    """CSV / JSONL のストリーミングエクスポート"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.jp', 'password')
+        cls.tech = make_client(company_name='テックソリューションズ')
+        cls.cloud = make_project(cls.tech, title='クラウド移行支援', status='negotiation', estimated_amount=3500000)
+        cls.other = make_project(cls.tech, title='セキュリティ強化', status='hearing')
+        ProgressLog.objects.create(project=cls.cloud, activity_type='meeting', content='キックオフ')
+        ProgressLog.objects.create(project=cls.other, activity_type='phone', content='ヒアリング')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def export(self, name, fmt, **params):
+        response = self.client.get(reverse('projects:export_data', args=[name, fmt]), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export_with_client_fields(self):
+        body = self.export('projects', 'csv', status='negotiation')
+        rows = list(csv.reader(body.lstrip('\ufeff').splitlines()))
+        header, data = rows[0], rows[1:]
+        self.assertEqual(len(data), 1)
+        record = dict(zip(header, data[0]))
+        self.assertEqual(record['title'], 'クラウド移行支援')
+        self.assertEqual(record['client__company_name'], 'テックソリューションズ')
+        self.assertEqual(record['estimated_amount'], '3500000')
+
+    def test_jsonl_activity_export_honors_project_filters(self):
+        body = self.export('progress_logs', 'jsonl', search='クラウド移行')
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([record['content'] for record in records], ['キックオフ'])
+        self.assertEqual(records[0]['project_id'], self.cloud.pk)
+
+    def test_export_requires_staff_and_known_name(self):
+        self.assertEqual(self.client.get(reverse('projects:export_data', args=['secrets', 'csv'])).status_code, 404)
+        self.client.logout()
+        response = self.client.get(reverse('projects:export_data', args=['clients', 'csv']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_stream_reads_rows_in_chunks(self):
+        from . import exports
+
+        lines = exports.stream('clients', 'jsonl', {}, chunk_size=1)
+        with self.assertNumQueries(1):
+            first = next(lines)
+        self.assertEqual(json.loads(first)['company_name'], 'テックソリューションズ')
+
+    def test_command_streams_to_stdout(self):
+        out = StringIO()
+        call_command('export_data', 'clients', '--format', 'jsonl', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['company_name'], 'テックソリューションズ')
+
+
+class AsyncViewTests(CRMTestCase):
+    """非同期（ASGI）版のダッシュボード・一覧画面"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = make_client(company_name='テックソリューションズ')
+        cls.cloud = make_project(cls.tech, title='クラウド移行支援', status='negotiation', estimated_amount=3500000)
+        make_project(cls.tech, title='セキュリティ強化', status='hearing')
+        ProgressLog.objects.create(project=cls.cloud, activity_type='meeting', content='キックオフ')
+        EngineerHandoff.objects.create(project=cls.cloud, engineer_name='鈴木', technical_scope='AWS')
+        Handover.objects.create(project=cls.cloud, handover_type='engineer', handover_to='鈴木', handover_content='要件')
+
+    async def test_async_views_render_same_context_as_sync_views(self):
+        for name, params in [
+            ('dashboard', {}),
+            ('project_list', {'status': 'negotiation'}),
+            ('client_list', {'search': 'テック'}),
+            ('handover_list', {'status': 'pending'}),
+            ('engineer_handoff_list', {}),
+        ]:
+            with self.subTest(name):
+                expected = await self.async_client.get(reverse(f'projects:{name}'), params)
+                response = await self.async_client.get(reverse(f'projects:async_{name}'), params)
+                self.assertEqual(response.status_code, 200)
+                for key in ('total_count', 'status_stats', 'total_estimated', 'new_projects_count'):
+                    if key in expected.context:
+                        self.assertEqual(response.context[key], expected.context[key])
+                for key in ('recent_projects', 'pending_handoffs', 'page'):
+                    if key in expected.context:
+                        self.assertEqual(list(response.context[key]), list(expected.context[key]))
+
+        response = await self.async_client.get(reverse('projects:async_client_list'))
+        self.assertEqual([client.stats.project_count for client in response.context['page']], [2])
+
+    def test_async_view_is_cached(self):
+        # 非同期 ORM の SQL はこのスレッドの接続で実行されるため、同期側で数える
+        url = reverse('projects:async_project_list')
+        async_to_sync(self.async_client.get)(url)
+        with self.assertNumQueries(0):
+            response = async_to_sync(self.async_client.get)(url)
+        self.assertContains(response, 'クラウド移行支援')
+
+    async def test_async_export_streams_rows(self):
+        user = await User.objects.acreate_superuser('admin', 'admin@example.jp', 'password')
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse('projects:async_export_data', args=['projects', 'jsonl']))
+        self.assertTrue(response.is_async)
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual(sorted(json.loads(line)['title'] for line in body.splitlines()),
+                         ['クラウド移行支援', 'セキュリティ強化'])
+
+
+class ServerBenchmarkTests(TransactionTestCase):
+    """同期版（WSGI）と非同期版（ASGI）のスループット比較
+
+    WSGI 側は別スレッドの接続から読むため、データをコミットする TransactionTestCase を使う。
+    """
+
+    def setUp(self):
+        cache.clear()
+        make_project(make_client(), title='クラウド移行支援')
+
+    def test_compare_servers_runs_both_handlers(self):
+        results = benchmarks.compare_servers(concurrency=2, requests=4, server_targets=[
+            ('project_list', 'project_list', {}),
+        ])
+        self.assertEqual([(result['server'], result['requests']) for result in results], [('wsgi', 4), ('asgi', 4)])
+        self.assertTrue(all(result['rps'] > 0 for result in results))
+
+
+class FileDatabaseRouter:
+    """読み書きをすべて 'file' エイリアスに向ける（SQLiteProfileTests 用）"""
+
+    def db_for_read(self, model, **hints):
+        return 'file'
+
+    def db_for_write(self, model, **hints):
+        return 'file'
+
+
+@override_settings(CRM_VIEW_CACHE_TIMEOUT=0)
+class SQLiteProfileTests(TransactionTestCase):
+    """production プロファイル（WAL）で、書き込み中もダッシュボードを読めること
+
+    WAL はメモリ上のデータベースでは使えないため、テスト用データベースをファイルに
+    複製し、スレッドごとに 'file' エイリアスの接続を作って読み書きを向ける。
+    別スレッドで ProgressLog を追加するトランザクションを EXCLUSIVE で開いたまま
+    （ロールバックジャーナルのコミット中と同じロック）ダッシュボードを読み取る。
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.project = make_project(make_client(), title='クラウド移行支援')
+        self.path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'crm.sqlite3')
+        connection.ensure_connection()
+        target = sqlite3.connect(self.path)
+        connection.connection.backup(target)
+        target.close()
+
+    @contextlib.contextmanager
+    def file_database(self):
+        """このスレッドの 'file' エイリアスに複製したデータベースの接続を割り当てる"""
+        default = connections['default']
+        settings_dict = {
+            **default.settings_dict,
+            'NAME': self.path,
+            'OPTIONS': {'timeout': 0.2, 'transaction_mode': 'EXCLUSIVE'},
+        }
+        connections['file'] = type(default)(settings_dict, 'file')
+        try:
+            with override_settings(DATABASE_ROUTERS=[FileDatabaseRouter()]):
+                yield connections['file']
+        finally:
+            connections['file'].close()
+            del connections['file']
+
+    def read_dashboard_while_writing(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def write():
+            with self.file_database(), transaction.atomic(using='file'):
+                ProgressLog.objects.create(project_id=self.project.pk, activity_type='meeting', content='書き込み中')
+                locked.set()
+                release.wait(5)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        self.assertTrue(locked.wait(5))
+        try:
+            with self.file_database():
+                return self.client.get(reverse('projects:dashboard'))
+        finally:
+            release.set()
+            writer.join()
+
+    def test_rollback_journal_blocks_readers(self):
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            self.read_dashboard_while_writing()
+
+    def test_wal_profile_reads_during_insert(self):
+        pragmas = settings.DB_PROFILES['production']['pragmas']
+        with override_settings(CRM_SQLITE_PRAGMAS=pragmas):
+            response = self.read_dashboard_while_writing()
+            with self.file_database() as file_connection, file_connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], pragmas['busy_timeout'])
+                self.assertEqual(ProgressLog.objects.count(), 1)
+        self.assertEqual(response.status_code, 200)
+        # 未コミットの活動記録は見えない
+        self.assertEqual(list(response.context['recent_activities']), [])
+
+
+class ImportTests(CRMTestCase):
+    """CSV 一括インポート"""
+
+    HEADER = 'company_name,contact_person,email,industry,external_id,title,status,estimated_amount,start_date\n'
+
+    def run_import(self, body, **kwargs):
+        from . import imports
+
+        return imports.import_csv(StringIO(self.HEADER + body), **kwargs)
+
+    def test_upserts_clients_and_projects_by_key(self):
+        report = self.run_import(
+            'テック,山田,Yamada@Example.jp,IT,P-1,クラウド移行,商談中,3500000,2026-04-01\n'
+            'テック,山田,yamada@example.jp,製造業,P-2,セキュリティ強化,hearing,,\n'
+            '小売,佐藤,sato@example.jp,小売,,,,,\n'
+        )
+        self.assertEqual(report.errors, [])
+        self.assertEqual(Client.objects.count(), 2)
+        tech = Client.objects.get(company_name='テック')
+        self.assertEqual(tech.industry, '製造業')
+        self.assertEqual(tech.projects.count(), 2)
+        cloud = Project.objects.get(external_id='P-1')
+        self.assertEqual(cloud.status, 'negotiation')
+        self.assertEqual(cloud.estimated_amount, 3500000)
+
+        self.run_import('テック,山田,yamada@example.jp,IT,P-1,クラウド移行（第2期）,quotation,4000000,\n')
+        self.assertEqual(Project.objects.count(), 2)
+        self.assertEqual(Project.objects.get(external_id='P-1').title, 'クラウド移行（第2期）')
+        self.assertEqual(PipelineStat.objects.get(status='quotation').estimated_amount_sum, 4000000)
+        self.assertEqual(len(search_projects(Project.objects.all(), '第2期')), 1)
+
+    def test_client_key_ignores_email_case(self):
+        tech = make_client(company_name='テック', email='Yamada@Example.jp')
+        report = self.run_import('テック,山田,yamada@example.jp,製造業,P-1,クラウド移行,hearing,,\n')
+        self.assertEqual(report.errors, [])
+        self.assertEqual(Client.objects.count(), 1)
+        tech.refresh_from_db()
+        self.assertEqual((tech.email, tech.industry), ('Yamada@Example.jp', '製造業'))
+        self.assertEqual(Project.objects.get(external_id='P-1').client, tech)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            make_client(company_name='テック', email='YAMADA@example.jp')
+
+    def test_reports_invalid_rows_per_batch(self):
+        report = self.run_import(
+            'テック,山田,yamada@example.jp,IT,P-1,クラウド移行,unknown,3500000,\n'
+            ',佐藤,not-an-email,小売,P-2,店舗DX,hearing,abc,2026-13-01\n'
+            'テック,山田,yamada@example.jp,IT,P-3,AI導入,hearing,,\n',
+            batch_size=2,
+        )
+        self.assertEqual([batch['rows'] for batch in report.batches], [2, 1])
+        self.assertEqual([error['line'] for error in report.errors], [2, 3])
+        self.assertIn('status', report.errors[0]['message'])
+        for field in ('company_name', 'email', 'estimated_amount', 'start_date'):
+            self.assertIn(field, report.errors[1]['message'])
+        self.assertEqual(list(Project.objects.values_list('external_id', flat=True)), ['P-3'])
+
+    def test_dry_run_writes_nothing(self):
+        report = self.run_import('テック,山田,yamada@example.jp,IT,P-1,クラウド移行,hearing,,\n', dry_run=True)
+        self.assertEqual((report.rows, report.errors), (1, []))
+        self.assertFalse(Client.objects.exists())
+
+    def test_export_round_trip_and_command(self):
+        from . import exports
+
+        tech = make_client(company_name='テック', email='yamada@example.jp')
+        make_project(tech, title='クラウド移行', status='negotiation', external_id='P-1', estimated_amount=3500000)
+        body = ''.join(exports.stream('projects', 'csv', {}))
+        Project.objects.all().delete()
+
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'projects.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(body)
+        out = StringIO()
+        call_command('import_data', path, stdout=out)
+        self.assertIn('エラー 0件', out.getvalue())
+        project = Project.objects.get(external_id='P-1')
+        self.assertEqual((project.client, project.status, project.estimated_amount), (tech, 'negotiation', 3500000))
+
+    def test_admin_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.jp', 'password'))
+        url = reverse('admin:projects_client_import')
+        self.assertContains(self.client.get(reverse('admin:projects_client_changelist')), url)
+        upload = SimpleUploadedFile(
+            'clients.csv', ('\ufeff' + self.HEADER + 'テック,山田,yamada@example.jp,IT,P-1,クラウド移行,hearing,,\n').encode(),
+        )
+        response = self.client.post(url, {'file': upload, 'batch_size': 1000})
+        self.assertContains(response, 'エラー 0件')
+        self.assertTrue(Project.objects.filter(external_id='P-1', client__company_name='テック').exists())
+
+
+@override_settings(CRM_REPLICA_ALIAS='replica', CRM_REPLICA_MAX_LAG=60, CRM_REPLICA_STICKY_SECONDS=60,
+                   CRM_VIEW_CACHE_TIMEOUT=0)
+class ReplicaTests(TransactionTestCase):
+    """読み取りレプリカへの振り分け・書き込み後のプライマリ固定・遅延時のフォールバック
+
+    テスト用データベースを一時ファイルに sync で複製し、'replica' エイリアスの接続を作る。
+    バックアップ API は未コミットのトランザクション中には複製できないため TransactionTestCase を使う。
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client_obj = make_client(company_name='同期済み商事')
+        make_project(self.client_obj, title='同期済み案件')
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'replica.sqlite3')
+        connections['replica'] = type(connections['default'])(
+            {**connections['default'].settings_dict, 'NAME': path}, 'replica',
+        )
+        self.addCleanup(self.remove_replica)
+        replica.sync()
+        # 同期後の書き込みはレプリカには届かない
+        make_project(self.client_obj, title='未同期の案件')
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections['replica']
+
+    def titles(self, response):
+        return [project.title for project in response.context['projects']]
+
+    def test_reporting_views_read_the_replica(self):
+        self.assertEqual(self.titles(self.client.get(reverse('projects:project_list'))), ['同期済み案件'])
+        self.assertEqual(self.titles(self.client.get(reverse('projects:async_project_list'))), ['同期済み案件'])
+        recent_projects = self.client.get(reverse('projects:dashboard')).context['recent_projects']
+        self.assertEqual([project.title for project in recent_projects], ['同期済み案件'])
+
+        # 詳細画面はレプリカを使わない
+        project = Project.objects.get(title='未同期の案件')
+        self.assertContains(self.client.get(reverse('projects:project_detail', args=[project.pk])), '未同期の案件')
+
+    def test_export_reads_the_replica(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.jp', 'password'))
+        body = b''.join(self.client.get(reverse('projects:export_data', args=['projects', 'csv'])).streaming_content)
+        self.assertIn('同期済み案件', body.decode())
+        self.assertNotIn('未同期の案件', body.decode())
+
+    def test_write_makes_the_session_read_the_primary(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.jp', 'password'))
+        url = reverse('projects:project_list')
+        self.assertEqual(self.titles(self.client.get(url)), ['同期済み案件'])
+
+        # 管理画面の表示だけではプライマリに固定しない
+        self.client.get(reverse('admin:projects_client_add'))
+        self.assertNotIn(replica.STICKY_SESSION_KEY, self.client.session)
+
+        response = self.client.post(reverse('admin:projects_client_add'), {
+            'company_name': '新規商事', 'contact_person': '佐藤', 'created_at_0': '2025-01-10', 'created_at_1': '10:00:00',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(replica.STICKY_SESSION_KEY, self.client.session)
+        self.assertEqual(len(self.titles(self.client.get(url))), 2)
+        self.assertContains(self.client.get(reverse('projects:client_list')), '新規商事')
+
+        # 固定期間が過ぎたらレプリカに戻る
+        session = self.client.session
+        session[replica.STICKY_SESSION_KEY] = 0
+        session.save()
+        self.assertEqual(self.titles(self.client.get(url)), ['同期済み案件'])
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with connections['replica'].cursor() as cursor:
+            cursor.execute(f'UPDATE {replica.SYNC_TABLE} SET synced_at = synced_at - 61')
+        self.assertGreater(replica.replica_lag(), 60)
+        self.assertEqual(len(self.titles(self.client.get(reverse('projects:project_list')))), 2)
+
+    def test_sync_command(self):
+        out = StringIO()
+        call_command('sync_replica', stdout=out)
+        self.assertIn('レプリカを同期しました', out.getvalue())
+        self.assertLess(replica.replica_lag(), 60)
+        self.assertEqual(len(self.titles(self.client.get(reverse('projects:project_list')))), 2)
+
+
+@jobs.task('tests.fail')
+def failing_task(job, message):
+    raise RuntimeError(message)
+
+
+@jobs.task('tests.progress')
+def progress_task(job, steps):
+    for step in range(steps):
+        job.progress(step + 1, steps, f'{step + 1}/{steps}')
+    return {'steps': steps}
+
+
+@override_settings(CRM_JOB_RETRY_DELAY=0, CRM_JOB_VISIBILITY_TIMEOUT=60)
+class JobQueueTests(CRMTestCase):
+    """バックグラウンド処理のキュー（projects/jobs.py）"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CRM_JOB_FILE_DIR=self.directory))
+
+    def test_enqueue_and_run(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('unknown')
+        job = jobs.enqueue('tests.progress', {'steps': 3})
+        later = jobs.enqueue('tests.progress', {'steps': 1}, delay=3600)
+        self.assertEqual(jobs.run_pending(), {'succeeded': 1})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.progress_message), ('succeeded', 100, '3/3'))
+        self.assertEqual((job.attempts, job.result), (1, {'steps': 3}))
+        self.assertEqual(Job.objects.get(pk=later.pk).status, 'pending')
+
+    def test_retries_then_fails(self):
+        job = jobs.enqueue('tests.fail', {'message': '接続できません'}, max_attempts=2)
+        with self.assertLogs('projects.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), {'pending': 1, 'failed': 1})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('接続できません', job.error)
+
+    @override_settings(CRM_JOB_RETRY_DELAY=30)
+    def test_retry_waits_with_backoff(self):
+        job = jobs.enqueue('tests.fail', {'message': 'x'})
+        with self.assertLogs('projects.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), {'pending': 1})
+        job.refresh_from_db()
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=25))
+        self.assertEqual(jobs.claim('worker'), [])
+
+    def test_claim_is_exclusive_and_expired_jobs_are_reclaimed(self):
+        job = jobs.enqueue('tests.progress', {'steps': 1})
+        self.assertEqual(jobs.claim('a'), [job.pk])
+        self.assertEqual(jobs.claim('b'), [])
+        stalled = jobs.JobContext(Job.objects.get(pk=job.pk), 'a')
+
+        # 実行期限を過ぎたらほかのワーカーが取り出し、元のワーカーの報告は拒否される
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.claim('b'), [job.pk])
+        with self.assertRaises(jobs.JobLost):
+            stalled.progress(1, 1)
+        self.assertEqual(jobs.execute(job.pk, 'b'), 'succeeded')
+        self.assertEqual(Job.objects.get(pk=job.pk).attempts, 2)
+
+        # 再実行の回数を使い切っていれば失敗にする
+        exhausted = jobs.enqueue('tests.progress', {'steps': 1}, max_attempts=1)
+        jobs.claim('a')
+        Job.objects.filter(pk=exhausted.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.claim('b'), [])
+        self.assertEqual(Job.objects.get(pk=exhausted.pk).status, 'failed')
+
+    def test_import_and_export_tasks(self):
+        path = os.path.join(self.directory, 'import.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(ImportTests.HEADER)
+            file.write('テック,山田,yamada@example.jp,IT,P-1,クラウド移行,hearing,3500000,\n')
+            file.write('小売,佐藤,sato@example.jp,小売,P-2,店舗DX,unknown,,\n')
+        job = jobs.enqueue('import_csv', {'path': path, 'batch_size': 1, 'remove': True})
+        export = jobs.enqueue('export', {'name': 'projects', 'params': {'status': 'hearing'}})
+        self.assertEqual(jobs.run_pending(), {'succeeded': 2})
+
+        job.refresh_from_db()
+        self.assertEqual((job.result['projects'], job.result['error_count']), (1, 1))
+        self.assertEqual(job.result['errors'][0]['line'], 3)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(ProjectSummary.objects.count(), 1)
+
+        export.refresh_from_db()
+        self.assertEqual(export.result['rows'], 1)
+        with open(export.result['output'], encoding='utf-8') as file:
+            self.assertIn('クラウド移行', file.read())
+
+    def test_rebuild_task_and_worker_command(self):
+        make_project(make_client())
+        PipelineStat.objects.all().delete()
+        jobs.enqueue('rebuild_derived_data')
+        out = StringIO()
+        call_command('run_worker', '--once', stdout=out)
+        self.assertIn('succeeded 1件', out.getvalue())
+        self.assertEqual(PipelineStat.objects.get(status='inquiry').project_count, 1)
+
+    def test_admin_import_in_background(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.jp', 'password'))
+        upload = StringIO(ImportTests.HEADER + 'テック,山田,yamada@example.jp,IT,P-1,クラウド移行,hearing,,\n')
+        upload.name = 'import.csv'
+        response = self.client.post(reverse('admin:projects_client_import'), {
+            'file': upload, 'batch_size': 100, 'background': 'on',
+        })
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('admin:projects_job_change', args=[job.pk]))
+        self.assertFalse(Project.objects.exists())
+        jobs.run_pending()
+        self.assertEqual(Project.objects.get().title, 'クラウド移行')
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class APITests(CRMTestCase):
+    """JSON API（projects/api.py）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('api', 'api@example.jp', 'secret', is_staff=True)
+        cls.customer = make_client(company_name='テック')
+        cls.projects = [make_project(cls.customer, title=f'案件{index}') for index in range(3)]
+        for project in cls.projects:
+            for day in range(2):
+                ProgressLog.objects.create(project=project, activity_type='meeting', content=f'打ち合わせ{day}')
+
+    def setUp(self):
+        super().setUp()
+        credentials = base64.b64encode(b'api:secret').decode()
+        self.auth = {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+
+    def get(self, url, **headers):
+        return self.client.get(url, **self.auth, **headers)
+
+    def send(self, method, url, data, **headers):
+        return getattr(self.client, method)(url, json.dumps(data), content_type='application/json',
+                                            **self.auth, **headers)
+
+    def test_requires_staff(self):
+        url = reverse('projects:api_collection', args=['projects'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Basic', response['WWW-Authenticate'])
+        User.objects.create_user('guest', password='secret')
+        credentials = base64.b64encode(b'guest:secret').decode()
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=f'Basic {credentials}').status_code, 403)
+
+    def test_list_with_fields_expand_and_cursor(self):
+        url = reverse('projects:api_collection', args=['projects'])
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.get(url, **{'QUERY_STRING': 'fields=title&expand=client,progress_logs&limit=2'}).json()
+        # 認証ユーザー・ページの行（顧客を結合）・進捗記録の先読みの3本
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertNotIn('consultation_content', ctx.captured_queries[1]['sql'])
+        self.assertEqual(len(data['results']), 2)
+        first = data['results'][0]
+        self.assertEqual(set(first), {'id', 'title', 'client', 'progress_logs'})
+        self.assertEqual(first['client']['company_name'], 'テック')
+        self.assertEqual(len(first['progress_logs']), 2)
+
+        rest = self.get(url, **{'QUERY_STRING': f'fields=title&cursor={data["next"]}'}).json()
+        titles = {row['title'] for row in data['results'] + rest['results']}
+        self.assertEqual(titles, {'案件0', '案件1', '案件2'})
+        self.assertIsNone(rest['next'])
+
+        self.assertEqual(self.get(url, **{'QUERY_STRING': 'fields=password'}).status_code, 400)
+        self.assertEqual(self.get(url, **{'QUERY_STRING': 'expand=summary'}).status_code, 400)
+
+    def test_conditional_get(self):
+        project = self.projects[0]
+        url = reverse('projects:api_detail', args=['projects', project.pk])
+        response = self.get(url)
+        self.assertEqual(response.json()['client_id'], self.customer.pk)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        list_url = reverse('projects:api_collection', args=['progress-logs'])
+        list_etag = self.get(list_url)['ETag']
+        self.assertEqual(self.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+        # 行の削除でも一覧の ETag は変わる
+        ProgressLog.objects.first().delete()
+        self.assertEqual(self.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+        project.title = '変更後'
+        project.save()
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], '変更後')
+
+    def test_create_and_patch(self):
+        url = reverse('projects:api_collection', args=['projects'])
+        response = self.send('post', url, {'client_id': self.customer.pk, 'title': 'API案件', 'status': 'hearing'})
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(PipelineStat.objects.get(status='hearing').project_count, 1)
+        self.assertTrue(ProjectSummary.objects.filter(project_id=created['id']).exists())
+
+        detail = reverse('projects:api_detail', args=['projects', created['id']])
+        etag = response['ETag']
+        response = self.send('patch', detail, {'status': 'proposal'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.json()['status'], 'proposal')
+        self.assertEqual(response.json()['title'], 'API案件')
+        # 古い ETag での更新は競合として拒否する
+        self.assertEqual(self.send('patch', detail, {'title': 'x'}, HTTP_IF_MATCH=etag).status_code, 412)
+
+        response = self.send('post', url, {'title': '', 'status': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'client', 'title', 'status'})
+        self.assertEqual(self.send('post', url, {'title': 'x', 'summary': 1}).status_code, 400)
+
+    def test_session_writes_require_csrf(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        url = reverse('projects:api_collection', args=['clients'])
+        self.assertEqual(client.get(url).status_code, 200)
+        response = client.post(url, json.dumps({'company_name': 'x', 'contact_person': 'y'}),
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_progress_log_batch(self):
+        url = reverse('projects:api_progress_log_batch')
+        first, second = self.projects[:2]
+        moved = ProgressLog.objects.filter(project=first).first()
+        data = {
+            'create': [
+                {'project_id': second.pk, 'activity_type': 'phone', 'content': f'電話{index}'} for index in range(5)
+            ],
+            'update': [{'id': moved.pk, 'project_id': second.pk, 'content': '付け替え'}],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.send('post', url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['created']), 5)
+        # 行数に比例してクエリが増えないこと
+        self.assertLess(len(ctx.captured_queries), 20)
+        self.assertEqual(ProjectSummary.objects.get(project=first).log_count, 1)
+        self.assertEqual(ProjectSummary.objects.get(project=second).log_count, 8)
+        self.assertEqual(ProgressLog.objects.get(pk=moved.pk).content, '付け替え')
+
+        # 1行でも誤りがあれば何も書き込まない
+        response = self.send('post', url, {
+            'create': [{'project_id': first.pk, 'activity_type': 'phone', 'content': 'ok'},
+                       {'project_id': first.pk, 'activity_type': 'fax', 'content': 'ng'}],
+            'update': [{'id': 0, 'content': 'x'}],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(error['kind'], error['index']) for error in response.json()['errors']],
+                         [('create', 1), ('update', 0)])
+        self.assertEqual(ProgressLog.objects.count(), 11)
+
+        # 本文・各行がオブジェクトでなければ 400
+        for body in ([], 'create', {'create': [1]}, {'update': [[]]}, {'create': {}}):
+            with self.subTest(body=body):
+                response = self.send('post', url, body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_tampered_cursor_is_rejected(self):
+        url = reverse('projects:api_collection', args=['projects'])
+        for value in ('garbage', None, {'a': 1}):
+            with self.subTest(value=value):
+                response = self.get(url, **{'QUERY_STRING': f'cursor={encode_cursor(value, 1, "next")}'})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], 'カーソルが正しくありません')
+
+
+class ChangeFeedTests(CRMTestCase):
+    """外部システム向けの変更履歴（projects/changefeed.py）"""
+
+    def changes(self, after=0):
+        return [(log.model, log.object_id, log.action) for log in changefeed.entries(after, 1000)]
+
+    def test_records_saves_and_cascading_deletes(self):
+        customer = make_client()
+        project = make_project(customer)
+        log = ProgressLog.objects.create(project=project, activity_type='phone', content='電話')
+        after = changefeed.last_seq()
+        project.title = '変更後'
+        project.save()
+        ids = customer.pk, project.pk, log.pk
+        customer.delete()
+        self.assertEqual(self.changes(after), [
+            ('project', ids[1], 'save'),
+            ('progresslog', ids[2], 'delete'),
+            ('project', ids[1], 'delete'),
+            ('client', ids[0], 'delete'),
+        ])
+
+    def test_bulk_paths_record_changes(self):
+        imports.import_csv(StringIO(
+            'company_name,contact_person,email,external_id,title\n'
+            'テック,山田,yamada@example.jp,P-1,クラウド移行\n'
+            'テック,山田,yamada@example.jp,P-2,AI需要予測\n'
+        ))
+        self.assertEqual(sorted(self.changes()), sorted(
+            [('client', Client.objects.get().pk, 'save')]
+            + [('project', pk, 'save') for pk in Project.objects.values_list('pk', flat=True)]
+        ))
+
+        after = changefeed.last_seq()
+        call_command('load_sample_data', scale=20, stdout=StringIO())
+        changes = self.changes(after)
+        self.assertEqual(changes[:5], [(name, None, 'reset') for name in
+                                       ('client', 'project', 'handover', 'progresslog', 'engineerhandoff')])
+        self.assertEqual(len(changes) - 5, sum(model.objects.count() for model in changefeed.TRACKED_MODELS))
+        # 通し番号は全件削除後も続きから振られる
+        self.assertGreater(ChangeLog.objects.order_by('pk').first().pk, after)
+
+    def test_compact_keeps_latest_entry_per_row(self):
+        customer = make_client()
+        project = make_project(customer)
+        for status in ('hearing', 'proposal'):
+            project.status = status
+            project.save()
+        other = make_project(customer, title='削除する案件')
+        other_id = other.pk
+        other.delete()
+        latest = {(log.model, log.object_id): log.pk for log in ChangeLog.objects.all()}
+
+        self.assertEqual(changefeed.compact(), 0)
+        changefeed.compact(before=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(sorted(ChangeLog.objects.values_list('pk', flat=True)), sorted(latest.values()))
+        self.assertEqual(ChangeLog.objects.get(object_id=other_id, model='project').action, 'delete')
+
+    def test_api_feed(self):
+        User.objects.create_user('api', password='secret', is_staff=True)
+        self.client.login(username='api', password='secret')
+        customer = make_client()
+        ids = [make_project(customer, title=f'案件{index}').pk for index in range(3)]
+        Project.objects.get(pk=ids[2]).delete()
+        url = reverse('projects:api_change_feed')
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url, {'limit': 3}).json()
+        self.assertTrue(data['has_more'])
+        self.assertEqual([change['resource'] for change in data['changes']], ['clients', 'projects', 'projects'])
+        self.assertEqual(data['changes'][1]['data']['title'], '案件0')
+        # セッション・ユーザー・履歴と、リソースごとに今の行を読む1本ずつ
+        self.assertEqual(len(ctx.captured_queries), 5)
+
+        data = self.client.get(url, {'after': data['last_seq'], 'resources': 'projects'}).json()
+        self.assertFalse(data['has_more'])
+        self.assertEqual([(change['id'], change['action']) for change in data['changes']],
+                         [(ids[2], 'save'), (ids[2], 'delete')])
+        # 後で削除された行は内容を返さない
+        self.assertIsNone(data['changes'][0]['data'])
+        self.assertEqual(self.client.get(url, {'resources': 'users'}).status_code, 404)
+
+    def test_consumer_command_resumes_from_saved_position(self):
+        customer = make_client()
+        make_project(customer)
+        out = StringIO()
+        call_command('consume_changes', '--consumer', 'bi', '--batch-size', '1', stdout=out, stderr=StringIO())
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line['resource'] for line in lines], ['clients', 'projects'])
+        self.assertEqual(ChangeFeedConsumer.objects.get(name='bi').last_seq, lines[-1]['seq'])
+
+        make_client(company_name='追加株式会社')
+        out = StringIO()
+        call_command('consume_changes', '--consumer', 'bi', stdout=out, stderr=StringIO())
+        self.assertEqual([json.loads(line)['data']['company_name'] for line in out.getvalue().splitlines()],
+                         ['追加株式会社'])
+
+
+class ArchiveTests(CRMTestCase):
+    """完了・失注した案件のアーカイブ（projects/archive.py）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = make_client(company_name='テック')
+        long_ago = timezone.now() - timedelta(days=400)
+        cls.old = make_project(customer, title='基幹システム刷新', status='completed', estimated_amount=3000000,
+                               created_at=long_ago - timedelta(days=30))
+        ProjectStatusHistory.objects.filter(project=cls.old).update(changed_at=long_ago)
+        ProgressLog.objects.create(project=cls.old, activity_type='meeting', content='検収の打ち合わせ')
+        Handover.objects.create(project=cls.old, handover_type='uragami', handover_to='浦上', handover_content='内容')
+        cls.recent = make_project(customer, title='クラウド移行', status='lost')
+        cls.active = make_project(customer, title='AI需要予測', status='negotiation')
+
+    def test_moves_closed_projects_with_related_rows(self):
+        pipeline = dict(PipelineStat.objects.values_list('status', 'project_count'))
+        flows, reached = analytics.compute()
+        after = changefeed.last_seq()
+
+        self.assertEqual(archive.archive(dry_run=True), 1)
+        self.assertEqual(archive.archive(), 1)
+        self.assertEqual(set(Project.objects.values_list('pk', flat=True)), {self.recent.pk, self.active.pk})
+        archived = ArchivedProject.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.status, archived.log_count), ('completed', 1))
+        self.assertEqual(archived.progress_logs.get().content, '検収の打ち合わせ')
+        self.assertEqual(archived.handovers.count(), 1)
+        self.assertFalse(ProgressLog.objects.filter(project_id=self.old.pk).exists())
+        self.assertEqual(search_projects(Project.objects.all(), '基幹システム').count(), 0)
+
+        # 集計・分析はアーカイブした案件も数えたまま（作り直しても同じ）
+        self.assertEqual(dict(PipelineStat.objects.values_list('status', 'project_count')), pipeline)
+        stats.rebuild()
+        self.assertEqual(dict(PipelineStat.objects.values_list('status', 'project_count')), pipeline)
+        self.assertEqual(analytics.compute(), (flows, reached))
+        self.assertEqual(sorted((log.model, log.action) for log in changefeed.entries(after, 10)), [
+            ('handover', 'archive'), ('progresslog', 'archive'), ('project', 'archive'),
+        ])
+
+    def test_detail_and_search_read_archive(self):
+        archive.archive()
+        response = self.client.get(reverse('projects:project_detail', args=[self.old.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['archived'])
+        self.assertContains(response, '検収の打ち合わせ')
+        self.assertNotContains(response, f'/admin/projects/project/{self.old.pk}/change/')
+        self.assertEqual(self.client.get(reverse('projects:project_detail', args=[0])).status_code, 404)
+
+        response = self.client.get(reverse('projects:project_list'), {'search': '基幹システム'})
+        self.assertEqual(list(response.context['projects']), [])
+        self.assertEqual([project.pk for project in response.context['archived_projects']], [self.old.pk])
+        self.assertEqual(self.client.get(reverse('projects:project_list')).context['archived_projects'], [])
+
+
+class WorkQueueTests(CRMTestCase):
+    """担当ごとの作業キュー（projects/queues.py）"""
+
+    def setUp(self):
+        super().setUp()
+        self.customer = make_client(company_name='テック')
+        self.now = timezone.now()
+
+    def handoff(self, project, engineer_name='田中', days_ago=0, **kwargs):
+        return EngineerHandoff.objects.create(
+            project=project, engineer_name=engineer_name, technical_scope='範囲',
+            handoff_date=self.now - timedelta(days=days_ago), **kwargs,
+        )
+
+    def counts(self):
+        return {(row.kind, row.assignee): row.open_count for row in QueueCounter.objects.filter(open_count__gt=0)}
+
+    def assert_matches_rebuild(self):
+        incremental = self.counts()
+        queues.rebuild()
+        self.assertEqual(self.counts(), incremental)
+
+    def test_counters_follow_changes(self):
+        project = make_project(self.customer)
+        first = self.handoff(project)
+        second = self.handoff(project)
+        handover = Handover.objects.create(
+            project=project, handover_type='uragami', handover_to='浦上', handover_content='内容',
+        )
+        self.assertEqual(self.counts(), {('handoff', '田中'): 2, ('handover', 'uragami'): 1})
+
+        # 担当の付け替え・承認・完了・削除
+        first.engineer_name = '鈴木'
+        first.save()
+        second.is_accepted = True
+        second.save()
+        handover.is_completed = True
+        handover.save()
+        self.assertEqual(self.counts(), {('handoff', '鈴木'): 1})
+        self.assertEqual(queues.open_total('handoff'), 1)
+        self.assert_matches_rebuild()
+
+        # 案件の削除に伴う連鎖削除も数から外す
+        self.handoff(make_project(self.customer, title='別案件'))
+        project.delete()
+        self.assertEqual(self.counts(), {('handoff', '田中'): 1})
+        self.assert_matches_rebuild()
+
+    def test_rank_by_age_amount_and_start(self):
+        today = timezone.localdate(self.now)
+        old = self.handoff(make_project(self.customer, title='古い'), days_ago=60)
+        large = self.handoff(make_project(self.customer, title='大型', estimated_amount=30000000))
+        starting = self.handoff(make_project(self.customer, title='開始間近', start_date=today))
+        later = self.handoff(make_project(self.customer, title='開始まだ先', start_date=today + timedelta(days=90)))
+        self.handoff(make_project(self.customer, title='承認済み'), days_ago=300, is_accepted=True)
+
+        ranked = queues.rank(queues.queue_rows('handoff'), now=self.now)
+        self.assertEqual([item.pk for item in ranked], [large.pk, old.pk, starting.pk, later.pk])
+        self.assertAlmostEqual(ranked[0].priority, 3.0)
+        self.assertAlmostEqual(ranked[1].priority, 2.0)
+
+        with override_settings(CRM_QUEUE_WEIGHTS={'amount': 0}):
+            ranked = queues.rank(queues.queue_rows('handoff'), now=self.now)
+        # 優先度が同じなら古い順（同時刻なら id 順）
+        self.assertEqual([item.pk for item in ranked], [old.pk, starting.pk, large.pk, later.pk])
+
+    def test_queue_view_and_dashboard(self):
+        old = self.handoff(make_project(self.customer, title='古い案件'), days_ago=90)
+        self.handoff(make_project(self.customer, title='鈴木の案件'), engineer_name='鈴木')
+        Handover.objects.create(
+            project=make_project(self.customer, title='浦上の案件'), handover_type='uragami',
+            handover_to='浦上', handover_content='内容',
+        )
+
+        response = self.client.get(reverse('projects:work_queues'), {'kind': 'handoff', 'assignee': '田中'})
+        self.assertEqual([counter.assignee for counter in response.context['counters']], ['田中', '鈴木'])
+        self.assertEqual([item.pk for item in response.context['items']], [old.pk])
+        self.assertNotContains(response, '鈴木の案件')
+
+        response = self.client.get(reverse('projects:work_queues'), {'kind': 'handover'})
+        self.assertEqual([counter.label for counter in response.context['counters']], ['浦上泰弘さんへの引継ぎ'])
+        self.assertContains(response, '浦上の案件')
+
+        response = self.client.get(reverse('projects:dashboard'))
+        self.assertEqual(response.context['pending_handoff_count'], 2)
+        self.assertEqual(response.context['pending_handoffs'][0].pk, old.pk)
+
+    def test_new_high_value_item_outranks_older_ones(self):
+        small = make_project(self.customer, title='小型', estimated_amount=100000)
+        for days_ago in range(60, 90):
+            self.handoff(small, days_ago=days_ago)
+        large = self.handoff(make_project(self.customer, title='大型', estimated_amount=900000000))
+
+        # 古い順の先頭だけでなく未完了の行すべてに優先度を付ける
+        items = queues.top(queues.queue_rows('handoff'), limit=5)
+        self.assertEqual(items[0].pk, large.pk)
+        self.assertAlmostEqual(items[0].priority, 90.0, places=2)
+        response = self.client.get(reverse('projects:dashboard'))
+        self.assertEqual(response.context['pending_handoffs'][0].pk, large.pk)
+        self.assertEqual(len(response.context['pending_handoffs']), queues.DASHBOARD_LIMIT)
+        response = self.client.get(reverse('projects:work_queues'), {'kind': 'handoff'})
+        self.assertEqual(response.context['items'][0].pk, large.pk)
+        self.assertEqual(response.context['total_count'], 31)
+
+        # 件数は担当ごとの件数の表から読む
+        QueueCounter.objects.filter(kind='handoff').update(open_count=100)
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('projects:dashboard')).context['pending_handoff_count'], 100)
+
+
+class ClientStatsTests(CRMTestCase):
+    """顧客一覧・顧客詳細の案件の集計（projects/client_stats.py）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tech = make_client(company_name='テック', email='tech@example.jp')
+        cls.cloud = make_project(cls.tech, title='クラウド移行', status='negotiation', estimated_amount=3000000)
+        make_project(cls.tech, title='AI需要予測', status='in_progress', estimated_amount=5000000)
+        old = make_project(cls.tech, title='基幹システム刷新', status='completed', estimated_amount=2000000,
+                           created_at=timezone.now() - timedelta(days=800))
+        ProjectStatusHistory.objects.filter(project=old).update(changed_at=timezone.now() - timedelta(days=400))
+        cls.log = ProgressLog.objects.create(project=cls.cloud, activity_type='meeting', content='キックオフ')
+        EngineerHandoff.objects.create(project=cls.cloud, engineer_name='田中', technical_scope='範囲')
+        cls.empty = make_client(company_name='新規顧客', email='new@example.jp')
+        archive.archive()
+
+    def test_aggregates_include_archived_projects(self):
+        stats = client_stats.for_clients([self.tech.pk, self.empty.pk])
+        tech = stats[self.tech.pk]
+        self.assertEqual(tech.by_status, [('negotiation', 1), ('in_progress', 1), ('completed', 1)])
+        self.assertEqual((tech.project_count, tech.active_count, tech.archived_count), (3, 2, 1))
+        self.assertEqual((tech.total_amount, tech.won_amount), (10000000, 7000000))
+        self.assertEqual((tech.last_activity, tech.pending_handoffs), (self.log.log_date, 1))
+        self.assertEqual((stats[self.empty.pk].project_count, stats[self.empty.pk].last_activity), (0, None))
+
+    def test_list_query_count_does_not_depend_on_clients(self):
+        url = reverse('projects:client_list')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for number in range(20):
+            make_project(make_client(company_name=f'顧客{number}', email=f'{number}@example.jp'), status='hearing')
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['page']), 22)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+    def test_detail_page(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('projects:client_detail', args=[self.tech.pk]))
+        self.assertEqual([project.title for project in response.context['recent_projects']],
+                         ['AI需要予測', 'クラウド移行'])
+        self.assertEqual([handoff.engineer_name for handoff in response.context['pending_handoffs']], ['田中'])
+        self.assertContains(response, 'アーカイブ済みの案件 1件')
+        self.assertEqual(self.client.get(reverse('projects:client_detail', args=[0])).status_code, 404)
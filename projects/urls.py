@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, async_views, views
 
 app_name = 'projects'
 
@@ -8,6 +8,24 @@ urlpatterns = [
     path('projects/', views.project_list, name='project_list'),
     path('projects/<int:pk>/', views.project_detail, name='project_detail'),
     path('clients/', views.client_list, name='client_list'),
+    path('clients/<int:pk>/', views.client_detail, name='client_detail'),
     path('handovers/', views.handover_list, name='handover_list'),
     path('engineer-handoffs/', views.engineer_handoff_list, name='engineer_handoff_list'),
+    path('queues/', views.work_queues, name='work_queues'),
+    path('analytics/', views.pipeline_analytics, name='pipeline_analytics'),
+    path('forecast/', views.revenue_forecast, name='revenue_forecast'),
+    path('exports/<str:name>.<str:fmt>', views.export_data, name='export_data'),
+    path('profiling/', views.profiling_stats, name='profiling_stats'),
+    # JSON API（projects/api.py）
+    path('api/changes/', api.change_feed, name='api_change_feed'),
+    path('api/progress-logs/batch/', api.progress_log_batch, name='api_progress_log_batch'),
+    path('api/<str:resource>/', api.collection, name='api_collection'),
+    path('api/<str:resource>/<int:pk>/', api.detail, name='api_detail'),
+    # 非同期（ASGI）版。テンプレートと絞り込み条件は同期版と共通
+    path('async/', async_views.dashboard, name='async_dashboard'),
+    path('async/projects/', async_views.project_list, name='async_project_list'),
+    path('async/clients/', async_views.client_list, name='async_client_list'),
+    path('async/handovers/', async_views.handover_list, name='async_handover_list'),
+    path('async/engineer-handoffs/', async_views.engineer_handoff_list, name='async_engineer_handoff_list'),
+    path('async/exports/<str:name>.<str:fmt>', async_views.export_data, name='async_export_data'),
 ]
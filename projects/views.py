@@ -1,160 +1,321 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Count, Sum, Q
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
-from datetime import timedelta
-from .models import Client, Project, Handover, ProgressLog, EngineerHandoff
+from django.utils.dateparse import parse_date
+from . import analytics, archive, client_stats, exports, forecast, profiling, projections, queues, stats
+from .cache import cached_view
+from .models import Client, Project, Handover, ProgressLog, EngineerHandoff, QueueCounter
+from .pagination import count_up_to, paginate
+from .replica import current_read_alias, use_replica
+from .filters import filter_projects, filter_clients, filter_handovers, filter_engineer_handoffs
 
 
+# 案件詳細で1ページに表示する進捗記録の件数と、引継ぎ・バトンタッチの表示件数
+DETAIL_LOGS_PER_PAGE = 20
+DETAIL_RELATED_LIMIT = 20
+# 顧客詳細に表示する最近の案件の件数
+CLIENT_RECENT_PROJECTS = 10
+
+
+def _latest(queryset, limit=DETAIL_RELATED_LIMIT):
+    """先頭 limit 件と、それより多くあるかどうか"""
+    rows = list(queryset[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+@use_replica
+@cached_view(Client, Project, ProgressLog, EngineerHandoff)
 def dashboard(request):
     """ダッシュボード - 案件の統計情報を表示"""
     
-    # ステータス別の案件数
-    status_stats = Project.objects.values('status').annotate(count=Count('id'))
+    # ステータス別の案件数・進行中の案件数・見積総額（集計テーブルから取得）
+    summary = stats.pipeline_summary()
     
     # 今月の新規案件数
-    this_month = timezone.now().replace(day=1)
-    new_projects_count = Project.objects.filter(created_at__gte=this_month).count()
-    
-    # 進行中の案件数
-    active_projects_count = Project.objects.filter(
-        status__in=['hearing', 'proposal', 'quotation', 'negotiation', 'handover', 'in_progress']
-    ).count()
-    
-    # 見積総額（進行中の案件）
-    total_estimated = Project.objects.filter(
-        status__in=['quotation', 'negotiation', 'handover', 'in_progress']
-    ).aggregate(total=Sum('estimated_amount'))['total'] or 0
+    new_projects_count = stats.new_projects_count()
     
     # 最近の案件
-    recent_projects = Project.objects.select_related('client').all()[:10]
+    recent_projects = projections.recent_projects()
     
-    # エンジニアへの引継ぎ待ち
-    pending_handoffs = EngineerHandoff.objects.filter(is_accepted=False).select_related('project')[:5]
+    # エンジニアへの引継ぎ待ち（未完了の行を優先度順に並べ、上位だけ表示する。件数は担当ごとの件数の合計）
+    pending_handoffs = queues.top(projections.pending_handoffs(), queues.DASHBOARD_LIMIT)
     
     # 最近の活動記録
-    recent_activities = ProgressLog.objects.select_related('project').all()[:10]
+    recent_activities = projections.recent_activities()
     
     context = {
-        'status_stats': status_stats,
+        'status_stats': summary['status_stats'],
         'new_projects_count': new_projects_count,
-        'active_projects_count': active_projects_count,
-        'total_estimated': total_estimated,
+        'active_projects_count': summary['active_projects_count'],
+        'total_estimated': summary['total_estimated'],
         'recent_projects': recent_projects,
         'pending_handoffs': pending_handoffs,
+        'pending_handoff_count': queues.open_total('handoff'),
         'recent_activities': recent_activities,
     }
     
     return render(request, 'projects/dashboard.html', context)
 
 
+@use_replica
+@cached_view(Client, Project, Handover, ProgressLog, EngineerHandoff)
 def project_list(request):
     """案件一覧"""
-    projects = Project.objects.select_related('client').all()
+    # 最終活動日時・引継ぎ待ちの件数は案件サマリーを結合して読む（表に出す列だけ）
+    projects = projections.project_rows()
     
     # フィルタリング
     status = request.GET.get('status')
-    if status:
-        projects = projects.filter(status=status)
-    
     search = request.GET.get('search')
-    if search:
-        projects = projects.filter(
-            Q(title__icontains=search) |
-            Q(client__company_name__icontains=search) |
-            Q(consultation_content__icontains=search)
-        )
+    projects = filter_projects(projects, request.GET)
+    
+    page = paginate(request, projects)
+    total_count, total_count_capped = count_up_to(projects)
     
     context = {
-        'projects': projects,
+        'projects': page,
+        'page': page,
+        'total_count': total_count,
+        'total_count_capped': total_count_capped,
         'status_choices': Project.STATUS_CHOICES,
         'current_status': status,
         'search_query': search,
+        # 検索ではアーカイブした案件も探す
+        'archived_projects': list(archive.search(search)) if search else [],
     }
     
     return render(request, 'projects/project_list.html', context)
 
 
+@cached_view(Client, Project, Handover, ProgressLog, EngineerHandoff)
 def project_detail(request, pk):
-    """案件詳細"""
-    project = get_object_or_404(Project.objects.select_related('client'), pk=pk)
+    """案件詳細（アーカイブした案件も同じ画面で表示する）"""
+    project = Project.objects.select_related('client', 'summary').filter(pk=pk).first()
+    archived = project is None
+    if archived:
+        project = archive.get_project(pk)
+        if project is None:
+            raise Http404('案件が見つかりません')
     
-    # 関連データを取得
-    handovers = project.handovers.all()
-    progress_logs = project.progress_logs.all()
-    engineer_handoffs = project.engineer_handoffs.all()
+    # 関連データを取得（進捗記録はページ送り、引継ぎ・バトンタッチは最新の分だけ）
+    handovers, more_handovers = _latest(project.handovers.all())
+    engineer_handoffs, more_engineer_handoffs = _latest(project.engineer_handoffs.all())
+    progress_logs = paginate(request, project.progress_logs.all(), per_page=DETAIL_LOGS_PER_PAGE)
     
     context = {
         'project': project,
         'handovers': handovers,
+        'more_handovers': more_handovers,
         'progress_logs': progress_logs,
+        'page': progress_logs,
         'engineer_handoffs': engineer_handoffs,
+        'more_engineer_handoffs': more_engineer_handoffs,
+        'related_limit': DETAIL_RELATED_LIMIT,
+        # アーカイブした案件はアーカイブ時点のサマリーを自身に持つ。
+        # シグナルを通らずに作られた案件はサマリーがないことがある（summary.create_missing() で補う）
+        'summary': project if archived else getattr(project, 'summary', None),
+        'archived': archived,
     }
     
     return render(request, 'projects/project_detail.html', context)
 
 
+@use_replica
+@cached_view(Client, Project, ProgressLog, EngineerHandoff)
 def client_list(request):
     """顧客一覧"""
-    clients = Client.objects.annotate(
-        project_count=Count('projects')
-    ).all()
+    clients = Client.objects.all()
     
     # 検索機能
     search = request.GET.get('search')
-    if search:
-        clients = clients.filter(
-            Q(company_name__icontains=search) |
-            Q(contact_person__icontains=search) |
-            Q(industry__icontains=search)
-        )
+    clients = filter_clients(clients, request.GET)
+    
+    page = paginate(request, clients)
+    total_count, total_count_capped = count_up_to(clients)
+    
+    # 案件の集計は表示中のページ分だけ client_id のインデックスで SQL 1本で読む
+    stats = client_stats.for_clients([client.pk for client in page])
+    for client in page:
+        client.stats = stats[client.pk]
     
     context = {
-        'clients': clients,
+        'clients': page,
+        'page': page,
+        'total_count': total_count,
+        'total_count_capped': total_count_capped,
         'search_query': search,
     }
     
     return render(request, 'projects/client_list.html', context)
 
 
+@use_replica
+@cached_view(Client, Project, ProgressLog, EngineerHandoff)
+def client_detail(request, pk):
+    """顧客詳細（案件の集計・最近の案件・承認待ちのバトンタッチ）"""
+    client = get_object_or_404(Client, pk=pk)
+    
+    # 最近の案件は (client, -created_at) のインデックス順に先頭だけ読む
+    recent_projects = projections.client_projects(client)[:CLIENT_RECENT_PROJECTS]
+    
+    # 承認待ちのバトンタッチは優先度順（作業キューと同じ）
+    pending_handoffs = queues.rank(queues.queue_rows('handoff').filter(project__client=client).order_by())
+    
+    context = {
+        'client': client,
+        'stats': client_stats.for_clients([client.pk])[client.pk],
+        'recent_projects': recent_projects,
+        'recent_limit': CLIENT_RECENT_PROJECTS,
+        'pending_handoffs': pending_handoffs,
+    }
+    
+    return render(request, 'projects/client_detail.html', context)
+
+
+@cached_view(Client, Project, Handover)
 def handover_list(request):
     """引継ぎ一覧"""
-    handovers = Handover.objects.select_related('project', 'project__client').all()
+    handovers = projections.handover_rows()
     
     # フィルタリング
     handover_type = request.GET.get('type')
-    if handover_type:
-        handovers = handovers.filter(handover_type=handover_type)
-    
     status = request.GET.get('status')
-    if status == 'pending':
-        handovers = handovers.filter(is_completed=False)
-    elif status == 'completed':
-        handovers = handovers.filter(is_completed=True)
+    handovers = filter_handovers(handovers, request.GET)
+    
+    page = paginate(request, handovers)
+    total_count, total_count_capped = count_up_to(handovers)
     
     context = {
-        'handovers': handovers,
+        'handovers': page,
+        'page': page,
+        'total_count': total_count,
+        'total_count_capped': total_count_capped,
         'handover_types': Handover.HANDOVER_TYPE_CHOICES,
         'current_type': handover_type,
         'current_status': status,
+        'excerpt_length': projections.EXCERPT_LENGTH,
     }
     
     return render(request, 'projects/handover_list.html', context)
 
 
+@cached_view(Client, Project, EngineerHandoff)
 def engineer_handoff_list(request):
     """エンジニアバトンタッチ一覧"""
-    handoffs = EngineerHandoff.objects.select_related('project', 'project__client').all()
+    handoffs = projections.handoff_rows()
     
     # 承認状況でフィルタ
     status = request.GET.get('status')
-    if status == 'pending':
-        handoffs = handoffs.filter(is_accepted=False)
-    elif status == 'accepted':
-        handoffs = handoffs.filter(is_accepted=True)
+    handoffs = filter_engineer_handoffs(handoffs, request.GET)
+    
+    page = paginate(request, handoffs)
+    total_count, total_count_capped = count_up_to(handoffs)
     
     context = {
-        'handoffs': handoffs,
+        'handoffs': page,
+        'page': page,
+        'total_count': total_count,
+        'total_count_capped': total_count_capped,
         'current_status': status,
+        'excerpt_length': projections.EXCERPT_LENGTH,
     }
     
     return render(request, 'projects/engineer_handoff_list.html', context)
+
+
+@cached_view(Client, Project, Handover, EngineerHandoff)
+def work_queues(request):
+    """担当ごとの作業キュー（未完了の引継ぎ・承認待ちのバトンタッチを優先度順に表示）"""
+    kind = request.GET.get('kind')
+    if kind not in queues.QUEUES:
+        kind = 'handoff'
+    assignee = request.GET.get('assignee') or None
+
+    # 引継ぎの担当は引継ぎ先の値なので表示名に置き換える
+    labels = dict(Handover.HANDOVER_TYPE_CHOICES) if kind == 'handover' else {}
+    counters = list(queues.counters(kind))
+    for counter in counters:
+        counter.label = labels.get(counter.assignee, counter.assignee)
+
+    items = queues.top(queues.queue_rows(kind, assignee), queues.QUEUE_LIMIT)
+    # 件数は担当ごとの件数の表から数える（未完了の行は数えない）
+    total_count = sum(counter.open_count for counter in counters if assignee in (None, counter.assignee))
+
+    context = {
+        'kind': kind,
+        'kind_choices': QueueCounter.KIND_CHOICES,
+        'counters': counters,
+        'current_assignee': assignee,
+        'assignee_label': labels.get(assignee, assignee),
+        'items': items,
+        'total_count': total_count,
+    }
+
+    return render(request, 'projects/work_queue.html', context)
+
+
+@use_replica
+@cached_view(Project)
+def pipeline_analytics(request):
+    """営業パイプライン分析（ステージ転換率・滞在日数・月別コホート）"""
+    start = _parse_date(request.GET.get('start'))
+    end = _parse_date(request.GET.get('end'))
+    context = {
+        **analytics.report(start, end),
+        'start': start,
+        'end': end,
+    }
+    return render(request, 'projects/pipeline_analytics.html', context)
+
+
+@use_replica
+def revenue_forecast(request):
+    """売上予測（確度で重み付けした見積金額・エンジニア予算の月別見込み）"""
+    months = _parse_int(request.GET.get('months'), forecast.DEFAULT_MONTHS)
+    context = {
+        **forecast.report(months),
+        'month_choices': [3, 6, 12, 24, 36],
+    }
+    return render(request, 'projects/revenue_forecast.html', context)
+
+
+def _parse_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_date(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+@staff_member_required
+@use_replica
+def export_data(request, name, fmt):
+    """一覧データのエクスポート（一覧画面と同じ絞り込み条件を使う）"""
+    if name not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise Http404
+    
+    response = StreamingHttpResponse(
+        exports.stream(name, fmt, request.GET, using=current_read_alias()),
+        content_type=exports.FORMATS[fmt],
+    )
+    filename = f'{name}_{timezone.localtime():%Y%m%d_%H%M%S}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@staff_member_required
+def profiling_stats(request):
+    """リクエスト計測（CRM_PROFILING）のビューごとの集計。POST で集計をリセットする"""
+    if request.method == 'POST':
+        profiling.store.reset()
+    data = profiling.store.snapshot(slowest=_parse_int(request.GET.get('slowest'), 20))
+    data['enabled'] = settings.CRM_PROFILING
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False, 'indent': 2})